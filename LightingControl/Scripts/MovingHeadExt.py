@@ -16,6 +16,15 @@ import numpy as np
 
 import json
 
+import calibrationCache
+import calibrationSolver
+import captureStore
+import heightTargeting
+import incrementalHomography
+import panTiltLut
+import panTiltSolver
+import projectionModels
+
 class MovingHeadExt:
 	"""
 	MovingHeadExt description
@@ -29,31 +38,49 @@ class MovingHeadExt:
 
 		TDF.createProperty(self, 'PanTiltDirection', value=list(parent.MovingHead.parGroup.Pantiltdirection.eval()), dependable="deep", readOnly=False)
 
-		TDF.createProperty(self, 'targetListTop', value=list(), dependable="deep", readOnly=False)
-		TDF.createProperty(self, 'panTiltListTop', value=list(), dependable="deep", readOnly=False)
-		TDF.createProperty(self, 'panTiltOffsetListTop', value=list(), dependable="deep", readOnly=False)
-		TDF.createProperty(self, 'distanceListTop', value=list(), dependable="deep", readOnly=False)
-		TDF.createProperty(self, 'h_targetListTop', value=list(), dependable="deep", readOnly=False)
-		self.HomographyTop = np.array([[1.,.0,.0],[.0,1.,.0],[.0,.0,1.]])
+		# all calibration captures, one columnar layer per plane ('top', 'btm', ...)
+		# CapturesChanged gets bumped once per edit (or once per batch of edits)
+		self.CapturesChanged = tdu.Dependency(0)
+		self.Captures = captureStore.CaptureStore(('top', 'btm'), onChange=self.onCapturesChanged)
 
-		TDF.createProperty(self, 'targetListBtm', value=list(), dependable="deep", readOnly=False)
-		TDF.createProperty(self, 'panTiltListBtm', value=list(), dependable="deep", readOnly=False)
-		TDF.createProperty(self, 'panTiltOffsetListBtm', value=list(), dependable="deep", readOnly=False)
-		TDF.createProperty(self, 'distanceListBtm', value=list(), dependable="deep", readOnly=False)
-		TDF.createProperty(self, 'h_targetListBtm', value=list(), dependable="deep", readOnly=False)
+		self.HomographyTop = np.array([[1.,.0,.0],[.0,1.,.0],[.0,.0,1.]])
 		self.HomographyBtm = np.array([[1.,.0,.0],[.0,1.,.0],[.0,.0,1.]])
 
 		self.HomographySide_1 = np.array([[1.,.0,.0],[.0,1.,.0],[.0,.0,1.]])
 		self.HomographySide_2 = np.array([[1.,.0,.0],[.0,1.,.0],[.0,.0,1.]])
 
+		# homographies of additional named layers
+		self.LayerHomographies = dict()
+
+		# incremental DLT state per layer, updated on every capture edit
+		self.HomographyEngines = dict()
+
 		self.TempHomography = np.array([[1.,.0,.0],[.0,1.,.0],[.0,.0,1.]])
 
+		# btm/top blend for targets at any height, see CalcHeightBlend
+		self.HeightBlend = None
+		self.heightBlendSources = None
+
+		# optional lookup table for the floor, see EnableLUT
+		self.LUT = None
+		self.LUTType = 'btm'
+
+		# fitted projection models per layer, see FitProjectionModel
+		self.ProjectionModels = dict()
+
 
 		self.Dir = 'x'
 		self.Axis = tdu.Dependency('x')
 
 		self.DMXStartingAddress = tdu.Dependency(parent.MovingHead.par.Dmxstartingaddress.val)
 
+	def onCapturesChanged(self, store):
+		self.CapturesChanged.val = store.version
+
+	def layerKey(self, type):
+		# 'top' -> "DataPointsTop"
+		return "DataPoints" + type[0].upper() + type[1:]
+
 	def CreateJSONConfig(self, file):
 		json_config = {}
 		json_config["Position"] = list(self.Position)
@@ -61,38 +88,27 @@ class MovingHeadExt:
 
 		json_config["PanTiltDirection"] = list(self.PanTiltDirection)
 
-		datapoints_top = []
-		for i in range(len(self.targetListTop)):
-			datapoint_dict = dict()
-			datapoint_dict["Target"] = self.GetTarget(i,'top')
-			datapoint_dict["PanTilt"] = self.GetPanTilt(i,'top')
-			datapoint_dict["PanTiltOffset"] = self.GetPanTiltOffset(i,'top')
-			datapoint_dict["Distance"] = self.GetDistance(i,'top')
-			try:
-				datapoint_dict["HomogTarget"] = self.GetHomogTarget(i,'top')
-			except:
-				datapoint_dict["HomogTarget"] = [0,0]
-			datapoints_top.append(datapoint_dict)
-		json_config["DataPointsTop"] = datapoints_top
-
-		datapoints_btm = []
-		for i in range(len(self.targetListBtm)):
-			datapoint_dict = dict()
-			datapoint_dict["Target"] = self.GetTarget(i,'btm')
-			datapoint_dict["PanTilt"] = self.GetPanTilt(i,'btm')
-			datapoint_dict["PanTiltOffset"] = self.GetPanTiltOffset(i,'btm')
-			datapoint_dict["Distance"] = self.GetDistance(i,'btm')
-			try:
-				datapoint_dict["HomogTarget"] = self.GetHomogTarget(i,'btm')
-			except:
-				datapoint_dict["HomogTarget"] = [0,0]
-			datapoints_btm.append(datapoint_dict)
-		json_config["DataPointsBtm"] = datapoints_btm
+		for type in self.Captures:
+			datapoints = []
+			for i in range(len(self.Captures[type])):
+				datapoint_dict = dict()
+				datapoint_dict["Target"] = self.GetTarget(i,type)
+				datapoint_dict["PanTilt"] = self.GetPanTilt(i,type)
+				datapoint_dict["PanTiltOffset"] = self.GetPanTiltOffset(i,type)
+				datapoint_dict["Distance"] = self.GetDistance(i,type)
+				datapoint_dict["HomogTarget"] = self.GetHomogTarget(i,type)
+				datapoints.append(datapoint_dict)
+			json_config[self.layerKey(type)] = datapoints
 
 		json_config["HomographyTop"] = self.HomographyTop.tolist()
 		json_config["HomographyBtm"] = self.HomographyBtm.tolist()
 		json_config["HomographySide_1"] = self.HomographySide_1.tolist()
 		json_config["HomographySide_2"] = self.HomographySide_2.tolist()
+		for type, homography in self.LayerHomographies.items():
+			json_config["Homography" + type[0].upper() + type[1:]] = homography.tolist()
+
+		if self.ProjectionModels:
+			json_config["ProjectionModels"] = {type: model.to_dict() for type, model in self.ProjectionModels.items()}
 
 		json_config["Axis"] = self.Axis.val
 		
@@ -121,37 +137,61 @@ class MovingHeadExt:
 			self.PanTiltDirection = list((0,90)) # setting standard
 			debug("No PanTiltDirection par, old config")
 		
-		datapoints_top = parsed_json["DataPointsTop"]
-		self.h_targetListTop = list()
-		for datapoint in datapoints_top:
-			target = datapoint.get("Target")
-			pan_tilt = datapoint.get("PanTilt")
-			pan_tilt_offset = datapoint.get("PanTiltOffset")
-			distance = datapoint.get("Distane")
-			homog_target = datapoint.get("HomogTarget")
-			self.AddCapture(target, pan_tilt, pan_tilt_offset, distance, 'top')
-			self.h_targetListTop.append(homog_target)
-
-		datapoints_btm = parsed_json["DataPointsBtm"]
-		self.h_targetListBtm = list()
-		for datapoint in datapoints_btm:
-			target = datapoint.get("Target")
-			pan_tilt = datapoint.get("PanTilt")
-			pan_tilt_offset = datapoint.get("PanTiltOffset")
-			distance = datapoint.get("Distane")
-			homog_target = datapoint.get("HomogTarget")
-			self.AddCapture(target, pan_tilt, pan_tilt_offset, distance, 'btm')
-			self.h_targetListBtm.append(homog_target)
+		# layers of the previous config must not survive
+		self.LayerHomographies.clear()
+		with self.Captures.batch():
+			self.Captures.clear()
+			for key, datapoints in parsed_json.items():
+				if not key.startswith("DataPoints") or key == "DataPoints":
+					continue
+				type = key[10].lower() + key[11:]
+				for datapoint in datapoints:
+					target = datapoint.get("Target")
+					pan_tilt = datapoint.get("PanTilt")
+					pan_tilt_offset = datapoint.get("PanTiltOffset")
+					distance = datapoint.get("Distance")
+					homog_target = datapoint.get("HomogTarget") or [0,0]
+					self.Captures.append(type, target=target, pan_tilt=pan_tilt, pan_tilt_offset=pan_tilt_offset, distance=distance, homog_target=homog_target)
+				if type not in ('top', 'btm') and "Homography" + key[10:] in parsed_json:
+					self.LayerHomographies[type] = np.array(parsed_json["Homography" + key[10:]])
+
+		self.HomographyEngines.clear()
 
 		self.HomographyTop = np.array(parsed_json["HomographyTop"])
 		self.HomographyBtm = np.array(parsed_json["HomographyBtm"])
 		self.HomographySide_1 = np.array(parsed_json["HomographySide_1"])
 		self.HomographySide_2 = np.array(parsed_json["HomographySide_2"])
 
+		self.ProjectionModels = {type: projectionModels.from_dict(model) for type, model in parsed_json.get("ProjectionModels", {}).items()}
+
 		self.Axis.val = parsed_json["Axis"]
 
 		self.DMXStartingAddress.val = parsed_json["DMXStartingAddress"]
 
+	# same as LoadJSONConfig, but from a compiled rig snapshot (see calibrationCache)
+	def LoadSnapshot(self, snapshot, index):
+		self.Position = snapshot.position[index].tolist()
+		self.Rotation = snapshot.rotation[index].tolist()
+		self.PanTiltDirection = snapshot.pan_tilt_direction[index].tolist()
+
+		# every layer gets assigned once instead of appending point by point
+		self.LayerHomographies.clear()
+		with self.Captures.batch():
+			self.Captures.clear()
+			for type in calibrationCache.LAYERS:
+				self.Captures.assign(type, **{column: snapshot.points(index, type, column) for column in captureStore.COLUMNS})
+		self.HomographyEngines.clear()
+		self.ProjectionModels.clear()
+
+		self.HomographyTop = snapshot.homography(index, 'top').copy()
+		self.HomographyBtm = snapshot.homography(index, 'btm').copy()
+		self.HomographySide_1 = snapshot.homography(index, 'side_1').copy()
+		self.HomographySide_2 = snapshot.homography(index, 'side_2').copy()
+
+		self.Axis.val = str(snapshot.axis[index])
+
+		self.DMXStartingAddress.val = int(snapshot.dmx_starting_address[index])
+
 
 	def math_range(self, value, in_range, out_range):
 		return np.interp(value,in_range, out_range)
@@ -160,252 +200,128 @@ class MovingHeadExt:
 		range_size = stop - start
 		return start + ((value - start) % range_size)
 	
-	def addTargetItem(self, target, type):
-		if type == 'top':
-			self.targetListTop.append(target)
-		elif type == 'btm':
-			self.targetListBtm.append(target)
-
-	def addPanTiltItem(self, panTilt, type):
-		if type == 'top':
-			self.panTiltListTop.append(panTilt)
-		elif type == 'btm':
-			self.panTiltListBtm.append(panTilt)
+	def getHomographyEngine(self, type):
+		# (re)builds the incremental fit from the captures when it's missing
+		if type not in self.HomographyEngines:
+			layer = self.Captures[type]
+			engine = incrementalHomography.IncrementalHomography()
+			engine.refit(layer.view('target')[:, ::2], panTiltSolver.pan_tilt_to_xy(layer.view('pan_tilt')))
+			self.HomographyEngines[type] = engine
+		return self.HomographyEngines[type]
+
+	def updateHomography(self, type, homography):
+		# live update while capturing, as soon as there are enough points.
+		# below 4 points there is no homography, the old one doesn't fit the captures anymore
+		if homography is None:
+			self.resetHomography(type)
+		else:
+			self.setHomography(type, homography)
 
-	def addPanTiltOffsetItem(self, panTiltOffset, type):
-		if type == 'top':
-			self.panTiltOffsetListTop.append(panTiltOffset)
-		elif type == 'btm':
-			self.panTiltOffsetListBtm.append(panTiltOffset)
-	
-	def addDistanceItem(self, distance, type):
-		if type == 'top':
-			self.distanceListTop.append(distance)
-		elif type == 'btm':
-			self.distanceListBtm.append(distance)
-	
 	def AddCapture(self, target, panTilt, panTiltOffset, distance, type):
-		self.addTargetItem(target, type)
-		self.addPanTiltItem(panTilt, type)
-		self.addPanTiltOffsetItem(panTiltOffset, type)
-		self.addDistanceItem(distance, type)
+		engine = self.getHomographyEngine(type)
+		h_target = panTiltSolver.pan_tilt_to_xy(panTilt)
+		self.Captures.append(type, target=target, pan_tilt=panTilt, pan_tilt_offset=panTiltOffset, distance=distance, homog_target=h_target)
+		self.updateHomography(type, engine.add((target[0], target[2]), h_target))
 
 	def ReCaptureAtIndex(self, target, panTilt, panTiltOffset, distance, index, type):
-		if type == 'top':
-			self.targetListTop.setItem(index,target)
-			self.panTiltListTop.setItem(index,panTilt)
-			self.panTiltOffsetListTop.setItem(index,panTiltOffset)
-			self.distanceListTop.setItem(index,distance)
-		elif type == 'btm':
-			self.targetListBtm.setItem(index,target)
-			self.panTiltListBtm.setItem(index,panTilt)
-			self.panTiltOffsetListBtm.setItem(index,panTiltOffset)
-			self.distanceListBtm.setItem(index,distance)
+		engine = self.getHomographyEngine(type)
+		h_target = panTiltSolver.pan_tilt_to_xy(panTilt)
+		self.Captures.set(type, index, target=target, pan_tilt=panTilt, pan_tilt_offset=panTiltOffset, distance=distance, homog_target=h_target)
+		self.updateHomography(type, engine.replace(index, (target[0], target[2]), h_target))
 
 	def DeleteCapture(self, index, type):
-		if type == 'top':
-			self.targetListTop.pop(index)
-			self.panTiltListTop.pop(index)
-			self.panTiltOffsetListTop.pop(index)
-			self.distanceListTop.pop(index)
-		elif type == 'btm':
-			self.targetListBtm.pop(index)
-			self.panTiltListBtm.pop(index)
-			self.panTiltOffsetListBtm.pop(index)
-			self.distanceListBtm.pop(index)
+		engine = self.getHomographyEngine(type)
+		self.Captures.delete(type, index)
+		self.updateHomography(type, engine.remove(index))
 
 	def DeleteLastCapture(self, type):
-		if type == 'top':
-			self.targetListTop.pop(len(self.targetListTop)-1)
-			self.panTiltListTop.pop(len(self.panTiltListTop)-1)
-			self.panTiltOffsetListTop.pop(len(self.panTiltOffsetListTop)-1)
-			self.distanceListTop.pop(len(self.distanceListTop)-1)
-		elif type == 'btm':
-			self.targetListBtm.pop(len(self.targetListBtm)-1)
-			self.panTiltListBtm.pop(len(self.panTiltListBtm)-1)
-			self.panTiltOffsetListBtm.pop(len(self.panTiltOffsetListBtm)-1)
-			self.distanceListBtm.pop(len(self.distanceListBtm)-1)
+		self.DeleteCapture(len(self.Captures[type])-1, type)
 
+	# the Get*List functions return zero-copy views into the capture store,
+	# only valid until the next capture edit (see captureStore)
 	def GetTargetList(self, type):
-		if type == 'top':
-			return self.targetListTop
-		elif type == 'btm':
-			return self.targetListBtm
+		return self.Captures[type].view('target')
 	
 	def GetPanTiltList(self, type):
-		if type == 'top':
-			return self.panTiltListTop
-		elif type == 'btm':
-			return self.panTiltListBtm
+		return self.Captures[type].view('pan_tilt')
 	
 	def GetPanTiltOffsetList(self, type):
-		if type == 'top':
-			return self.panTiltOffsetListTop
-		elif type == 'btm':
-			return self.panTiltOffsetListBtm
+		return self.Captures[type].view('pan_tilt_offset')
 
 	def GetDistanceList(self, type):
-		if type == 'top':
-			return self.distanceListTop
-		elif type == 'btm':
-			return self.distanceListBtm
+		return self.Captures[type].view('distance')
 	
 	def GetTarget(self, index, type):
-		if type == 'top':
-			return self.targetListTop.getRaw(index)
-		elif type == 'btm':
-			return self.targetListBtm.getRaw(index)
+		return self.Captures[type].row(index, 'target')
 	
 	def GetPanTilt(self, index, type):
-		if type == 'top':
-			return self.panTiltListTop.getRaw(index)
-		elif type == 'btm':
-			return self.panTiltListBtm.getRaw(index)
+		return self.Captures[type].row(index, 'pan_tilt')
 	
 	def GetPanTiltOffset(self, index, type):
-		if type == 'top':
-			return self.panTiltOffsetListTop.getRaw(index)
-		elif type == 'btm':
-			return self.panTiltOffsetListBtm.getRaw(index)
+		return self.Captures[type].row(index, 'pan_tilt_offset')
 	
 	def GetDistance(self, index, type):
+		return self.Captures[type].row(index, 'distance')
+
+	def setHomography(self, type, homography):
 		if type == 'top':
-			return self.distanceListTop.getRaw(index)
+			self.HomographyTop = homography
 		elif type == 'btm':
-			return self.distanceListBtm.getRaw(index)
+			self.HomographyBtm = homography
+		else:
+			self.LayerHomographies[type] = homography
 	
+	def resetHomography(self, type):
+		if type in ('top', 'btm'):
+			self.setHomography(type, np.array([[1.,.0,.0],[.0,1.,.0],[.0,.0,1.]]))
+		else:
+			self.LayerHomographies.pop(type, None)
+
 	def CalcHomography(self, type):
-		targets_real_space = None
-		targets_moving_head_space = None
-		if type == 'top':
-			targets_real_space = np.array(self.targetListTop).reshape(len(self.targetListTop),3)
-			targets_moving_head_space = np.array(self.panTiltListTop).reshape(len(self.panTiltListTop),2)
-		elif type == 'btm':
-			targets_real_space = np.array(self.targetListBtm).reshape(len(self.targetListBtm),3)
-			targets_moving_head_space = np.array(self.panTiltListBtm).reshape(len(self.panTiltListBtm),2)
+		layer = self.Captures[type]
 
-		# delete y dimension of targets
-		real_space_homography_points = np.delete(targets_real_space, 1, 1)
+		# x and z of the targets, the y dimension is skipped
+		real_space_homography_points = layer.view('target')[:, ::2]
 
 		# calculate x and z position from pan tilt for moving head space
-		temp_h_list = list()
-		for pan_tilt in targets_moving_head_space:
-			pan = pan_tilt[0]
-			tilt = pan_tilt[1]
-			# layer way
-			x = math.tan(math.radians(pan))
-			y = math.tan(math.radians(tilt)) / math.cos(math.radians(pan))
-			
-			# spherical representation
-			#x_vector = math.cos(math.radians(pan))
-			#y_vector = math.sin(math.radians(tilt))
-			#xy_vector = tdu.Vector(x_vector,y_vector,0)
-			#length = math.tan(math.radians(tilt/2))
-			#xy = xy_vector * length
-			#x = xy.x
-			#y = xy.y
-
-			# fish eye representation
-			#pan_x = np.interp(pan,(-180,180),(-60,60))
-			#x = math.tan(math.radians(pan_x))
-			#pan_cycle = self.cycle_range(-90,90,pan)
-			#y = math.tan(math.radians(tilt) / math.cos(math.radians(pan_cycle)))
+		# layer way, see panTiltSolver.pan_tilt_to_xy
+		
+		# spherical representation
+		#x_vector = math.cos(math.radians(pan))
+		#y_vector = math.sin(math.radians(tilt))
+		#xy_vector = tdu.Vector(x_vector,y_vector,0)
+		#length = math.tan(math.radians(tilt/2))
+		#xy = xy_vector * length
+		#x = xy.x
+		#y = xy.y
+
+		# fish eye representation
+		#pan_x = np.interp(pan,(-180,180),(-60,60))
+		#x = math.tan(math.radians(pan_x))
+		#pan_cycle = self.cycle_range(-90,90,pan)
+		#y = math.tan(math.radians(tilt) / math.cos(math.radians(pan_cycle)))
 
-			temp_h_list.append([x,y])
-		if type == 'top':
-			self.h_targetListTop = temp_h_list
-		elif type == 'btm':
-			self.h_targetListBtm = temp_h_list
+		h_targets = panTiltSolver.pan_tilt_to_xy(layer.view('pan_tilt'))
+		self.Captures.set(type, slice(None, len(layer)), homog_target=h_targets)
 		
-		# calculate homography
-		if type == 'top':
-			self.HomographyTop, s = cv2.findHomography(real_space_homography_points, np.array(temp_h_list))
-		elif type == 'btm':
-			self.HomographyBtm, s = cv2.findHomography(real_space_homography_points, np.array(temp_h_list))
+		# calculate homography, full refit of the incremental engine.
+		# normalized DLT instead of cv2.findHomography: above 4 points the algebraic
+		# fit differs slightly from OpenCV's reprojection refinement
+		engine = self.getHomographyEngine(type)
+		engine.refit(real_space_homography_points, h_targets)
+		self.updateHomography(type, engine.solve())
 
 	def CalcSideHomographies(self):
-		targets_real_space_top = np.array(self.targetListTop).reshape(4,3)
-		targets_moving_head_space_top = np.array(self.panTiltListTop).reshape(4,2)
-		targets_real_space_btm = np.array(self.targetListBtm).reshape(4,3)
-		targets_moving_head_space_btm = np.array(self.panTiltListBtm).reshape(4,2)
-
-		# create sides
-		targets_real_space_side_1_btm = targets_real_space_btm[:-2]
-		targets_real_space_side_1_top = targets_real_space_top[:-2][::-1]
-		targets_real_space_side_1 = np.concatenate((targets_real_space_side_1_btm,targets_real_space_side_1_top), axis=0)
-		targets_real_space_side_2_btm = targets_real_space_btm[2:]
-		targets_real_space_side_2_top = targets_real_space_top[2:][::-1]
-		targets_real_space_side_2 = np.concatenate((targets_real_space_side_2_btm,targets_real_space_side_2_top), axis=0)
-
-		# delete y dimension of targets
-		# # # we need to check in which direction, x or z, the first points differ. or if one of them == 0
-		x_delta = targets_real_space_btm[1][0] - targets_real_space_btm[0][0]
-		z_delta = targets_real_space_btm[1][2] - targets_real_space_btm[0][2]
-
-		if abs(x_delta) > abs(z_delta):
-			self.Dir = 'x'
-			real_space_homography_points_side_1 = np.delete(targets_real_space_side_1, 2, 1)
-			real_space_homography_points_side_2 = np.delete(targets_real_space_side_2, 2, 1)
-		else:
-			self.Dir = 'z'
-			real_space_homography_points_side_1 = np.delete(targets_real_space_side_1, 0, 1)
-			real_space_homography_points_side_2 = np.delete(targets_real_space_side_2, 0, 1)
-
-		targets_moving_head_space_side_1_btm = targets_moving_head_space_btm[:-2]
-		targets_moving_head_space_side_1_top = targets_moving_head_space_top[:-2][::-1]
-		targets_moving_head_space_side_1 = np.concatenate((targets_moving_head_space_side_1_btm,targets_moving_head_space_side_1_top), axis=0)
-		targets_moving_head_space_side_2_btm = targets_moving_head_space_btm[2:]
-		targets_moving_head_space_side_2_top = targets_moving_head_space_top[2:][::-1]
-		targets_moving_head_space_side_2 = np.concatenate((targets_moving_head_space_side_2_btm,targets_moving_head_space_side_2_top), axis=0)
-
-		# calculate x and z position from pan tilt for moving head space
-		temp_h_list_side_1 = list()
-		temp_h_list_side_2 = list()
-		for i in range(4):
-			pan_side_1 = targets_moving_head_space_side_1[i][0]
-			tilt_side_1 = targets_moving_head_space_side_1[i][1]
-			pan_side_2 = targets_moving_head_space_side_2[i][0]
-			tilt_side_2 = targets_moving_head_space_side_2[i][1]
-
-			# layer way
-			x_side_1 = math.tan(math.radians(pan_side_1))
-			y_side_1 = math.tan(math.radians(tilt_side_1)) / math.cos(math.radians(pan_side_1))
-			x_side_2 = math.tan(math.radians(pan_side_2))
-			y_side_2 = math.tan(math.radians(tilt_side_2)) / math.cos(math.radians(pan_side_2))
-			
-			# spherical representation
-			#x_vector = math.cos(math.radians(pan))
-			#y_vector = math.sin(math.radians(tilt))
-			#xy_vector = tdu.Vector(x_vector,y_vector,0)
-			#length = math.tan(math.radians(tilt/2))
-			#xy = xy_vector * length
-			#x = xy.x
-			#y = xy.y
-
-			# fish eye representation
-			#pan_x = np.interp(pan,(-180,180),(-60,60))
-			#x = math.tan(math.radians(pan_x))
-			#pan_cycle = self.cycle_range(-90,90,pan)
-			#y = math.tan(math.radians(tilt) / math.cos(math.radians(pan_cycle)))
-
-			temp_h_list_side_1.append([x_side_1,y_side_1])
-			temp_h_list_side_2.append([x_side_2,y_side_2])
-
-		self.HomographySide_1, s_1 = cv2.findHomography(real_space_homography_points_side_1, np.array(temp_h_list_side_1))
-		self.HomographySide_2, s_2 = cv2.findHomography(real_space_homography_points_side_2, np.array(temp_h_list_side_2))
+		self.Dir, self.HomographySide_1, self.HomographySide_2 = calibrationSolver.fit_sides(
+			self.Captures['btm'].view('target'), self.Captures['btm'].view('pan_tilt'),
+			self.Captures['top'].view('target'), self.Captures['top'].view('pan_tilt'))
 		debug(self.HomographySide_1,self.HomographySide_2)
 	
 	def GetHomogTargetList(self, type):
-		if type == 'top':
-			return self.h_targetListTop
-		elif type == 'btm':
-			return self.h_targetListBtm
+		return self.Captures[type].view('homog_target')
 	
 	def GetHomogTarget(self, index, type):
-		if type == 'top':
-			return self.h_targetListTop.getRaw(index)
-		elif type == 'btm':
-			return self.h_targetListBtm.getRaw(index)
+		return self.Captures[type].row(index, 'homog_target')
 		
 	def CreateTempHomographyFromPanTilt(self, targetList, panTiltList):
 		temp_h_list = list()
@@ -445,17 +361,22 @@ class MovingHeadExt:
 		else:
 			self.TempHomography = np.array([[1.,.0,.0],[.0,1.,.0],[.0,.0,1.]])
 	
-	def CalcHomogPosition(self, target, type):
+	def GetHomography(self, type):
 		if type == 'top':
-			homography = self.HomographyTop
+			return self.HomographyTop
 		elif type == 'btm':
-			homography = self.HomographyBtm
+			return self.HomographyBtm
 		elif type == 'side_1':
-			homography = self.HomographySide_1
+			return self.HomographySide_1
 		elif type == 'side_2':
-			homography = self.HomographySide_2
+			return self.HomographySide_2
+		elif type in self.LayerHomographies:
+			return self.LayerHomographies[type]
 		else:
-			homography = self.TempHomography
+			return self.TempHomography
+
+	def CalcHomogPosition(self, target, type):
+		homography = self.GetHomography(type)
 		point = [target[0], target[1], 1]
 		dest_point_homog = np.dot(homography, point)
 		dest_point_eucl = dest_point_homog / dest_point_homog[2]
@@ -493,4 +414,97 @@ class MovingHeadExt:
 		#debug("pan_cycle",pan_cycle)
 		#tilt = math.degrees(math.atan(position[1] * math.cos(math.radians(pan_cycle)))) + self.PanTiltDirection.getRaw(1)
 		#pan = pan + self.PanTiltDirection.getRaw(0)
-		return [pan ,tilt]
\ No newline at end of file
+		return [pan ,tilt]
+
+	# vectorized CalcHomogPosition + CalcPanTilt for a whole batch of targets (N,2) -> (N,2)
+	def CalcPanTiltBatch(self, targets, type):
+		return panTiltSolver.calc_pan_tilt_batch(self.GetHomography(type), targets, list(self.PanTiltDirection))[0]
+
+	# precomputed pan/tilt grid over the calibrated area of one plane
+	# bounds default to the bounding box of the captured targets of that layer
+	def EnableLUT(self, type='btm', resolution=64, tolerance=0.05, bounds=None):
+		if bounds is None:
+			bounds = panTiltLut.floor_bounds(self.Captures[type].view('target')[:, ::2])
+		self.LUTType = type
+		self.LUT = panTiltLut.PanTiltLUT(bounds, resolution=resolution, tolerance=tolerance)
+
+	def DisableLUT(self):
+		self.LUT = None
+
+	# like CalcPanTiltBatch for the LUT plane, falls back to the exact path without a LUT
+	def CalcPanTiltLUT(self, targets):
+		if self.LUT is None:
+			return self.CalcPanTiltBatch(targets, self.LUTType)
+		homography = self.GetHomography(self.LUTType)
+		pan_tilt_direction = list(self.PanTiltDirection)
+		# rebuild whenever the homography (or direction) changed since the last build
+		if self.LUT.isStale(homography, pan_tilt_direction):
+			self.LUT.build(homography, pan_tilt_direction)
+		return self.LUT.lookup(targets)
+
+	# blend of the btm and top homography for targets at any height,
+	# the relative scale is fitted to the side homographies (if calibrated)
+	def CalcHeightBlend(self):
+		sources = (self.HomographyBtm, self.HomographyTop, self.HomographySide_1, self.HomographySide_2)
+		self.HeightBlend = None
+		self.heightBlendSources = None
+		targets_btm = self.Captures['btm'].view('target')
+		targets_top = self.Captures['top'].view('target')
+		if not len(targets_btm) or not len(targets_top):
+			debug("Need btm and top captures for height targeting")
+			return
+		y_btm = targets_btm[:, 1].mean()
+		y_top = targets_top[:, 1].mean()
+		if abs(y_top - y_btm) < 1e-6:
+			debug("btm and top captures are at the same height, no height targeting")
+			return
+
+		sides = list()
+		if len(targets_btm) >= 4 and len(targets_top) >= 4:
+			# same point order as in CalcSideHomographies
+			side_targets = (np.concatenate((targets_btm[:2], targets_top[:2])), np.concatenate((targets_btm[2:4], targets_top[2:4])))
+			for homography, targets in zip((self.HomographySide_1, self.HomographySide_2), side_targets):
+				if heightTargeting.is_calibrated(homography):
+					points, plane_points = heightTargeting.side_points(self.Dir, targets)
+					sides.append((homography, points, plane_points))
+
+		scale = heightTargeting.fit_scale(self.HomographyBtm, self.HomographyTop, y_btm, y_top, sides)
+		self.HeightBlend = (self.HomographyBtm, scale * self.HomographyTop, y_btm, y_top)
+		# only a successful fit is cached, a failed one is tried again on the next call
+		self.heightBlendSources = sources
+
+	# None while btm and top aren't both calibrated
+	def GetHeightBlend(self):
+		sources = (self.HomographyBtm, self.HomographyTop, self.HomographySide_1, self.HomographySide_2)
+		if self.heightBlendSources is None or any(a is not b for a, b in zip(sources, self.heightBlendSources)):
+			self.CalcHeightBlend()
+		return self.HeightBlend
+
+	# (N,3) targets at any height -> (N,2) pan/tilt,
+	# falls back to the btm plane (x/z only) without a height blend
+	def CalcPanTilt3D(self, targets):
+		blend = self.GetHeightBlend()
+		if blend is None:
+			return self.CalcPanTiltBatch(np.asarray(targets, dtype=np.float64).reshape(-1, 3)[:, ::2], 'btm')
+		h_btm, h_top, y_btm, y_top = blend
+		return heightTargeting.calc_pan_tilt_3d(h_btm, h_top, y_btm, y_top, targets, list(self.PanTiltDirection))[0]
+
+	# nonlinear alternative to the layer homography, name is one of projectionModels.MODELS
+	# ('homography', 'spherical', 'pose'). The pose model starts from the Position par
+	def FitProjectionModel(self, name='pose', type='btm'):
+		layer = self.Captures[type]
+		if len(layer) < 4:
+			debug("Need at least 4 captures to fit a projection model")
+			return None
+		kwargs = {'position': list(self.Position)} if name == 'pose' else {}
+		model = projectionModels.fit_model(name, layer.view('target'), layer.view('pan_tilt'), **kwargs)
+		self.ProjectionModels[type] = model
+		return model
+
+	# (N,3) targets -> (N,2) pan/tilt with the projection model of the layer,
+	# falls back to the layer homography (x/z only) without a model
+	def CalcPanTiltModel(self, targets, type='btm'):
+		model = self.ProjectionModels.get(type)
+		if model is None:
+			return self.CalcPanTiltBatch(np.asarray(targets, dtype=np.float64).reshape(-1, 3)[:, ::2], type)
+		return model.evaluate(targets, list(self.PanTiltDirection))
@@ -0,0 +1,265 @@
+"""
+Benchmark and accuracy suite for the calibration math.
+
+Replays calibration files through the solver and measures per head
+	- fit time of the layer homographies (CalcHomography) and of the side
+	  homographies (CalcSideHomographies),
+	- solve throughput in targets/s, scalar (CalcHomogPosition + CalcPanTilt,
+	  one target per call like in TD) vs batch (panTiltSolver),
+	- reprojection error in degrees: in-sample, and leave-one-out for layers
+	  with more than 4 points (with exactly 4 points the homography passes
+	  through all of them, so there is nothing left to hold out, the report
+	  says so with 'leave_one_out_skipped'),
+	- cross layer error in degrees, held out that also works with 4 point
+	  layers: the pose model (see projectionModels) fitted to the btm
+	  captures, measured at the top captures, and the other way round.
+
+--models homography,spherical,pose additionally reports the fit time and
+errors of those projection models (see projectionModels).
+
+	python calibrationBenchmark.py Calibrations/*.json --report bench.json
+	python calibrationBenchmark.py Calibrations/*.json --baseline bench.json
+
+With --baseline the run is compared against an older report and the exit
+code is 1 if fits/solves got slower than --max-slowdown or the aim error grew
+by more than --max-error-increase degrees.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+import calibrationCache
+import calibrationSolver
+import panTiltLut
+import panTiltSolver
+import projectionModels
+
+REPORT_VERSION = 1
+
+def best_time(function, repeat=5, number=20):
+	# best of `repeat` runs, in seconds per call
+	best = math.inf
+	for i in range(repeat):
+		start = time.perf_counter()
+		for n in range(number):
+			function()
+		best = min(best, (time.perf_counter() - start) / number)
+	return best
+
+def scalar_pan_tilt(homography, target, pan_tilt_direction):
+	# MovingHeadExt.CalcHomogPosition + CalcPanTilt, one target at a time
+	dest_point_homog = np.dot(homography, [target[0], target[1], 1])
+	dest_point = (dest_point_homog / dest_point_homog[2])[:2]
+	pan = math.degrees(math.atan(dest_point[0]))
+	tilt = math.degrees(math.atan(dest_point[1] * math.cos(math.radians(pan)))) + pan_tilt_direction[1]
+	return [pan + pan_tilt_direction[0], tilt]
+
+def leave_one_out(targets, pan_tilt, model=None, **kwargs):
+	# error at every point of a homography (or projection model) fitted without it, needs at least 5 points
+	targets = np.asarray(targets, dtype=np.float64).reshape(-1, 3)
+	pan_tilt = np.asarray(pan_tilt, dtype=np.float64).reshape(-1, 2)
+	if len(targets) < 5:
+		return None
+	errors = np.empty(len(targets))
+	for i in range(len(targets)):
+		keep = np.arange(len(targets)) != i
+		if model is None:
+			homography, h_targets = calibrationSolver.fit_layer(targets[keep], pan_tilt[keep])
+			errors[i] = calibrationSolver.reprojection_error(homography, targets[i:i+1], pan_tilt[i:i+1])[0]
+		else:
+			errors[i] = projectionModels.fit_model(model, targets[keep], pan_tilt[keep], **kwargs).error(targets[i:i+1], pan_tilt[i:i+1])[0]
+	return errors
+
+def cross_layer(head):
+	# 'btm->top': error at the top captures of the pose model fitted to the btm captures, and the other way round
+	layers = dict()
+	for layer in ('btm', 'top'):
+		datapoints = head["DataPoints"][layer]
+		layers[layer] = (np.array([datapoint["Target"] for datapoint in datapoints], dtype=np.float64).reshape(-1, 3),
+			np.array([datapoint["PanTilt"] for datapoint in datapoints], dtype=np.float64).reshape(-1, 2))
+	result = dict()
+	for fit, held in (('btm', 'top'), ('top', 'btm')):
+		(targets, pan_tilt), (held_targets, held_pan_tilt) = layers[fit], layers[held]
+		if len(targets) < 4 or not len(held_targets):
+			continue
+		model = projectionModels.fit_model('pose', targets, pan_tilt, position=head["Position"])
+		result[f'{fit}->{held}'] = error_summary(model.error(held_targets, held_pan_tilt))
+	return result
+
+def benchmark_model(name, targets, pan_tilt, position):
+	kwargs = {'position': position} if name == 'pose' else {}
+	start = time.perf_counter()
+	model = projectionModels.fit_model(name, targets, pan_tilt, **kwargs)
+	return {
+		'fit_seconds': time.perf_counter() - start,
+		'error': error_summary(model.error(targets, pan_tilt)),
+		'leave_one_out': error_summary(leave_one_out(targets, pan_tilt, name, **kwargs)),
+	}
+
+def error_summary(errors):
+	if errors is None or not len(errors):
+		return None
+	errors = np.asarray(errors)
+	return {'points': len(errors), 'mean': float(errors.mean()), 'p95': float(np.percentile(errors, 95)), 'max': float(errors.max())}
+
+def solve_targets(targets, count):
+	# regular grid of count targets over the calibrated floor area
+	(x_min, z_min), (x_max, z_max) = panTiltLut.floor_bounds(np.asarray(targets, dtype=np.float64).reshape(-1, 3)[:, ::2])
+	side = max(int(math.sqrt(count)), 1)
+	xs, zs = np.meshgrid(np.linspace(x_min, x_max, side), np.linspace(z_min, z_max, side))
+	return np.stack((xs.ravel(), zs.ravel()), axis=1)
+
+def benchmark_head(file, targets_count=1024, repeat=5, models=()):
+	head = calibrationCache.load_calibration(file)
+	pan_tilt_direction = [float(v) for v in head["PanTiltDirection"]]
+	report = {'file': file, 'layers': {}}
+
+	for layer in calibrationCache.LAYERS:
+		datapoints = head["DataPoints"][layer]
+		if len(datapoints) < 4:
+			continue
+		targets = np.array([datapoint["Target"] for datapoint in datapoints], dtype=np.float64)
+		pan_tilt = np.array([datapoint["PanTilt"] for datapoint in datapoints], dtype=np.float64)
+		homography, h_targets = calibrationSolver.fit_layer(targets, pan_tilt)
+
+		grid = solve_targets(targets, targets_count)
+		scalar = best_time(lambda: [scalar_pan_tilt(homography, target, pan_tilt_direction) for target in grid], repeat, 1)
+		batch = best_time(lambda: panTiltSolver.calc_pan_tilt_batch(homography, grid, pan_tilt_direction), repeat)
+
+		report['layers'][layer] = {
+			'points': len(targets),
+			'fit_seconds': best_time(lambda: calibrationSolver.fit_layer(targets, pan_tilt), repeat),
+			'scalar_targets_per_second': len(grid) / scalar,
+			'batch_targets_per_second': len(grid) / batch,
+			'error': error_summary(calibrationSolver.reprojection_error(homography, targets, pan_tilt)),
+			'leave_one_out': error_summary(leave_one_out(targets, pan_tilt)),
+		}
+		if report['layers'][layer]['leave_one_out'] is None:
+			report['layers'][layer]['leave_one_out_skipped'] = f"{len(targets)} points, needs at least 5"
+		if models:
+			report['layers'][layer]['models'] = {name: benchmark_model(name, targets, pan_tilt, head["Position"]) for name in models}
+
+	top = head["DataPoints"]['top']
+	btm = head["DataPoints"]['btm']
+	if len(top) >= 4 and len(btm) >= 4:
+		sides = ([d["Target"] for d in btm], [d["PanTilt"] for d in btm], [d["Target"] for d in top], [d["PanTilt"] for d in top])
+		report['sides_fit_seconds'] = best_time(lambda: calibrationSolver.fit_sides(*sides), repeat)
+	report['cross_layer'] = cross_layer(head)
+	return report
+
+def summarize(heads):
+	def stats(values):
+		return {'median': float(np.median(values)), 'min': float(np.min(values)), 'max': float(np.max(values))} if values else None
+
+	layers = [layer for head in heads for layer in head['layers'].values()]
+	errors = [layer['error']['max'] for layer in layers if layer['error']]
+	loo = [layer['leave_one_out']['max'] for layer in layers if layer['leave_one_out']]
+	cross = [errors['max'] for head in heads for errors in head.get('cross_layer', {}).values() if errors]
+	return {
+		'heads': len(heads),
+		'fit_seconds': stats([layer['fit_seconds'] for layer in layers]),
+		'sides_fit_seconds': stats([head['sides_fit_seconds'] for head in heads if 'sides_fit_seconds' in head]),
+		'scalar_targets_per_second': stats([layer['scalar_targets_per_second'] for layer in layers]),
+		'batch_targets_per_second': stats([layer['batch_targets_per_second'] for layer in layers]),
+		'error_max': max(errors) if errors else None,
+		'leave_one_out_max': max(loo) if loo else None,
+		'leave_one_out_skipped': sum(1 for layer in layers if 'leave_one_out_skipped' in layer),
+		'cross_layer_max': max(cross) if cross else None,
+	}
+
+def compare(report, baseline, max_slowdown=1.5, max_error_increase=0.1):
+	# list of regressions of report against baseline, empty if all is fine
+	regressions = list()
+	current = report['summary']
+	previous = baseline['summary']
+	for key in ('fit_seconds', 'sides_fit_seconds'):
+		if current[key] and previous[key] and current[key]['median'] > previous[key]['median'] * max_slowdown:
+			regressions.append(f"{key}: {current[key]['median']*1e6:.1f} us, was {previous[key]['median']*1e6:.1f} us")
+	for key in ('scalar_targets_per_second', 'batch_targets_per_second'):
+		if current[key] and previous[key] and current[key]['median'] * max_slowdown < previous[key]['median']:
+			regressions.append(f"{key}: {current[key]['median']:.0f}, was {previous[key]['median']:.0f}")
+
+	# aim accuracy per file and layer
+	previous_heads = {os.path.basename(head['file']): head for head in baseline['heads']}
+	for head in report['heads']:
+		old = previous_heads.get(os.path.basename(head['file']))
+		if old is None:
+			continue
+		for layer, values in head['layers'].items():
+			for key in ('error', 'leave_one_out'):
+				new_error = values.get(key)
+				old_error = old['layers'].get(layer, {}).get(key)
+				if new_error and old_error and new_error['max'] > old_error['max'] + max_error_increase:
+					regressions.append(f"{os.path.basename(head['file'])} {layer} {key}: {new_error['max']:.3f} deg, was {old_error['max']:.3f} deg")
+		for direction, new_error in head.get('cross_layer', {}).items():
+			old_error = old.get('cross_layer', {}).get(direction)
+			if new_error and old_error and new_error['max'] > old_error['max'] + max_error_increase:
+				regressions.append(f"{os.path.basename(head['file'])} cross layer {direction}: {new_error['max']:.3f} deg, was {old_error['max']:.3f} deg")
+	return regressions
+
+def run(files, targets_count=1024, repeat=5, models=()):
+	start = time.perf_counter()
+	heads = [benchmark_head(file, targets_count, repeat, models) for file in files]
+	return {
+		'version': REPORT_VERSION,
+		'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+		'python': platform.python_version(),
+		'numpy': np.__version__,
+		'machine': platform.machine(),
+		'seconds': time.perf_counter() - start,
+		'targets': targets_count,
+		'summary': summarize(heads),
+		'heads': heads,
+	}
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description="Benchmark fit time, solve throughput and aim accuracy over calibration files.")
+	parser.add_argument('files', nargs='+', help="calibration json files")
+	parser.add_argument('--targets', type=int, default=1024, help="targets per head for the throughput test")
+	parser.add_argument('--repeat', type=int, default=5, help="timing repetitions, the best one counts")
+	parser.add_argument('--models', default='', help="comma separated projection models to compare, e.g. homography,spherical,pose")
+	parser.add_argument('--report', help="write the report as json to this file")
+	parser.add_argument('--baseline', help="compare against an older report")
+	parser.add_argument('--max-slowdown', type=float, default=1.5, help="allowed slowdown factor against the baseline")
+	parser.add_argument('--max-error-increase', type=float, default=0.1, help="allowed error increase in degrees against the baseline")
+	args = parser.parse_args(args)
+
+	report = run(args.files, args.targets, args.repeat, [name for name in args.models.split(',') if name])
+
+	for head in report['heads']:
+		for layer, values in head['layers'].items():
+			loo = f"{values['leave_one_out']['max']:.3f} deg" if values['leave_one_out'] else f"skipped ({values['leave_one_out_skipped']})"
+			print(f"{os.path.basename(head['file'])} {layer}: fit {values['fit_seconds']*1e6:.0f} us, "
+				f"scalar {values['scalar_targets_per_second']:.0f}/s, batch {values['batch_targets_per_second']:.0f}/s, "
+				f"error {values['error']['max']:.3f} deg, leave one out {loo}")
+			for name, model in values.get('models', {}).items():
+				loo = f"{model['leave_one_out']['max']:.3f} deg" if model['leave_one_out'] else '-'
+				print(f"    {name}: fit {model['fit_seconds']*1e3:.1f} ms, error {model['error']['max']:.3f} deg, leave one out {loo}")
+		if head['cross_layer']:
+			print(f"{os.path.basename(head['file'])} cross layer (pose): " + ', '.join(f"{direction} {errors['max']:.3f} deg" for direction, errors in head['cross_layer'].items()))
+	summary = report['summary']
+	print(f"{summary['heads']} heads in {report['seconds']:.2f} s, max error {summary['error_max']} deg, max leave one out error {summary['leave_one_out_max']} deg "
+		f"({summary['leave_one_out_skipped']} layers skipped), max cross layer error {summary['cross_layer_max']} deg")
+
+	if args.report:
+		with open(args.report, 'w') as f:
+			json.dump(report, f, indent=4)
+
+	if args.baseline:
+		with open(args.baseline) as f:
+			regressions = compare(report, json.load(f), args.max_slowdown, args.max_error_increase)
+		for regression in regressions:
+			print("regression:", regression)
+		if regressions:
+			sys.exit(1)
+	return report
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,179 @@
+"""
+Compiled calibration snapshot of a whole rig.
+
+Parsing one indented JSON per head and replaying every data point through
+AddCapture gets slow with many fixtures. This module compiles all
+Calibrations/*.json of a rig into one .npz file. The snapshot is rebuilt
+automatically when one of the source files changed (mtime/size, or a content
+hash with use_hash=True), otherwise it's loaded with a single read.
+
+Usage from TD (e.g. in the rig component):
+	snapshot = calibrationCache.load_rig(files, 'Calibrations/rig.npz')
+	calibrationCache.apply_snapshot(snapshot, movingHeads)
+
+From the command line, to see the load times:
+	python calibrationCache.py Calibrations/acz_*_r.json
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+LAYERS = ('top', 'btm')
+HOMOGRAPHIES = ('top', 'btm', 'side_1', 'side_2')
+CACHE_VERSION = 1
+
+def file_stamp(file, use_hash=False):
+	if use_hash:
+		with open(file, 'rb') as f:
+			return hashlib.sha1(f.read()).hexdigest()
+	stat = os.stat(file)
+	return f'{stat.st_mtime_ns}:{stat.st_size}'
+
+def parse_calibration(parsed_json):
+	# normalizes the old "DataPoints"/"Homography" and the current "DataPointsTop/Btm" schema
+	head = dict()
+	head["Position"] = parsed_json["Position"]
+	head["Rotation"] = parsed_json["Rotation"]
+	head["PanTiltDirection"] = parsed_json.get("PanTiltDirection", [0, 90])
+	head["Axis"] = parsed_json.get("Axis", 'x')
+	head["DMXStartingAddress"] = parsed_json.get("DMXStartingAddress", 1)
+
+	identity = np.eye(3).tolist()
+	if "DataPoints" in parsed_json:
+		head["DataPoints"] = {'top': [], 'btm': parsed_json["DataPoints"]}
+		head["Homographies"] = {'top': identity, 'btm': parsed_json.get("Homography", identity)}
+	else:
+		head["DataPoints"] = {'top': parsed_json.get("DataPointsTop", []), 'btm': parsed_json.get("DataPointsBtm", [])}
+		head["Homographies"] = {'top': parsed_json.get("HomographyTop", identity), 'btm': parsed_json.get("HomographyBtm", identity)}
+	head["Homographies"]['side_1'] = parsed_json.get("HomographySide_1", parsed_json.get("HomographyLeft", identity))
+	head["Homographies"]['side_2'] = parsed_json.get("HomographySide_2", parsed_json.get("HomographyRight", identity))
+	# some older files store flat 9-lists
+	head["Homographies"] = {t: np.array(h, dtype=np.float64).reshape(3, 3) for t, h in head["Homographies"].items()}
+	return head
+
+def load_calibration(file):
+	with open(file) as jsonfile:
+		return parse_calibration(json.load(jsonfile))
+
+def compile_rig(files, cache_file=None, use_hash=False):
+	heads = [load_calibration(file) for file in files]
+
+	points = {'target': [], 'pan_tilt': [], 'pan_tilt_offset': [], 'distance': [], 'homog_target': []}
+	counts = np.zeros((len(heads), len(LAYERS)), dtype=np.int64)
+	for h, head in enumerate(heads):
+		for l, layer in enumerate(LAYERS):
+			datapoints = head["DataPoints"][layer]
+			counts[h, l] = len(datapoints)
+			for datapoint in datapoints:
+				distance = datapoint.get("Distance")
+				points['target'].append(datapoint.get("Target"))
+				points['pan_tilt'].append(datapoint.get("PanTilt"))
+				points['pan_tilt_offset'].append(datapoint.get("PanTiltOffset") or [0, 0])
+				points['distance'].append(np.nan if distance is None else distance)
+				points['homog_target'].append(datapoint.get("HomogTarget") or [0, 0])
+
+	arrays = dict(
+		version = np.array(CACHE_VERSION),
+		files = np.array([os.path.abspath(file) for file in files]),
+		stamps = np.array([file_stamp(file, use_hash) for file in files]),
+		use_hash = np.array(use_hash),
+		position = np.array([head["Position"] for head in heads], dtype=np.float64).reshape(-1, 3),
+		rotation = np.array([head["Rotation"] for head in heads], dtype=np.float64).reshape(-1, 3),
+		pan_tilt_direction = np.array([head["PanTiltDirection"] for head in heads], dtype=np.float64).reshape(-1, 2),
+		axis = np.array([head["Axis"] for head in heads]),
+		dmx_starting_address = np.array([head["DMXStartingAddress"] for head in heads], dtype=np.int64),
+		homographies = np.array([[head["Homographies"][t] for t in HOMOGRAPHIES] for head in heads]).reshape(-1, len(HOMOGRAPHIES), 3, 3),
+		counts = counts,
+		target = np.array(points['target'], dtype=np.float64).reshape(-1, 3),
+		pan_tilt = np.array(points['pan_tilt'], dtype=np.float64).reshape(-1, 2),
+		pan_tilt_offset = np.array(points['pan_tilt_offset'], dtype=np.float64).reshape(-1, 2),
+		distance = np.array(points['distance'], dtype=np.float64),
+		homog_target = np.array(points['homog_target'], dtype=np.float64).reshape(-1, 2),
+	)
+	if cache_file:
+		with open(cache_file, 'wb') as f:
+			np.savez(f, **arrays)
+	return RigSnapshot(arrays)
+
+def is_valid(arrays, files):
+	if int(arrays['version']) != CACHE_VERSION:
+		return False
+	if list(arrays['files']) != [os.path.abspath(file) for file in files]:
+		return False
+	use_hash = bool(arrays['use_hash'])
+	try:
+		return list(arrays['stamps']) == [file_stamp(file, use_hash) for file in files]
+	except OSError:
+		return False
+
+def load_rig(files, cache_file, use_hash=False):
+	# loads the snapshot, recompiles it if it is missing or outdated
+	files = list(files)
+	if os.path.exists(cache_file):
+		try:
+			with np.load(cache_file) as npz:
+				arrays = {key: npz[key] for key in npz.files}
+		except (OSError, ValueError):
+			arrays = None
+		if arrays and bool(arrays['use_hash']) == use_hash and is_valid(arrays, files):
+			return RigSnapshot(arrays)
+	return compile_rig(files, cache_file, use_hash)
+
+class RigSnapshot:
+	"""
+	All calibrations of a rig as flat arrays. Data points of head h and layer l
+	are the rows starts[h, l]:starts[h, l]+counts[h, l] of the point arrays.
+	"""
+	def __init__(self, arrays):
+		self.arrays = arrays
+		self.counts = arrays['counts']
+		self.starts = (np.cumsum(self.counts.ravel()) - self.counts.ravel()).reshape(self.counts.shape)
+
+	def __len__(self):
+		return len(self.arrays['files'])
+
+	def __getattr__(self, name):
+		try:
+			return self.__dict__['arrays'][name]
+		except KeyError:
+			raise AttributeError(name)
+
+	def points(self, index, layer, column):
+		l = LAYERS.index(layer)
+		start = self.starts[index, l]
+		return self.arrays[column][start:start + self.counts[index, l]]
+
+	def homography(self, index, type):
+		return self.arrays['homographies'][index, HOMOGRAPHIES.index(type)]
+
+	def index_of(self, file):
+		return list(self.arrays['files']).index(os.path.abspath(file))
+
+def apply_snapshot(snapshot, movingHeads):
+	# movingHeads in the same order as the files the snapshot was built from
+	for index, movingHead in enumerate(movingHeads):
+		movingHead.LoadSnapshot(snapshot, index)
+
+if __name__ == '__main__':
+	import sys
+	import tempfile
+	import time
+
+	files = sys.argv[1:]
+	cache_file = os.path.join(tempfile.gettempdir(), 'lightingrig_calibration_cache.npz')
+
+	start = time.perf_counter()
+	for file in files:
+		load_calibration(file)
+	print(f'parse json:    {len(files)} files in {1000*(time.perf_counter()-start):.2f} ms')
+
+	start = time.perf_counter()
+	snapshot = compile_rig(files, cache_file)
+	print(f'compile:       {len(files)} files in {1000*(time.perf_counter()-start):.2f} ms')
+
+	start = time.perf_counter()
+	snapshot = load_rig(files, cache_file)
+	print(f'load snapshot: {len(snapshot)} heads, {int(snapshot.counts.sum())} data points in {1000*(time.perf_counter()-start):.2f} ms')
@@ -0,0 +1,165 @@
+"""
+Headless calibration solver.
+
+The calibration math of MovingHeadExt without TouchDesigner: loads
+Calibrations/*.json (old "DataPoints" and current "DataPointsTop/Btm" files),
+fits the layer and side homographies, reports the reprojection error per head
+and optionally writes the results back into the files.
+
+	python calibrationSolver.py Calibrations/acz/*.json
+	python calibrationSolver.py Calibrations/acz/*.json --write --workers 8 --report solve.json
+
+Only needs numpy, heads are solved in parallel in a process pool.
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import calibrationCache
+import incrementalHomography
+import panTiltSolver
+
+def fit_layer(targets, pan_tilt):
+	# homography from the x/z of the targets to the laser way xy of the pan/tilt values
+	targets = np.asarray(targets, dtype=np.float64).reshape(-1, 3)
+	h_targets = panTiltSolver.pan_tilt_to_xy(np.asarray(pan_tilt, dtype=np.float64).reshape(-1, 2))
+	if len(targets) < 4:
+		return None, h_targets
+	return incrementalHomography.fit_homography(targets[:, ::2], h_targets), h_targets
+
+def fit_sides(targets_btm, pan_tilt_btm, targets_top, pan_tilt_top):
+	# the two vertical planes through the first/last two points of btm and top, see MovingHeadExt.CalcSideHomographies
+	targets_btm = np.asarray(targets_btm, dtype=np.float64)[:4]
+	targets_top = np.asarray(targets_top, dtype=np.float64)[:4]
+	pan_tilt_btm = np.asarray(pan_tilt_btm, dtype=np.float64)[:4]
+	pan_tilt_top = np.asarray(pan_tilt_top, dtype=np.float64)[:4]
+
+	targets_side_1 = np.concatenate((targets_btm[:-2], targets_top[:-2][::-1]), axis=0)
+	targets_side_2 = np.concatenate((targets_btm[2:], targets_top[2:][::-1]), axis=0)
+	pan_tilt_side_1 = np.concatenate((pan_tilt_btm[:-2], pan_tilt_top[:-2][::-1]), axis=0)
+	pan_tilt_side_2 = np.concatenate((pan_tilt_btm[2:], pan_tilt_top[2:][::-1]), axis=0)
+
+	# we need to check in which direction, x or z, the first points differ
+	x_delta = targets_btm[1][0] - targets_btm[0][0]
+	z_delta = targets_btm[1][2] - targets_btm[0][2]
+	if abs(x_delta) > abs(z_delta):
+		dir = 'x'
+		plane_side_1 = np.delete(targets_side_1, 2, 1)
+		plane_side_2 = np.delete(targets_side_2, 2, 1)
+	else:
+		dir = 'z'
+		plane_side_1 = np.delete(targets_side_1, 0, 1)
+		plane_side_2 = np.delete(targets_side_2, 0, 1)
+
+	homography_side_1 = incrementalHomography.fit_homography(plane_side_1, panTiltSolver.pan_tilt_to_xy(pan_tilt_side_1))
+	homography_side_2 = incrementalHomography.fit_homography(plane_side_2, panTiltSolver.pan_tilt_to_xy(pan_tilt_side_2))
+	return dir, homography_side_1, homography_side_2
+
+def pan_tilt_error(solved, pan_tilt):
+	# pan/tilt distance between solved and captured values in degrees, per point.
+	# the laser way only knows tilt modulo 180 and can't tell (pan, tilt) from (pan + 180, -tilt),
+	# so the closest of the equivalent solutions counts
+	solved = np.asarray(solved, dtype=np.float64).reshape(-1, 2)
+	pan_tilt = np.asarray(pan_tilt, dtype=np.float64).reshape(-1, 2)
+	mirrored = np.stack((solved[:, 0] + 180., -solved[:, 1]), axis=1)
+	errors = list()
+	for candidate in (solved, mirrored):
+		for tilt_offset in (0., 180.):
+			diff = (candidate + (0., tilt_offset) - pan_tilt + 180.) % 360. - 180.
+			errors.append(np.sqrt((diff**2).sum(axis=1)))
+	return np.min(errors, axis=0)
+
+def reprojection_error(homography, targets, pan_tilt):
+	targets = np.asarray(targets, dtype=np.float64).reshape(-1, 3)
+	solved = panTiltSolver.calc_pan_tilt_batch(homography, targets[:, ::2], (0., 0.))[0]
+	return pan_tilt_error(solved, pan_tilt)
+
+def solve_calibration(parsed_json):
+	head = calibrationCache.parse_calibration(parsed_json)
+	result = {'layers': {}, 'error': {}}
+	for layer in calibrationCache.LAYERS:
+		datapoints = head["DataPoints"][layer]
+		if not datapoints:
+			continue
+		targets = [datapoint["Target"] for datapoint in datapoints]
+		pan_tilt = [datapoint["PanTilt"] for datapoint in datapoints]
+		homography, h_targets = fit_layer(targets, pan_tilt)
+		result['layers'][layer] = {'homography': homography, 'h_targets': h_targets}
+		if homography is not None:
+			error = reprojection_error(homography, targets, pan_tilt)
+			result['error'][layer] = {'points': len(error), 'mean': float(error.mean()), 'max': float(error.max())}
+
+	top = head["DataPoints"]['top']
+	btm = head["DataPoints"]['btm']
+	if len(top) >= 4 and len(btm) >= 4:
+		dir, side_1, side_2 = fit_sides(
+			[d["Target"] for d in btm], [d["PanTilt"] for d in btm],
+			[d["Target"] for d in top], [d["PanTilt"] for d in top])
+		result['sides'] = {'dir': dir, 'side_1': side_1, 'side_2': side_2}
+	return result
+
+def apply_result(parsed_json, result):
+	# writes the solution back into the original schema
+	old_schema = "DataPoints" in parsed_json
+	for layer, fit in result['layers'].items():
+		key = "DataPoints" if old_schema else "DataPoints" + layer.capitalize()
+		for datapoint, h_target in zip(parsed_json[key], fit['h_targets']):
+			datapoint["HomogTarget"] = h_target.tolist()
+		if fit['homography'] is not None:
+			parsed_json["Homography" if old_schema else "Homography" + layer.capitalize()] = fit['homography'].tolist()
+	if 'sides' in result:
+		left_right = "HomographyLeft" in parsed_json and "HomographySide_1" not in parsed_json
+		parsed_json["HomographyLeft" if left_right else "HomographySide_1"] = result['sides']['side_1'].tolist()
+		parsed_json["HomographyRight" if left_right else "HomographySide_2"] = result['sides']['side_2'].tolist()
+	return parsed_json
+
+def solve_file(file, write=False):
+	start = time.perf_counter()
+	with open(file) as jsonfile:
+		parsed_json = json.load(jsonfile)
+	result = solve_calibration(parsed_json)
+	if write:
+		with open(file, 'w') as jsonfile:
+			json.dump(apply_result(parsed_json, result), jsonfile, indent=4)
+	return {
+		'file': file,
+		'error': result['error'],
+		'dir': result.get('sides', {}).get('dir'),
+		'seconds': time.perf_counter() - start,
+	}
+
+def solve_rig(files, write=False, workers=None):
+	if workers == 1 or len(files) < 2:
+		return [solve_file(file, write) for file in files]
+	with ProcessPoolExecutor(max_workers=workers) as pool:
+		return list(pool.map(solve_file, files, [write] * len(files)))
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description="Fit moving head homographies from calibration files.")
+	parser.add_argument('files', nargs='+', help="calibration json files")
+	parser.add_argument('--write', action='store_true', help="write homographies back into the files")
+	parser.add_argument('--workers', type=int, default=None, help="size of the process pool (default: cpu count)")
+	parser.add_argument('--report', help="write the per head report as json to this file")
+	args = parser.parse_args(args)
+
+	start = time.perf_counter()
+	reports = solve_rig(args.files, args.write, args.workers)
+	duration = time.perf_counter() - start
+
+	for report in reports:
+		errors = ", ".join(f"{layer}: {e['mean']:.3f}/{e['max']:.3f} deg ({e['points']} pts)" for layer, e in report['error'].items())
+		print(f"{os.path.basename(report['file'])}: {errors or 'not enough points'}")
+	print(f"solved {len(reports)} heads in {duration:.2f} s")
+
+	if args.report:
+		with open(args.report, 'w') as f:
+			json.dump({'seconds': duration, 'heads': reports}, f, indent=4)
+	return reports
+
+if __name__ == '__main__':
+	main()
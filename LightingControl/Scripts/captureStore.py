@@ -0,0 +1,171 @@
+"""
+Columnar store for calibration captures.
+
+Every layer ('top', 'btm', or any other name) keeps its captures in one
+contiguous numpy array per column. Columns can be read as zero-copy views,
+e.g. store['btm'].view('target')[:, ::2] are the x/z coordinates of all bottom
+targets without building a new array. A view shows later set()s, but not
+rows added later, and once an append grows the layer past its capacity the
+arrays get reallocated and older views no longer follow the layer. Copy a
+view to keep it across edits.
+
+Edits call onChange once. Inside a `with store.batch():` block all edits are
+collected and onChange is called once when the block is left.
+"""
+
+from contextlib import contextmanager
+
+import numpy as np
+
+# column name -> width
+COLUMNS = {
+	'target': 3,
+	'pan_tilt': 2,
+	'pan_tilt_offset': 2,
+	'distance': 1,
+	'homog_target': 2,
+}
+
+class CaptureLayer:
+	def __init__(self, name, capacity=8):
+		self.name = name
+		self.size = 0
+		self.columns = {column: np.zeros((capacity, width)) for column, width in COLUMNS.items()}
+
+	def __len__(self):
+		return self.size
+
+	@property
+	def capacity(self):
+		return len(self.columns['target'])
+
+	def view(self, column):
+		# valid until the next append/assign that grows the capacity (see reserve)
+		if COLUMNS[column] == 1:
+			return self.columns[column][:self.size, 0]
+		return self.columns[column][:self.size]
+
+	def row(self, index, column):
+		# single value as python object, like the old dependable lists returned it
+		value = self.view(column)[index]
+		if COLUMNS[column] == 1:
+			return None if np.isnan(value) else float(value)
+		return value.tolist()
+
+	def reserve(self, capacity):
+		if capacity <= self.capacity:
+			return
+		capacity = max(capacity, 2 * self.capacity)
+		for column, values in self.columns.items():
+			grown = np.zeros((capacity, values.shape[1]))
+			grown[:self.size] = values[:self.size]
+			self.columns[column] = grown
+
+	def set(self, index, **values):
+		# index or slice of the existing rows
+		if isinstance(index, slice):
+			index = slice(*index.indices(self.size))
+		else:
+			if index < 0:
+				index += self.size
+			if not 0 <= index < self.size:
+				raise IndexError(f"capture {index} out of range for layer {self.name} with {self.size} captures")
+		for column, value in values.items():
+			if COLUMNS[column] == 1:
+				value = np.nan if value is None else value
+			self.columns[column][index] = value
+
+	def append(self, **values):
+		self.reserve(self.size + 1)
+		self.size += 1
+		self.set(self.size - 1, **values)
+
+	def delete(self, index):
+		if index < 0:
+			index += self.size
+		for values in self.columns.values():
+			values[index:self.size - 1] = values[index + 1:self.size]
+			values[self.size - 1] = 0
+		self.size -= 1
+
+	def assign(self, **values):
+		# replaces the whole layer; columns that are not given are zeroed
+		size = len(next(iter(values.values()))) if values else 0
+		self.reserve(size)
+		for column in self.columns:
+			self.columns[column][:] = 0
+		self.size = size
+		for column, value in values.items():
+			value = np.asarray(value, dtype=np.float64)
+			self.columns[column][:size] = value.reshape(size, COLUMNS[column])
+
+	def clear(self):
+		for values in self.columns.values():
+			values[:] = 0
+		self.size = 0
+
+class CaptureStore:
+	def __init__(self, layers=(), onChange=None):
+		self.layers = {}
+		self.onChange = onChange
+		self.version = 0
+		self.batchDepth = 0
+		self.dirty = False
+		for name in layers:
+			self.layers[name] = CaptureLayer(name)
+
+	def __getitem__(self, name):
+		return self.layer(name)
+
+	def __contains__(self, name):
+		return name in self.layers
+
+	def __iter__(self):
+		return iter(self.layers)
+
+	def layer(self, name):
+		if name not in self.layers:
+			self.layers[name] = CaptureLayer(name)
+		return self.layers[name]
+
+	@contextmanager
+	def batch(self):
+		self.batchDepth += 1
+		try:
+			yield self
+		finally:
+			self.batchDepth -= 1
+			if self.batchDepth == 0 and self.dirty:
+				self.notify()
+
+	def changed(self):
+		self.dirty = True
+		if self.batchDepth == 0:
+			self.notify()
+
+	def notify(self):
+		self.dirty = False
+		self.version += 1
+		if self.onChange:
+			self.onChange(self)
+
+	def append(self, layer, **values):
+		self.layer(layer).append(**values)
+		self.changed()
+
+	def set(self, layer, index, **values):
+		self.layer(layer).set(index, **values)
+		self.changed()
+
+	def delete(self, layer, index):
+		self.layer(layer).delete(index)
+		self.changed()
+
+	def assign(self, layer, **values):
+		self.layer(layer).assign(**values)
+		self.changed()
+
+	def clear(self, layer=None):
+		for name in ([layer] if layer else list(self.layers)):
+			self.layer(name).clear()
+		self.changed()
@@ -0,0 +1,129 @@
+"""
+Height aware targeting, blending the btm and top plane homographies.
+
+For a target (x, y, z) both plane homographies are applied to (x, z) and the
+homogeneous results are interpolated linearly by the height y between the btm
+and the top plane:
+	h = (1 - t) * H_btm @ (x, z, 1) + t * s * H_top @ (x, z, 1)
+	t = (y - y_btm) / (y_top - y_btm)
+For an ideal projection that's exact for every height (the plane homographies
+only differ in their translation column), and it always reproduces the btm and
+top calibration on their planes.
+
+The relative scale s of the two homographies isn't fixed by the planes alone.
+It starts as the least squares match of the shared x/z columns and is then
+fitted so the blend agrees with the side homographies (vertical planes through
+the calibration points) over their area.
+
+Shapes for the batch functions:
+	h_btm, h_top		(H,3,3)
+	y_btm, y_top		(H,)
+	targets				(N,3) x/y/z, y is up
+	pan_tilt_directions	(H,2)
+	result				(H,N,2)
+"""
+
+import numpy as np
+
+import panTiltSolver
+
+def is_calibrated(homography):
+	homography = np.asarray(homography, dtype=np.float64)
+	return homography.shape == (3, 3) and bool(np.all(np.isfinite(homography))) and bool(np.any(homography)) and not np.allclose(homography, np.eye(3))
+
+def initial_scale(h_btm, h_top):
+	# least squares s for h_btm[:, :2] ~ s * h_top[:, :2]
+	a = np.asarray(h_btm, dtype=np.float64)[:, :2]
+	b = np.asarray(h_top, dtype=np.float64)[:, :2]
+	return float((a * b).sum() / (b * b).sum())
+
+def side_points(dir, targets):
+	# corners and a grid inside the side rectangle, as real space (x, y, z) points and side plane coordinates
+	targets = np.asarray(targets, dtype=np.float64).reshape(-1, 3)
+	axis = 0 if dir == 'x' else 2
+	dropped = 2 if dir == 'x' else 0
+	u = np.linspace(targets[:, axis].min(), targets[:, axis].max(), 5)
+	v = np.linspace(targets[:, 1].min(), targets[:, 1].max(), 5)
+	uu, vv = np.meshgrid(u, v)
+	points = np.zeros((uu.size, 3))
+	points[:, axis] = uu.ravel()
+	points[:, 1] = vv.ravel()
+	points[:, dropped] = targets[:, dropped].mean()
+	# side homographies use (x, y) for dir 'x' and (y, z) for dir 'z', see CalcSideHomographies
+	plane = points[:, :2] if dir == 'x' else points[:, 1:]
+	return points, plane
+
+def fit_scale(h_btm, h_top, y_btm, y_top, sides=(), iterations=60):
+	# sides: list of (side homography, real space points (K,3), side plane points (K,2))
+	scale = initial_scale(h_btm, h_top)
+	if not sides:
+		return scale
+	points = np.concatenate([side[1] for side in sides])
+	expected = np.concatenate([homog_points(side[0], side[2]) for side in sides])
+
+	def cost(log_scale):
+		xy = blend_positions(h_btm, np.exp(log_scale) * np.sign(scale) * np.asarray(h_top), y_btm, y_top, points)
+		return np.nanmean(((xy - expected)**2).sum(axis=-1))
+
+	# golden section search on log |s| around the initial guess
+	low, high = np.log(abs(scale)) - 2., np.log(abs(scale)) + 2.
+	ratio = (np.sqrt(5) - 1) / 2
+	a, b = high - ratio * (high - low), low + ratio * (high - low)
+	cost_a, cost_b = cost(a), cost(b)
+	for i in range(iterations):
+		if cost_a < cost_b:
+			high, b, cost_b = b, a, cost_a
+			a = high - ratio * (high - low)
+			cost_a = cost(a)
+		else:
+			low, a, cost_a = a, b, cost_b
+			b = low + ratio * (high - low)
+			cost_b = cost(b)
+	return float(np.sign(scale) * np.exp((low + high) / 2))
+
+def homog_points(homography, points):
+	homography = np.asarray(homography, dtype=np.float64)
+	points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+	dest = points @ homography[:, :2].T + homography[:, 2]
+	return dest[:, :2] / dest[:, 2:]
+
+def blend_positions(h_btm, h_top, y_btm, y_top, targets):
+	# (H,3,3), (H,3,3), (H,), (H,), (N,3) -> (H,N,2) homography plane coordinates
+	h_btm = np.asarray(h_btm, dtype=np.float64)
+	h_top = np.asarray(h_top, dtype=np.float64)
+	targets = np.asarray(targets, dtype=np.float64).reshape(-1, 3)
+	single = h_btm.ndim == 2
+	if single:
+		h_btm = h_btm[np.newaxis]
+		h_top = h_top[np.newaxis]
+	y_btm = np.asarray(y_btm, dtype=np.float64).reshape(-1, 1, 1)
+	y_top = np.asarray(y_top, dtype=np.float64).reshape(-1, 1, 1)
+	xz = targets[:, ::2]
+	dest_btm = np.einsum('hij,nj->hni', h_btm[:, :, :2], xz) + h_btm[:, np.newaxis, :, 2]
+	dest_top = np.einsum('hij,nj->hni', h_top[:, :, :2], xz) + h_top[:, np.newaxis, :, 2]
+	t = (targets[np.newaxis, :, 1:2] - y_btm) / (y_top - y_btm)
+	dest = dest_btm + t * (dest_top - dest_btm)
+	dest_point = dest[..., :2] / dest[..., 2:]
+	return dest_point[0] if single else dest_point
+
+def calc_pan_tilt_3d(h_btm, h_top, y_btm, y_top, targets, pan_tilt_directions):
+	h_btm = np.asarray(h_btm, dtype=np.float64)
+	if h_btm.ndim == 2:
+		h_btm = h_btm[np.newaxis]
+		h_top = np.asarray(h_top, dtype=np.float64)[np.newaxis]
+	pan_tilt_directions = np.broadcast_to(np.asarray(pan_tilt_directions, dtype=np.float64).reshape(-1, 2), (len(h_btm), 2))
+	xy = blend_positions(h_btm, h_top, y_btm, y_top, targets)
+	return panTiltSolver.xy_to_pan_tilt(xy, pan_tilt_directions[:, np.newaxis, :])
+
+def stack_height_blends(movingHeads):
+	# collects the blends (see MovingHeadExt.GetHeightBlend) and PanTiltDirections of several heads
+	blends = [movingHead.GetHeightBlend() for movingHead in movingHeads]
+	missing = [movingHead.ownerComp.name for movingHead, blend in zip(movingHeads, blends) if blend is None]
+	if missing:
+		raise ValueError(f"no height blend (btm and top captures at different heights needed) for {', '.join(missing)}")
+	h_btm = np.stack([blend[0] for blend in blends])
+	h_top = np.stack([blend[1] for blend in blends])
+	y_btm = np.array([blend[2] for blend in blends])
+	y_top = np.array([blend[3] for blend in blends])
+	pan_tilt_directions = np.array([list(movingHead.PanTiltDirection) for movingHead in movingHeads], dtype=np.float64)
+	return h_btm, h_top, y_btm, y_top, pan_tilt_directions
@@ -0,0 +1,150 @@
+"""
+Incremental homography fit (normalized DLT).
+
+Keeps the 9x9 normal matrix A^T A of the DLT system of one layer, so adding,
+replacing or removing a single point pair is a rank-2 update instead of a
+complete refit. The homography is the eigenvector of the smallest eigenvalue
+of that matrix.
+
+A full refit (new Hartley normalization, normal matrix rebuilt from all
+points) only happens when
+	- the points moved too far away from the normalization of the last refit,
+	- too many points got replaced/removed since then (accumulated round off),
+	- the system got badly conditioned.
+"""
+
+import numpy as np
+
+def normalization(points):
+	# Hartley normalization: centroid to the origin, mean distance sqrt(2)
+	points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+	centroid = points.mean(axis=0)
+	mean_dist = np.sqrt(((points - centroid)**2).sum(axis=1)).mean()
+	scale = np.sqrt(2) / mean_dist if mean_dist > 1e-12 else 1.
+	return np.array([[scale, 0., -scale*centroid[0]], [0., scale, -scale*centroid[1]], [0., 0., 1.]])
+
+def apply_transform(transform, points):
+	points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+	return points @ transform[:2, :2].T + transform[:2, 2]
+
+def dlt_rows(src, dst):
+	# two rows of the DLT system per point pair: (N,2),(N,2) -> (2N,9)
+	src = np.asarray(src, dtype=np.float64).reshape(-1, 2)
+	dst = np.asarray(dst, dtype=np.float64).reshape(-1, 2)
+	n = len(src)
+	x, y = src[:, 0], src[:, 1]
+	u, v = dst[:, 0], dst[:, 1]
+	one = np.ones(n)
+	zero = np.zeros(n)
+	rows = np.empty((2*n, 9))
+	rows[0::2] = np.stack((-x, -y, -one, zero, zero, zero, u*x, u*y, u), axis=1)
+	rows[1::2] = np.stack((zero, zero, zero, -x, -y, -one, v*x, v*y, v), axis=1)
+	return rows
+
+def fit_homography(src, dst):
+	# plain (non incremental) normalized DLT
+	engine = IncrementalHomography()
+	engine.refit(src, dst)
+	return engine.solve()
+
+class IncrementalHomography:
+	def __init__(self, conditionLimit=1e-9, maxDowndates=32, maxNormalizedRadius=8.):
+		self.conditionLimit = conditionLimit
+		self.maxDowndates = maxDowndates
+		self.maxNormalizedRadius = maxNormalizedRadius
+		self.src = np.zeros((0, 2))
+		self.dst = np.zeros((0, 2))
+		self.normal = np.zeros((9, 9))
+		self.setTransforms(np.eye(3), np.eye(3))
+		self.downdates = 0
+		self.refits = 0
+		self.homography = None
+
+	def __len__(self):
+		return len(self.src)
+
+	def normalizedRows(self, src, dst):
+		return dlt_rows(apply_transform(self.srcTransform, src), apply_transform(self.dstTransform, dst))
+
+	def normalizedPoint(self, src, dst):
+		# single point with plain floats, the normalizations only scale and translate
+		sx, sy, ss, dx, dy, ds = self.scales
+		return (ss*float(src[0]) + sx, ss*float(src[1]) + sy, ds*float(dst[0]) + dx, ds*float(dst[1]) + dy)
+
+	def pointUpdate(self, src, dst):
+		x, y, u, v = self.normalizedPoint(src, dst)
+		rows = np.array(((-x, -y, -1., 0., 0., 0., u*x, u*y, u), (0., 0., 0., -x, -y, -1., v*x, v*y, v)))
+		return rows.T @ rows
+
+	def outOfRange(self, src, dst):
+		return max(map(abs, self.normalizedPoint(src, dst))) > self.maxNormalizedRadius
+
+	def setTransforms(self, srcTransform, dstTransform):
+		self.srcTransform = srcTransform
+		self.dstTransform = dstTransform
+		self.scales = (srcTransform[0, 2], srcTransform[1, 2], srcTransform[0, 0], dstTransform[0, 2], dstTransform[1, 2], dstTransform[0, 0])
+		self.dstInverse = np.linalg.inv(dstTransform)
+
+	def refit(self, src=None, dst=None):
+		if src is not None:
+			self.src = np.asarray(src, dtype=np.float64).reshape(-1, 2).copy()
+			self.dst = np.asarray(dst, dtype=np.float64).reshape(-1, 2).copy()
+		self.refits += 1
+		self.downdates = 0
+		if len(self.src) == 0:
+			self.normal = np.zeros((9, 9))
+			self.setTransforms(np.eye(3), np.eye(3))
+			return
+		self.setTransforms(normalization(self.src), normalization(self.dst))
+		rows = self.normalizedRows(self.src, self.dst)
+		self.normal = rows.T @ rows
+
+	def add(self, src, dst):
+		src = np.asarray(src, dtype=np.float64).reshape(1, 2)
+		dst = np.asarray(dst, dtype=np.float64).reshape(1, 2)
+		self.src = np.concatenate((self.src, src))
+		self.dst = np.concatenate((self.dst, dst))
+		if len(self.src) <= 4 or self.outOfRange(src[0], dst[0]):
+			self.refit()
+		else:
+			self.normal += self.pointUpdate(src[0], dst[0])
+		return self.solve()
+
+	def remove(self, index):
+		self.normal -= self.pointUpdate(self.src[index], self.dst[index])
+		self.src = np.delete(self.src, index, axis=0)
+		self.dst = np.delete(self.dst, index, axis=0)
+		self.downdates += 1
+		if self.downdates > self.maxDowndates or len(self.src) < 4:
+			self.refit()
+		return self.solve()
+
+	def replace(self, index, src, dst):
+		old = self.pointUpdate(self.src[index], self.dst[index])
+		self.src[index] = np.asarray(src, dtype=np.float64).reshape(2)
+		self.dst[index] = np.asarray(dst, dtype=np.float64).reshape(2)
+		if self.outOfRange(self.src[index], self.dst[index]):
+			self.refit()
+		else:
+			self.normal += self.pointUpdate(self.src[index], self.dst[index]) - old
+			self.downdates += 1
+			if self.downdates > self.maxDowndates:
+				self.refit()
+		return self.solve()
+
+	def solve(self, allowRefit=True):
+		if len(self.src) < 4:
+			self.homography = None
+			return None
+		eigenvalues, eigenvectors = np.linalg.eigh(self.normal)
+		# a (near) degenerate null space means the incremental state isn't trustworthy anymore
+		if eigenvalues[1] < self.conditionLimit * max(eigenvalues[-1], 1e-300) or eigenvalues[0] < -self.conditionLimit * eigenvalues[-1]:
+			if allowRefit and (self.downdates or self.refits == 0):
+				self.refit()
+				return self.solve(allowRefit=False)
+		normalized = eigenvectors[:, 0].reshape(3, 3)
+		homography = self.dstInverse @ normalized @ self.srcTransform
+		if abs(homography[2, 2]) > 1e-12:
+			homography = homography / homography[2, 2]
+		self.homography = homography
+		return homography
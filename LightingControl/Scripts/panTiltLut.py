@@ -0,0 +1,148 @@
+"""
+Pan/tilt lookup table for one homography plane (usually the stage floor).
+
+The exact path (panTiltSolver) needs a matrix multiply, a perspective divide
+and two arctans per target. The LUT samples the exact solution on a regular
+grid over the calibrated area once and answers lookups with a vectorized
+bilinear interpolation.
+
+Error bound: after building, the interpolation is compared against the exact
+solution at every cell center and edge midpoint (where bilinear errors peak
+for smooth functions). The grid is refined until the error is below
+`tolerance` degrees or maxResolution is reached; cells that still exceed the
+tolerance (e.g. near the horizon of the homography) are answered by the exact
+path. Targets outside the grid are always solved exactly.
+
+The table has to be rebuilt when the homography or the PanTiltDirection it was
+built from changes (isStale). MovingHeadExt always assigns new homography
+arrays instead of editing them in place, so the check is an identity test and
+costs nothing per lookup.
+"""
+
+import numpy as np
+
+import panTiltSolver
+
+class PanTiltLUT:
+	def __init__(self, bounds=None, resolution=64, tolerance=0.05, maxResolution=512):
+		# bounds: ((x_min, y_min), (x_max, y_max)) in homography plane coordinates
+		self.bounds = bounds
+		self.resolution = resolution
+		self.tolerance = tolerance
+		self.maxResolution = maxResolution
+		self.table = None
+		self.homography = None
+		self.panTiltDirection = None
+		self.source = None
+		self.sourceDirection = None
+		self.maxError = None
+		self.exactCells = None
+		self.builds = 0
+
+	def isStale(self, homography, panTiltDirection):
+		return self.table is None or homography is not self.source or tuple(panTiltDirection) != self.sourceDirection
+
+	def invalidate(self):
+		self.table = None
+
+	def exact(self, targets):
+		return panTiltSolver.calc_pan_tilt_batch(self.homography, targets, self.panTiltDirection)[0]
+
+	def build(self, homography, panTiltDirection, bounds=None):
+		self.source = homography
+		self.sourceDirection = tuple(panTiltDirection)
+		self.homography = np.array(homography, dtype=np.float64)
+		self.panTiltDirection = np.array(panTiltDirection, dtype=np.float64)
+		if bounds is not None:
+			self.bounds = bounds
+		(x_min, y_min), (x_max, y_max) = self.bounds
+		self.origin = np.array((x_min, y_min), dtype=np.float64)
+		self.builds += 1
+
+		resolution = self.resolution
+		while True:
+			self.cells = resolution
+			self.cellSize = np.array((x_max - x_min, y_max - y_min), dtype=np.float64) / resolution
+			xs = np.linspace(x_min, x_max, resolution + 1)
+			ys = np.linspace(y_min, y_max, resolution + 1)
+			grid = np.stack(np.meshgrid(xs, ys, indexing='ij'), axis=-1)
+			self.table = self.exact(grid.reshape(-1, 2)).reshape(resolution + 1, resolution + 1, 2)
+			self.exactCells = np.zeros((resolution, resolution), dtype=bool)
+			self.buildCoefficients()
+
+			# singular cells don't get better with a finer grid, so they don't count here
+			cell_error = self.measureError()
+			finite_error = cell_error[np.isfinite(cell_error)]
+			self.maxError = float(finite_error.max()) if finite_error.size else 0.
+			if self.maxError <= self.tolerance or resolution * 2 > self.maxResolution:
+				break
+			resolution *= 2
+
+		# whatever is still off gets solved exactly
+		self.exactCells = ~(cell_error <= self.tolerance)
+		self.maxError = float(np.max(cell_error, where=~self.exactCells, initial=0.))
+		return self
+
+	def measureError(self):
+		# worst error per cell at the cell center and the bottom/left edge midpoints
+		n = self.cells
+		i, j = np.meshgrid(np.arange(n), np.arange(n), indexing='ij')
+		error = np.zeros((n, n))
+		for offset in ((.5, .5), (.5, 0.), (0., .5)):
+			points = self.origin + (np.stack((i, j), axis=-1) + offset) * self.cellSize
+			points = points.reshape(-1, 2)
+			diff = np.abs(self.interpolate(points) - self.exact(points)).max(axis=1)
+			error = np.fmax(error, diff.reshape(n, n))
+			# nan/inf in the exact solution means a singular cell
+			error[~np.isfinite(diff.reshape(n, n))] = np.inf
+		return error
+
+	def buildCoefficients(self):
+		# per cell c0 + c1*fx + c2*fy + c3*fx*fy, so a lookup only gathers one row per target
+		t = self.table
+		c0 = t[:-1, :-1]
+		c1 = t[1:, :-1] - t[:-1, :-1]
+		c2 = t[:-1, 1:] - t[:-1, :-1]
+		c3 = t[1:, 1:] - t[1:, :-1] - t[:-1, 1:] + t[:-1, :-1]
+		self.coefficients = np.stack((c0, c1, c2, c3), axis=2).reshape(-1, 4, 2)
+		self.scale = 1. / self.cellSize
+		self.offset = -self.origin * self.scale
+
+	def cellsOf(self, targets):
+		position = targets * self.scale + self.offset
+		cell = np.floor(position)
+		np.clip(cell, 0, self.cells - 1, out=cell)
+		return position, cell
+
+	def interpolate(self, targets, position=None, cell=None):
+		# bilinear lookup, targets have to be inside the bounds
+		if position is None:
+			position, cell = self.cellsOf(targets)
+		frac = position - cell
+		index = (cell[:, 0] * self.cells + cell[:, 1]).astype(np.intp)
+		k = self.coefficients[index]
+		fx = frac[:, 0:1]
+		fy = frac[:, 1:2]
+		return k[:, 0] + k[:, 1] * fx + (k[:, 2] + k[:, 3] * fx) * fy
+
+	def lookup(self, targets):
+		targets = np.asarray(targets, dtype=np.float64).reshape(-1, 2)
+		position, cell = self.cellsOf(targets)
+		inside = np.all((position >= 0) & (position <= self.cells), axis=1)
+		if self.exactCells.any():
+			inside &= ~self.exactCells[cell[:, 0].astype(np.intp), cell[:, 1].astype(np.intp)]
+		if inside.all():
+			return self.interpolate(targets, position, cell)
+
+		pan_tilt = np.empty((len(targets), 2))
+		pan_tilt[inside] = self.interpolate(targets[inside], position[inside], cell[inside])
+		pan_tilt[~inside] = self.exact(targets[~inside])
+		return pan_tilt
+
+def floor_bounds(targets, margin=0.1):
+	# bounding box of the calibrated x/z targets plus a relative margin
+	targets = np.asarray(targets, dtype=np.float64).reshape(-1, 2)
+	low = targets.min(axis=0)
+	high = targets.max(axis=0)
+	pad = (high - low) * margin
+	return (tuple(low - pad), tuple(high + pad))
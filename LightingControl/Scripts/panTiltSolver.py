@@ -0,0 +1,66 @@
+"""
+Vectorized pan/tilt math for moving heads.
+
+Same formulas as MovingHeadExt.CalcHomogPosition / CalcPanTilt ("laser way"),
+but working on whole arrays, so a full rig (H heads) can be solved for
+N targets in one call instead of H*N python round trips.
+
+Shapes:
+	homographies		(H,3,3) or (3,3)
+	targets				(N,2) real space points on the homography plane
+	pan_tilt_directions	(H,2) or (2,) the PanTiltDirection offsets
+	result				(H,N,2) pan/tilt in degrees
+"""
+
+import numpy as np
+
+def pan_tilt_to_xy(pan_tilt):
+	# laser way: pan/tilt in degrees -> x/y on the homography plane of the head
+	pan_tilt = np.radians(np.asarray(pan_tilt, dtype=np.float64))
+	pan = pan_tilt[..., 0]
+	tilt = pan_tilt[..., 1]
+	xy = np.empty(pan_tilt.shape, dtype=np.float64)
+	xy[..., 0] = np.tan(pan)
+	xy[..., 1] = np.tan(tilt) / np.cos(pan)
+	return xy
+
+def xy_to_pan_tilt(xy, pan_tilt_direction=(0., 0.)):
+	# inverse of pan_tilt_to_xy, plus the PanTiltDirection offset of the head.
+	# pan_tilt_direction has to broadcast against xy[...,0], e.g. (H,1) for (H,N,2)
+	xy = np.asarray(xy, dtype=np.float64)
+	pan_tilt_direction = np.asarray(pan_tilt_direction, dtype=np.float64)
+	pan = np.arctan(xy[..., 0])
+	tilt = np.arctan(xy[..., 1] * np.cos(pan))
+	pan_tilt = np.empty(xy.shape, dtype=np.float64)
+	pan_tilt[..., 0] = np.degrees(pan) + pan_tilt_direction[..., 0]
+	pan_tilt[..., 1] = np.degrees(tilt) + pan_tilt_direction[..., 1]
+	return pan_tilt
+
+def homog_positions(homographies, targets):
+	# applies every homography to every target: (H,3,3) x (N,2) -> (H,N,2)
+	homographies = np.asarray(homographies, dtype=np.float64)
+	targets = np.asarray(targets, dtype=np.float64).reshape(-1, 2)
+	single = homographies.ndim == 2
+	if single:
+		homographies = homographies[np.newaxis]
+	# H @ [x, y, 1] written out, so we don't have to build the homogeneous targets
+	dest = np.einsum('hij,nj->hni', homographies[:, :, :2], targets)
+	dest += homographies[:, np.newaxis, :, 2]
+	dest_point = dest[..., :2] / dest[..., 2:]
+	return dest_point[0] if single else dest_point
+
+def calc_pan_tilt_batch(homographies, targets, pan_tilt_directions):
+	# the whole rig in one go: (H,3,3), (N,2), (H,2) -> (H,N,2)
+	homographies = np.asarray(homographies, dtype=np.float64)
+	pan_tilt_directions = np.asarray(pan_tilt_directions, dtype=np.float64)
+	if homographies.ndim == 2:
+		homographies = homographies[np.newaxis]
+	pan_tilt_directions = np.broadcast_to(pan_tilt_directions.reshape(-1, 2), (len(homographies), 2))
+	xy = homog_positions(homographies, targets)
+	return xy_to_pan_tilt(xy, pan_tilt_directions[:, np.newaxis, :])
+
+def stack_homographies(movingHeads, type='btm'):
+	# collects homographies and PanTiltDirections of several MovingHeadExt
+	homographies = np.stack([movingHead.GetHomography(type) for movingHead in movingHeads])
+	pan_tilt_directions = np.array([list(movingHead.PanTiltDirection) for movingHead in movingHeads], dtype=np.float64)
+	return homographies, pan_tilt_directions
@@ -0,0 +1,333 @@
+"""
+Pluggable projection models: real space target -> pan/tilt of one head.
+
+A single plane homography on the laser way coordinates (tan(pan),
+tan(tilt)/cos(pan)) bends away from the real mapping at wide angles, see
+pan_tilt_curved.jpg and the commented spherical/fish eye branches in
+MovingHeadExt. The models here are fitted from the same DataPoints:
+
+	homography	the current laser way homography on the x/z plane
+	spherical	homography onto stereographic coordinates
+				(tan(tilt/2) * (cos(pan), sin(pan))), which stay finite up to
+				tilt = 180, plus the tilt of the head axis found by a search
+	pose		the fixture as a real pan/tilt device: 6-DoF pose (position,
+				rotation vector) and pan/tilt offsets, solved by least squares
+				(Levenberg-Marquardt) on the beam directions. Works for any
+				target height, not only for the calibration plane
+
+Every model has fit(targets, pan_tilt) and a vectorized
+evaluate(targets, pan_tilt_direction) for (N,3) targets -> (N,2) pan/tilt, and
+can be stored in the calibration json with to_dict()/from_dict().
+
+New models subclass ProjectionModel and are registered with register_model.
+"""
+
+import math
+
+import numpy as np
+
+import calibrationSolver
+import incrementalHomography
+import panTiltSolver
+
+MODELS = dict()
+
+def register_model(cls):
+	MODELS[cls.name] = cls
+	return cls
+
+def create_model(name, **kwargs):
+	return MODELS[name](**kwargs)
+
+def fit_model(name, targets, pan_tilt, **kwargs):
+	return create_model(name, **kwargs).fit(targets, pan_tilt)
+
+def from_dict(data):
+	model = MODELS[data['model']]()
+	model.load(data)
+	return model
+
+def wrap_near(angles, center):
+	# shifts angles by multiples of 360 as close as possible to center
+	return angles - 360. * np.round((angles - center) / 360.)
+
+def rotation_matrix(rotation_vector):
+	# Rodrigues formula
+	rotation_vector = np.asarray(rotation_vector, dtype=np.float64)
+	angle = np.sqrt((rotation_vector**2).sum())
+	if angle < 1e-12:
+		return np.eye(3)
+	kx, ky, kz = rotation_vector / angle
+	k = np.array([[0., -kz, ky], [kz, 0., -kx], [-ky, kx, 0.]])
+	return np.eye(3) + math.sin(angle) * k + (1. - math.cos(angle)) * (k @ k)
+
+def levenberg_marquardt(residuals, params, iterations=100, damping=1e-3, tolerance=1e-12, step=1e-6):
+	# minimizes sum(residuals(params)**2), forward difference jacobian
+	params = np.asarray(params, dtype=np.float64).copy()
+	r = residuals(params)
+	cost = r @ r
+	for i in range(iterations):
+		jacobian = np.empty((len(r), len(params)))
+		for j in range(len(params)):
+			shifted = params.copy()
+			shifted[j] += step
+			jacobian[:, j] = (residuals(shifted) - r) / step
+		jtj = jacobian.T @ jacobian
+		gradient = jacobian.T @ r
+		improved = False
+		while damping < 1e10:
+			delta = np.linalg.solve(jtj + damping * np.diag(np.diag(jtj) + 1e-9), -gradient)
+			candidate = params + delta
+			r_candidate = residuals(candidate)
+			cost_candidate = r_candidate @ r_candidate
+			if np.isfinite(cost_candidate) and cost_candidate < cost:
+				damping = max(damping / 10., 1e-12)
+				improved = True
+				break
+			damping *= 10.
+		if not improved:
+			break
+		converged = cost - cost_candidate < tolerance * max(cost, 1e-300)
+		params, r, cost = candidate, r_candidate, cost_candidate
+		if converged:
+			break
+	return params, cost
+
+class ProjectionModel:
+	name = None
+
+	def fit(self, targets, pan_tilt):
+		raise NotImplementedError
+
+	def forward(self, targets):
+		# (N,3) -> (N,2) pan/tilt as captured
+		raise NotImplementedError
+
+	def evaluate(self, targets, pan_tilt_direction=(0., 0.)):
+		targets = np.asarray(targets, dtype=np.float64).reshape(-1, 3)
+		return self.forward(targets) + np.asarray(pan_tilt_direction, dtype=np.float64)
+
+	def error(self, targets, pan_tilt):
+		# reprojection error in degrees per point
+		return calibrationSolver.pan_tilt_error(self.evaluate(targets), pan_tilt)
+
+	def to_dict(self):
+		raise NotImplementedError
+
+	def load(self, data):
+		raise NotImplementedError
+
+@register_model
+class HomographyModel(ProjectionModel):
+	name = 'homography'
+
+	def __init__(self):
+		self.homography = None
+
+	def fit(self, targets, pan_tilt):
+		self.homography, h_targets = calibrationSolver.fit_layer(targets, pan_tilt)
+		return self
+
+	def forward(self, targets):
+		return panTiltSolver.calc_pan_tilt_batch(self.homography, targets[:, ::2], (0., 0.))[0]
+
+	def to_dict(self):
+		return {'model': self.name, 'homography': self.homography.tolist()}
+
+	def load(self, data):
+		self.homography = np.array(data['homography'], dtype=np.float64).reshape(3, 3)
+
+@register_model
+class SphericalModel(ProjectionModel):
+	name = 'spherical'
+
+	def __init__(self, tiltOffset=None):
+		# tilt value of the pan axis, searched when None
+		self.tiltOffset = tiltOffset
+		self.homography = None
+		self.panCenter = 0.
+		self.branch = 1.
+
+	def sphericalXY(self, pan_tilt, tilt_offset):
+		# stereographic coordinates around the pan axis, (pan + 180, -tilt) folded onto one side
+		polar = np.radians(pan_tilt[:, 1] - tilt_offset)
+		azimuth = np.radians(pan_tilt[:, 0])
+		azimuth = np.where(polar < 0, azimuth + np.pi, azimuth)
+		length = np.tan(np.abs(polar) / 2.)
+		return np.stack((length * np.cos(azimuth), length * np.sin(azimuth)), axis=1)
+
+	def fitOffset(self, targets, pan_tilt, tilt_offset):
+		xy = self.sphericalXY(pan_tilt, tilt_offset)
+		homography = incrementalHomography.fit_homography(targets[:, ::2], xy)
+		self.homography = homography
+		self.tiltOffset = tilt_offset
+		return float((calibrationSolver.pan_tilt_error(self.forward(targets), pan_tilt)**2).sum())
+
+	def fit(self, targets, pan_tilt):
+		targets = np.asarray(targets, dtype=np.float64).reshape(-1, 3)
+		pan_tilt = np.asarray(pan_tilt, dtype=np.float64).reshape(-1, 2)
+		self.panCenter = float(np.median(pan_tilt[:, 0]))
+		offset = self.tiltOffset
+		if offset is None:
+			# coarse scan, then golden section search around the best offset
+			offsets = np.arange(-180., 180., 10.)
+			costs = [self.fitOffset(targets, pan_tilt, o) for o in offsets]
+			best = offsets[int(np.argmin(costs))]
+			low, high = best - 10., best + 10.
+			ratio = (math.sqrt(5) - 1) / 2
+			for i in range(40):
+				a, b = high - ratio * (high - low), low + ratio * (high - low)
+				if self.fitOffset(targets, pan_tilt, a) < self.fitOffset(targets, pan_tilt, b):
+					high = b
+				else:
+					low = a
+			offset = (low + high) / 2
+		polar = pan_tilt[:, 1] - offset
+		self.branch = 1. if np.median(polar) >= 0 else -1.
+		self.fitOffset(targets, pan_tilt, offset)
+		return self
+
+	def forward(self, targets):
+		xy = panTiltSolver.homog_positions(self.homography, targets[:, ::2])
+		polar = np.degrees(2. * np.arctan(np.sqrt((xy**2).sum(axis=1))))
+		azimuth = np.degrees(np.arctan2(xy[:, 1], xy[:, 0]))
+		if self.branch < 0:
+			polar = -polar
+			azimuth = azimuth + 180.
+		return np.stack((wrap_near(azimuth, self.panCenter), polar + self.tiltOffset), axis=1)
+
+	def to_dict(self):
+		return {'model': self.name, 'homography': self.homography.tolist(), 'tilt_offset': self.tiltOffset, 'pan_center': self.panCenter, 'branch': self.branch}
+
+	def load(self, data):
+		self.homography = np.array(data['homography'], dtype=np.float64).reshape(3, 3)
+		self.tiltOffset = data['tilt_offset']
+		self.panCenter = data['pan_center']
+		self.branch = data['branch']
+
+@register_model
+class PoseModel(ProjectionModel):
+	"""
+	Beam direction in fixture space for pan p and tilt t (degrees):
+		phi = panSign * p + panOffset, theta = tiltSign * t + tiltOffset
+		d = (sin(theta) sin(phi), cos(theta), sin(theta) cos(phi))
+	rotated into real space by the fixture rotation. Fitted are position,
+	rotation vector and the two offsets; the signs (mirrored pan/tilt
+	channels) are picked by trying all four.
+	"""
+	name = 'pose'
+
+	ROTATION_STARTS = (
+		(0., 0., 0.),
+		(math.pi, 0., 0.),
+		(math.pi / 2, 0., 0.),
+		(-math.pi / 2, 0., 0.),
+		(0., 0., math.pi / 2),
+		(0., 0., -math.pi / 2),
+	)
+
+	def __init__(self, position=None, positionSigma=0.5, priorWeight=0.01):
+		# position: expected fixture position (e.g. the Position par), keeps fits with few points well posed
+		self.prior = None if position is None else np.asarray(position, dtype=np.float64)
+		self.positionSigma = positionSigma
+		self.priorWeight = priorWeight
+		self.params = None
+		self.signs = (1., 1.)
+		self.panCenter = 0.
+		self.tiltCenter = 0.
+		self.branch = 1.
+		self.cost = None
+
+	@property
+	def position(self):
+		return self.params[:3]
+
+	@property
+	def rotation(self):
+		return rotation_matrix(self.params[3:6])
+
+	@property
+	def offsets(self):
+		return self.params[6:8]
+
+	def directions(self, pan_tilt, params, signs):
+		phi = np.radians(signs[0] * pan_tilt[:, 0] + params[6])
+		theta = np.radians(signs[1] * pan_tilt[:, 1] + params[7])
+		sin_theta = np.sin(theta)
+		local = np.stack((sin_theta * np.sin(phi), np.cos(theta), sin_theta * np.cos(phi)), axis=1)
+		return local @ rotation_matrix(params[3:6]).T
+
+	def residuals(self, params, targets, pan_tilt, signs, prior, priorWeight):
+		rays = targets - params[:3]
+		rays /= np.sqrt((rays**2).sum(axis=1, keepdims=True))
+		r = (self.directions(pan_tilt, params, signs) - rays).ravel()
+		if prior is None:
+			return r
+		return np.concatenate((r, (params[:3] - prior) * (priorWeight / self.positionSigma)))
+
+	def fit(self, targets, pan_tilt):
+		targets = np.asarray(targets, dtype=np.float64).reshape(-1, 3)
+		pan_tilt = np.asarray(pan_tilt, dtype=np.float64).reshape(-1, 2)
+		prior = self.prior
+		position = prior if prior is not None else targets.mean(axis=0) + (0., 2., 0.)
+
+		# short runs from every start, only the best ones get refined further
+		starts = list()
+		for signs in ((1., 1.), (-1., 1.), (1., -1.), (-1., -1.)):
+			for rotation in self.ROTATION_STARTS:
+				for tilt_offset in (0., 90., -90., 180.):
+					starts.append((None, signs, np.concatenate((position, rotation, (0., tilt_offset)))))
+		for iterations, keep in ((3, 8), (10, 2), (100, 1)):
+			refined = list()
+			for cost, signs, params in starts:
+				residuals = lambda p, signs=signs: self.residuals(p, targets, pan_tilt, signs, prior, self.priorWeight)
+				params, cost = levenberg_marquardt(residuals, params, iterations=iterations)
+				refined.append((cost, signs, params))
+			refined.sort(key=lambda start: start[0])
+			starts = refined[:keep]
+		cost, signs, params = starts[0]
+
+		# the prior only has to pick the right basin (e.g. not the mirror image below a
+		# planar calibration), the final solution shouldn't be pulled towards it
+		if prior is not None:
+			residuals = lambda p: self.residuals(p, targets, pan_tilt, signs, prior, self.priorWeight * 1e-3)
+			params, cost = levenberg_marquardt(residuals, params)
+		self.cost, self.signs, self.params = cost, signs, params
+
+		# which of the two equivalent pan/tilt solutions the captures use
+		theta = self.signs[1] * pan_tilt[:, 1] + self.params[7]
+		self.branch = 1. if np.median(np.sin(np.radians(theta))) >= 0 else -1.
+		self.panCenter = float(np.median(pan_tilt[:, 0]))
+		self.tiltCenter = float(np.median(pan_tilt[:, 1]))
+		return self
+
+	def forward(self, targets):
+		rays = (targets - self.position) @ self.rotation
+		rays /= np.sqrt((rays**2).sum(axis=1, keepdims=True))
+		theta = np.degrees(np.arccos(np.clip(rays[:, 1], -1., 1.)))
+		phi = np.degrees(np.arctan2(rays[:, 0], rays[:, 2]))
+		if self.branch < 0:
+			theta = -theta
+			phi = phi + 180.
+		pan = (phi - self.params[6]) * self.signs[0]
+		tilt = (theta - self.params[7]) * self.signs[1]
+		return np.stack((wrap_near(pan, self.panCenter), wrap_near(tilt, self.tiltCenter)), axis=1)
+
+	def to_dict(self):
+		return {
+			'model': self.name,
+			'position': self.position.tolist(),
+			'rotation': self.params[3:6].tolist(),
+			'offsets': self.offsets.tolist(),
+			'signs': list(self.signs),
+			'pan_center': self.panCenter,
+			'tilt_center': self.tiltCenter,
+			'branch': self.branch,
+		}
+
+	def load(self, data):
+		self.params = np.concatenate((data['position'], data['rotation'], data['offsets'])).astype(np.float64)
+		self.signs = tuple(data['signs'])
+		self.panCenter = data['pan_center']
+		self.tiltCenter = data['tilt_center']
+		self.branch = data['branch']
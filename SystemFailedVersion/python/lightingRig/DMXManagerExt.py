@@ -8,56 +8,72 @@ can be accessed externally, e.g. op('yourComp').PromotedFunction().
 Help: search "Extensions" in wiki
 """
 
-from inspect import signature
+import numpy as np
 
-class DMXManagerExt(list):
+from dmxStore import DMXStore
+
+class DMXManagerExt:
 	"""
 	DMXManagerExt description
 
-	only here, the list is zero-based.
-	outside of this file dmx-channels can be treated as one-based
+	keeps the incoming universes in a DMXStore (see dmxStore.py).
+	every dmxin<n> CHOP in this component is universe n.
+	dmx-channels are one-based, either channel (universe 1) or (universe, channel).
 	"""
 	def __init__(self, ownerComp):
 		# The component to which this extension is attached
 		self.ownerComp = ownerComp
+		self.store = DMXStore()
+		self.lastFrame = None
 		self.initFromDmx()
 
 	def initFromDmx(self):
-		for i in range(512):
-			value = op('dmxin1')[f'c{i+1}']
-			#print(i, value)
-			self.append({'value':value, 'callbacks':[]})
+		# initial values, subscribers get them when they subscribe
+		self.ingestChops()
+
+	def universeChops(self):
+		# (universe, chop) for dmxin1, dmxin2, ...
+		chops = list()
+		for chop in ops('dmxin*'):
+			if chop.name[5:].isdigit():
+				chops.append((int(chop.name[5:]), chop))
+		return sorted(chops, key=lambda universeChop: universeChop[0])
+
+	def chopValues(self, chop):
+		# first sample of every channel, c1...c512
+		return chop.numpyArray()[:, 0]
+
+	def ingestChops(self, frame=None):
+		# all universes once per frame, further calls within the same frame are ignored
+		if frame is not None:
+			if frame == self.lastFrame:
+				return
+			self.lastFrame = frame
+		chops = self.universeChops()
+		if not chops:
+			return
+		frames = np.zeros((chops[-1][0], self.store.size), dtype=np.uint8)
+		for universe, chop in chops:
+			values = self.chopValues(chop)[:self.store.size]
+			frames[universe - 1, :len(values)] = np.clip(np.rint(values), 0, 255)
+		self.store.ingestAll(frames)
+
+	def ingestFrame(self, values, universe=1):
+		return self.store.ingest(values, universe)
 
 	def updateDmxChannel(self, channel, value):
-		#debug(channel, value)
-		index = channel - 1
-		self[index]['value'] = value
-		for callback in self[index]['callbacks']:
-			self.executeCallback(index, callback)
+		self.store.update(channel, value)
 
+	# sixteenBit: channel is the coarse byte, the next channel the fine one, values 0...65535
 	def subscribeChannel(self, channel, callback, sixteenBit=False):
-		#debug(callback)
-		index = channel - 1
-		self[index]['callbacks'].append(callback)
-		self.executeCallback(index, callback)
-
-	def unsubscribeChannel(self, channel, callback):
-		index = channel - 1
-		if callback in self[index]['callbacks']:
-			self[index]['callbacks'].remove(callback)
-		#debug(self[channel])
-
-	def executeCallback(self, index, callback):
-		value = self[index]['value']
-		if callable(callback):
-			if len(signature(callback).parameters) == 1:
-				callback(value)
-			else:
-				channel = index + 1
-				callback(channel, value)
-		else:
-			setattr(callback['object'], callback['name'], int(value))
+		self.store.subscribe(channel, callback, sixteenBit)
+
+	def unsubscribeChannel(self, channel, callback, sixteenBit=False):
+		self.store.unsubscribe(channel, callback, sixteenBit)
+
+	def getValue(self, channel, sixteenBit=False):
+		return self.store.value(channel, sixteenBit)
 
 	def Reset(self):
-		self.clear()
-		self.initFromDmx()
\ No newline at end of file
+		self.store.clear()
+		self.initFromDmx()
@@ -20,6 +20,7 @@ def whileOff(channel, sampleIndex, val, prev):
 	return
 
 def onValueChange(channel, sampleIndex, val, prev):
-	me.ext.DMXManagerExt.updateDmxChannel(channel.index, val)
+	# nothing to do: this DAT only sees the CHOP it watches, so all dmxin universes
+	# are ingested once per frame from mqExecute.onFrameStart (DMXManagerExt.ingestChops)
 	return
 	
\ No newline at end of file
@@ -1,8 +1,13 @@
+from highlightTable import CueTable
 from lampUser import LampUser
+from rigLog import get_logger
+
+log = get_logger('highlight')
 
 class Highlight(LampUser):
 
 	cueTable = op.main.op('cue_table')
+	cues = CueTable(cueTable)
 	dmxManager = op.DMX.ext.DMXManagerExt
 
 	def __init__(self, trackId, cueId):
@@ -26,13 +31,18 @@ class Highlight(LampUser):
 		self.green = 0
 		self.blue = 0
 		self.white = 0
-		Highlight.dmxManager.subscribeChannel(self.intensityChannel, self.setIntensityFromDmx)
-		Highlight.dmxManager.subscribeChannel(self.zoomChannel, {'object':self,'name':'zoom'})
-		Highlight.dmxManager.subscribeChannel(self.tiltChannel, {'object':self,'name':'height'})
-		Highlight.dmxManager.subscribeChannel(self.redChannel, {'object':self,'name':'red'})
-		Highlight.dmxManager.subscribeChannel(self.greenChannel, {'object':self,'name':'green'})
-		Highlight.dmxManager.subscribeChannel(self.blueChannel, {'object':self,'name':'blue'})
-		Highlight.dmxManager.subscribeChannel(self.whiteChannel, {'object':self,'name':'white'})
+		# (channel, callback, sixteenBit), delete() unsubscribes the same
+		self.subscriptions = [
+			(self.intensityChannel, self.setIntensityFromDmx, False),
+			(self.zoomChannel, self.setZoomFromDmx, True),
+			(self.tiltChannel, self.setHeightFromDmx, True),
+			(self.redChannel, {'object':self,'name':'red'}, False),
+			(self.greenChannel, {'object':self,'name':'green'}, False),
+			(self.blueChannel, {'object':self,'name':'blue'}, False),
+			(self.whiteChannel, {'object':self,'name':'white'}, False),
+		]
+		for channel, callback, sixteenBit in self.subscriptions:
+			Highlight.dmxManager.subscribeChannel(channel, callback, sixteenBit=sixteenBit)
 
 	def __repr__(self):
 		#return f"highlight#{self.cntId} for {self.trackId} / cue {self.cueId} / col({self.red:.1f}, {self.green:.1f}, {self.blue:.1f}, {self.white:.1f}) with lamps {[lamp.lampId for lamp in self]} @ {float(self.intensity):.2f}/{float(self.zoom):.2f}"
@@ -148,18 +158,21 @@ class Highlight(LampUser):
 		self.setLampAttributes(lamp)
 
 	def delete(self):
-		Highlight.dmxManager.unsubscribeChannel(self.intensityChannel, self.setIntensityFromDmx)
+		for channel, callback, sixteenBit in self.subscriptions:
+			Highlight.dmxManager.unsubscribeChannel(channel, callback, sixteenBit=sixteenBit)
 		super().delete()
 
 	############# "PRIVATE" METHODS
 
 	def initFromCueTable(self):
-		self.activationId = int(Highlight.cueTable[str(self.cueId), 'Activation'].val)
-		self.color = int(Highlight.cueTable[str(self.cueId), 'Color'].val)
-		self.beam = int(Highlight.cueTable[str(self.cueId), 'Beam'].val)
-		self.shutter = int(Highlight.cueTable[str(self.cueId), 'Shutter'].val)
-		self.maxSize = int(Highlight.cueTable[str(self.cueId), 'Amount'].val)		
-		self.priority = int(Highlight.cueTable[str(self.cueId), 'Priority'].val)		
+		# parsed once, see highlightTable.CueTable
+		cue = Highlight.cues[self.cueId]
+		self.activationId = cue['Activation']
+		self.color = cue['Color']
+		self.beam = cue['Beam']
+		self.shutter = cue['Shutter']
+		self.maxSize = cue['Amount']
+		self.priority = cue['Priority']
 
 	# gets called, whenever intensity changes from 0 to >0
 	# TODO: gets called regularly or at least when lamps are released
@@ -169,7 +182,7 @@ class Highlight(LampUser):
 		return
 
 	def setLampAttributes(self, lamp):
-		debug("setting")
+		log.debug('%s setting lamp %s', self, lamp.lampId)
 		lamp.color = self.color
 		lamp.beam = self.beam
 		lamp.shutter = self.shutter
@@ -185,4 +198,11 @@ class Highlight(LampUser):
 	def setIntensityFromDmx(self, value):
 		self.intensity = value/255
 
+	# 16 bit channels (coarse + fine)
+	def setZoomFromDmx(self, value):
+		self.zoom = value/65535
+
+	def setHeightFromDmx(self, value):
+		self.height = value/65535
+
 
@@ -9,6 +9,15 @@ Help: search "Extensions" in wiki
 """
 
 from highlight import Highlight
+from highlightTable import track_delta
+from lamp import Lamp
+from profiler import PROFILER
+from trackFilter import OneEuroFilter
+from trackingReceiver import TrackingReceiver
+from trackPredictor import TrackPredictor
+import rigLog
+
+log = rigLog.get_logger('highlighter')
 
 class HighlighterExt(dict):
 	"""
@@ -18,37 +27,125 @@ class HighlighterExt(dict):
 		# The component to which this extension is attached
 		self.ownerComp = ownerComp
 		
-		self.cueTable = op('../cue_table')
+		# the same DAT the highlights read their cues from
+		self.cueTable = Highlight.cueTable
 		self.cueAttributes = {}
-		# init the cue intensities with the value from the cue_table 
-		# these intensities will later be set by dmx
-		for row in self.cueTable.rows():
-			if row[0].val == "Cue": 
-				continue
-			self.cueAttributes[int(row[0].val)] = {'intensity': self.cueTable[row[0].val, 'Intensity'].val, 'zoom': 1.0}
+		self.initCueAttributes()
+		# trackId -> cueId of the table, what the highlights are reconciled against
+		self.trackCues = dict()
+		# row -> trackId, to know which track a changed row held before
+		self.rowTracks = [None]
+		# positions straight from the network instead of from the table, see StartTrackingReceiver
+		self.TrackingReceiver = None
+		self.trackingSequence = -1
+		# leads the positions by the pipeline latency, see SetPrediction
+		self.predictor = None
+		# jitter filter before the prediction and the distance (m) a highlight has to move
+		# on the floor before its lamps get the new position, see SetSmoothing
+		self.smoother = None
+		self.deadBand = 0.
+		self.positionCounters = {'updated': 0, 'suppressed': 0}
 
 	def Reset(self):
-		debug('resetting Highlighter')
+		log.info('resetting Highlighter')
 		for highlight in self:
 			self[highlight].delete()
 		self.clear()
+		self.trackCues.clear()
+		self.rowTracks = [None]
 		return
 
 	# gets called onFrameStart from ExecuteDAT
 	def Tick(self):
-		debug("tick")
+		self.pullTracks()
 		self.reTriggerLampAcquisition()
 
+	# protocol 'unity' or 'tuio' (Pharus), options see trackingReceiver.TrackingReceiver.
+	# the raw highlights table then only provides the cues
+	def StartTrackingReceiver(self, protocol='unity', port=7000, **options):
+		self.StopTrackingReceiver()
+		# other clock
+		for stage in (self.smoother, self.predictor):
+			if stage is not None:
+				stage.reset()
+		self.TrackingReceiver = TrackingReceiver(protocol, port=port, **options)
+		self.TrackingReceiver.start()
+
+	def StopTrackingReceiver(self):
+		if self.TrackingReceiver is not None:
+			self.TrackingReceiver.close()
+			self.TrackingReceiver = None
+			self.trackingSequence = -1
+
+	# the newest frame of the receiver, if there is one since the last tick
+	def pullTracks(self):
+		receiver = self.TrackingReceiver
+		if receiver is None or receiver.sequence == self.trackingSequence:
+			return
+		self.trackingSequence = receiver.sequence
+		self.UpdatePositions(receiver.frame(), receiver.published)
+
+	# timing of the highlight -> lamp -> MagicQ pipeline, the frame budget in s (see profiler.py)
+	def EnableProfiling(self, budget=1/60):
+		if not PROFILER.watched:
+			for owner, names in (
+					(type(self), ('ReIndexHighlightsFromDat', 'ReconcileRowsFromDat', 'UpdatePositions', 'Tick')),
+					(Highlight, ('acquireLamps', 'setLampAttributes', 'delete')),
+					(type(op.lampManager.ext.LampManagerExt), ('RequestLamps', 'ServePending', 'AssignLamps')),
+					(Lamp, ('trackerPosition', 'intensity', 'zoom', 'color', 'activationId', 'owner')),
+					(type(op.magicQ.ext.MQInterfaceExt), ('SetActivation', 'ChooseSoftPalette', 'SetZoom', 'SetZoomViaOSC', 'SetColor', 'SetTracker', 'SendTracker', 'Flush'))):
+				for name in names:
+					PROFILER.watch(owner, name)
+		PROFILER.enable(budget)
+
+	def DisableProfiling(self):
+		PROFILER.disable()
+
+	# json of all stages and the frames over budget, also written to path if given
+	def DumpProfile(self, path=None):
+		return PROFILER.dump(path)
+
+	# level per subsystem (see rigLog.py), subsystem None for all
+	def SetLogLevel(self, subsystem, level):
+		rigLog.set_level(subsystem, level)
+
+	def RecentLog(self, count=50, subsystem=None):
+		return '\n'.join(rigLog.recent(count, subsystem))
+
+	# everything from level on gets written to path by a background thread
+	def StartLogFile(self, path, level='DEBUG'):
+		rigLog.start_file(path, level)
+
+	def StopLogFile(self):
+		rigLog.stop_file()
+
 	def printOutHighlights(self):
 		out = ""
 		for highlight in self.values():
 			out += str(highlight) + "\n"
 		return out
 
+	# highlights that are still missing lamps wait in the lamp managers queue,
+	# so only the queue has to be served instead of requesting again for every highlight.
+	# in 'spatial' mode all highlights get matched to the lamps at once
 	def reTriggerLampAcquisition(self):
-		for highlight in self.values():
-			highlight.acquireLamps()
+		if op.lampManager.AssignmentMode == 'spatial':
+			op.lampManager.AssignLamps(list(self.values()))
+		else:
+			op.lampManager.ServePending()
+
 
+	# init the cue intensities with the value from the cue_table
+	# these intensities will later be set by dmx, so only new cues get theirs
+	def initCueAttributes(self):
+		for cueId, cue in Highlight.cues.items():
+			self.cueAttributes.setdefault(cueId, {'intensity': cue.get('Intensity'), 'zoom': 1.0})
+
+	# after the cue_table was edited, called by cue_table_exec
+	def ReloadCueTable(self):
+		Highlight.cues.reload()
+		self.initCueAttributes()
+		log.info('cue_table reloaded, %s cues', len(Highlight.cues))
 
 	def NewHighlight(self, highlight):
 		if highlight.trackId in self:
@@ -59,7 +156,7 @@ class HighlighterExt(dict):
 	# whenever an ID disappears from the list or the highlightcue for an existing ID changes, we have to remove the former Highlight:
 	# - turn MQ-execs off by osc
 	def DeleteHighlight(self, highlightId):
-		debug(f'Deleting Highlight {highlightId}')
+		log.info('deleting highlight %s', highlightId)
 		highlight = self.pop(highlightId)
 		highlight.delete()
 		return
@@ -71,50 +168,103 @@ class HighlighterExt(dict):
 		highlight = self[trackId]
 		if not highlight:
 			return
-		for lamp in highlight:
-			lamp.trackerPosition = position
+		# promoted to the lamps by the highlight
+		highlight.trackerPosition = position
 		return
 
+	# latency in s to lead the tracked positions by, mode 'kalman', 'velocity' or None/'none' to switch it off
+	# (see trackPredictor.py, predictionBenchmark.py to choose the values)
+	def SetPrediction(self, latency=.1, mode='kalman', **options):
+		if mode is None or mode == 'none' or not latency:
+			self.predictor = None
+			return
+		self.predictor = TrackPredictor(latency, mode, **options)
+
+	# One-Euro filter (see trackFilter.py), minCutoff None switches it off.
+	# deadBand in m, smaller moves on the floor don't reach the lamps (and MagicQ)
+	def SetSmoothing(self, minCutoff=1., beta=.7, deadBand=.02, **options):
+		self.smoother = None if minCutoff is None else OneEuroFilter(minCutoff, beta, **options)
+		self.deadBand = deadBand or 0.
+
+	# all tracks of a frame at once, (N,4) trackId, x, y, z (see highlightTable.TrackTable)
+	# now: time of the measurement, the frame time if not given
+	def UpdatePositions(self, tracks, now=None):
+		now = absTime.seconds if now is None else now
+		# every frame, so the filter states stay current even without highlights
+		if self.smoother is not None:
+			tracks = self.smoother.update(tracks, now)
+		if self.predictor is not None:
+			tracks = self.predictor.update(tracks, now)
+		if not len(self) or not len(tracks):
+			return
+		rows = dict(zip(tracks[:, 0].astype(int).tolist(), tracks[:, 1:].tolist()))
+		deadBand = self.deadBand * self.deadBand
+		for trackId, highlight in self.items():
+			position = rows.get(trackId)
+			if position is None:
+				continue
+			position = tuple(position)
+			current = highlight.trackerPosition
+			if deadBand:
+				dx = position[0] - current[0]
+				dy = position[1] - current[1]
+				moved = dx*dx + dy*dy > deadBand
+			else:
+				moved = position != current
+			if not moved:
+				self.positionCounters['suppressed'] += 1
+				continue
+			highlight.trackerPosition = position
+			self.positionCounters['updated'] += 1
+
 
 # this shit is needed to get from the Table to python objects...
 
-	def ReIndexHighlightsFromDat(self, dat):
-		debug ("start reIndex", self)
-		# go thru the rows and find out if it is a new highlight or a known one and also look if old ones don't exist anymore
-		tempHighlights = dict(self)
-		newHighlights = []
+	def readRow(self, dat, rowId):
+		return int(dat[rowId,'Trackid'].val), int(dat[rowId,'Highlightcue'].val)
 
-		for rowId in range(1,dat.numRows):
-			trackId = int(dat[rowId,'Trackid'].val)
-			cueId = int(dat[rowId,'Highlightcue'].val)
+	# added/changed: [(trackId, cueId)], removed: [trackId]. only these highlights are touched
+	def ApplyDelta(self, added, removed, changed):
+		for trackId in removed:
+			del self.trackCues[trackId]
+			if trackId in self:
+				self.DeleteHighlight(trackId)
+		# release the lamps of the old cues first, so the new highlights can get them
+		for trackId, cueId in changed:
+			if trackId in self:
+				self.DeleteHighlight(trackId)
+		for trackId, cueId in added + changed:
+			self.trackCues[trackId] = cueId
+			# cue 0: tracked, but without highlight
+			if cueId != 0:
+				self.NewHighlight(Highlight(trackId, cueId))
 
-			if cueId == 0:
+	# the cells of these rows changed, only they get read
+	def ReconcileRowsFromDat(self, dat, rows):
+		if len(self.rowTracks) != dat.numRows:
+			# rows moved, compare everything
+			self.ReIndexHighlightsFromDat(dat)
+			return
+		previous = dict()
+		current = dict()
+		for rowId in rows:
+			if rowId == 0:
 				continue
+			# the track this row held before is gone unless it shows up again
+			oldTrackId = self.rowTracks[rowId]
+			if oldTrackId in self.trackCues:
+				previous[oldTrackId] = self.trackCues[oldTrackId]
+			trackId, cueId = self.readRow(dat, rowId)
+			if trackId in self.trackCues:
+				previous[trackId] = self.trackCues[trackId]
+			current[trackId] = cueId
+			self.rowTracks[rowId] = trackId
+		self.ApplyDelta(*track_delta(previous, current))
 
-			if trackId not in tempHighlights:
-				# complete new Highlight!
-				#debug(f"highlight for {trackId}/{cueId} is completely new!")
-				highlight = Highlight(trackId, cueId)
-				newHighlights.append(highlight)
-			else:
-				if tempHighlights[trackId].cueId != cueId:
-					# this trackId has the cue changed - so it is considered new
-					highlight = Highlight(trackId, cueId)
-					#debug(f"{highlight} has a new cue-type!")
-					newHighlights.append(highlight)
-				else:
-					# if this trackId had a highlight before AND had the same cue, it is considered already existent
-					#debug(f"highlight for {trackId} already there")
-					pass
-
-				del tempHighlights[trackId]
-			
-		for oldHighlightId in tempHighlights:
-			# debug(f"deleting {tempHighlights[oldHighlight]}")
-			self.DeleteHighlight(oldHighlightId)
-
-		for newHighlight in newHighlights:
-			self.NewHighlight(newHighlight)
-
-		#debug("stop reIndex", self)
-		return
\ No newline at end of file
+	# whole table, e.g. after rows were added or removed. highlights that keep their cue stay untouched
+	def ReIndexHighlightsFromDat(self, dat):
+		log.debug('start reIndex %s', self)
+		rows = [self.readRow(dat, rowId) for rowId in range(1, dat.numRows)]
+		self.rowTracks = [None] + [trackId for trackId, cueId in rows]
+		self.ApplyDelta(*track_delta(self.trackCues, dict(rows)))
+		return
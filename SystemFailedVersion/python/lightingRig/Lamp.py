@@ -2,6 +2,7 @@
 	magicQ = op.magicQ
 	maxSize = 400 	# how big can the spot be in cm max (for calculation of zoom dependent of distance and size)
 	maxHeight = 6.0 
+	onOwnerChange = None	# hook(lamp, owner), set by the LampManagerExt to keep its pools up to date
 
 	def __init__(self, lampId, position):
 		self.lampId = lampId
@@ -24,7 +25,10 @@
 
 	@owner.setter
 	def owner(self, value):
+		prev = getattr(self, '_owner', None)
 		self._owner = value
+		if value is not prev and Lamp.onOwnerChange:
+			Lamp.onOwnerChange(self, value)
 
 	# should come in 0...1.0
 	@property
@@ -1,5 +1,9 @@
 from lamp import Lamp
-import random
+from lampAllocator import LampAllocator, lamp_aim
+from lampAssignment import SpatialAssigner
+from rigLog import get_logger
+
+log = get_logger('lamps')
 
 class LampManagerExt(dict):
 	"""
@@ -12,52 +16,67 @@ class LampManagerExt(dict):
 		self.ownerComp = ownerComp
 		for i in range(16):
 			self[i] = Lamp(i, (float(LampManagerExt.lampTable[i, 2].val), float(LampManagerExt.lampTable[i, 3].val), float(LampManagerExt.lampTable[i, 4].val)))
+		# 'equal', 'random' or 'spatial' (see lampAssignment)
+		self.AssignmentMode = 'equal'
+		self.assigner = SpatialAssigner()
+		# free/owned/pending pools, kept up to date on every ownership change
+		self.allocator = LampAllocator(self, self.assigner)
+		Lamp.onOwnerChange = self.allocator.ownerChanged
 
 	def PrintOutLamps(self):
 		return str(self).replace(',','\n') 
 
 	def Reset(self):
-		debug("Resetting LampManger")
+		log.info('resetting LampManager')
+		self.allocator.clear()
 		self.releaseAll()
 
 	def RequestLampById(self, requester, lampId):
-		debug(requester, lampId)
+		log.debug('%s requests lamp %s', requester, lampId)
 		lamp = self[lampId]
 		if not lamp.owner or requester.priority > lamp.owner.priority:
 			if lamp.owner:
-				lamp.owner.releaseLamp(lampId)
+				owner = lamp.owner
+				owner.releaseLamp(lampId)
+				# waits for another lamp
+				self.allocator.displaced(owner)
 			requester.append(lamp)
 
-	def RequestLamps(self, requester, amount, options = (0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15), mode = 'equal'):
-		# 1. look for idle Lamps
-		# 2. look for lamps with lower prio
-		# 3. look for lamps with same prio (but automatically older)
-		# and return them (and mark theam in a way)
-		# if there are still lamps missing, add to queue (and eventually process the queue)
-		for priority in (0, requester.priority, requester.priority + 1):
-			#print('priority', priority)
-			missingAmount = amount - len(requester)
-			for i in range(missingAmount):
-				if mode == 'equal':
-					j0 = (i*math.floor(len(options)/amount)+13)%len(options)
-				else:
-					j0 = random.randint(0, len(options))
-				lamp = None
-				j = j0
-				while not lamp and j < (j0+len(options)):
-					#print('tesId', j%16)
-					candidate = self[options[j%len(options)]]
-					if not candidate.owner or (candidate.owner != requester) and priority > candidate.owner.priority:
-						lamp = candidate
-						if lamp.owner:
-							# should we add this requester to a requestcue to give him back a lamp asap?
-							lamp.owner.releaseLamp(lamp.lampId)
-						requester.append(lamp)
-						#debug(f"appended lamp {lamp}")
-					j += 1
-		if len(requester) < amount:
-			# should we add this requester to a requestcue to give him back a lamp asap?
-			pass
+	# 1. idle lamps, 2. lamps with lower prio, 3. lamps with same prio (but automatically older)
+	# if there are still lamps missing, the request waits in a queue until lamps get released
+	def RequestLamps(self, requester, amount, options = None, mode = None):
+		return self.allocator.request(requester, amount, options, mode or self.AssignmentMode)
+
+	def CancelRequests(self, requester):
+		self.allocator.cancel(requester)
+
+	# gets called every frame, hands released lamps to waiting requests
+	def ServePending(self):
+		self.allocator.servePending()
+
+	# matches all given highlights at once to the lamps that are idle or already owned by one of them,
+	# higher priority first, then by distance, angle of incidence and pan/tilt travel (see lampAssignment.SpatialAssigner)
+	def AssignLamps(self, highlights):
+		highlights = [highlight for highlight in highlights if highlight.intensity]
+		index = {id(highlight): i for i, highlight in enumerate(highlights)}
+		lamps = [lamp for lamp in self.values() if lamp.owner is None or id(lamp.owner) in index]
+		if not lamps:
+			return
+		current = [index[id(lamp.owner)] if lamp.owner is not None else -1 for lamp in lamps]
+		assignment = self.assigner.assign(
+			[lamp.position for lamp in lamps],
+			[lamp_aim(lamp) for lamp in lamps],
+			[highlight.trackerPosition for highlight in highlights],
+			[highlight.maxSize for highlight in highlights],
+			current,
+			[highlight.priority for highlight in highlights])
+		# releases first, so a lamp never ends up in two highlights
+		for lamp, highlightIndex, currentIndex in zip(lamps, assignment.tolist(), current):
+			if highlightIndex != currentIndex and currentIndex >= 0:
+				highlights[currentIndex].releaseLamp(lamp.lampId)
+		for lamp, highlightIndex, currentIndex in zip(lamps, assignment.tolist(), current):
+			if highlightIndex != currentIndex and highlightIndex >= 0:
+				highlights[highlightIndex].append(lamp)
 
 	def releaseAll(self):
 		for lampId in self:
@@ -69,9 +88,9 @@ class LampManagerExt(dict):
 	# value = 0 -> don't use! MQ wants it
 	# TODO: when lamp has a purpose at the moment, find a replacement
 	def setReservationForLamp(self, lampId, value):
-		debug(lampId, value)
+		log.debug('reservation lamp %s %s', lampId, value)
 		lamp = self.lamps[lampId]
-		debug(lamp)
+		log.debug('%s', lamp)
 		if lamp.purpose == "MQ" and value > 0:
 			lamp.purpose = None
 			lamp.purposeId = 0
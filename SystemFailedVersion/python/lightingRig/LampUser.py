@@ -26,6 +26,8 @@ class LampUser(list):
 			self.remove(lamp)
 
 	def releaseAllLamps(self):
+		# also drop a waiting request, we don't want lamps anymore
+		self.lampManager.CancelRequests(self)
 		for lamp in self:
 			lamp.release()
 		self.clear()
@@ -8,6 +8,19 @@ can be accessed externally, e.g. op('yourComp').PromotedFunction().
 Help: search "Extensions" in wiki
 """
 
+from dmxSender import DMXSender
+from oscScheduler import OSCScheduler
+from rigLog import get_logger
+from trackerEncoder import TrackerEncoder
+
+# called every frame, so everything is on DEBUG: osc messages and incoming values, 'mq.tracker': tracker messages
+log = get_logger('mq')
+trackerLog = get_logger('mq.tracker')
+
+def dmx_channel(index):
+	# dmxOut par value<index> is zero-based, its dmx channel (and DMXSender's) one-based
+	return index + 1
+
 class MQInterfaceExt:
 	"""
 	MQInterfaceEXt description
@@ -18,7 +31,6 @@ class MQInterfaceExt:
 		self.oscSender = op('oscout_mq')
 		self.mqSender = op('tracker_sender')
 		self.dmxOut = op('dmxout_chans')
-		self.oscThrottelCounter = 0
 		self.executeDict = {
 			'activation': {'page': 13},
 			'color': {'page': 14},
@@ -26,75 +38,133 @@ class MQInterfaceExt:
 			'shutter': {'page': 12},
 			'zoom': {'page': 15}
 		}
-		self.verbose = 1 # 0:quiet, 1: oscMessages, 2: +incoming values, 3: +tracker-messages
-		self.tracker = {gid: {'tid': 0, 'position': (0,0,0)} for gid in range(16)}
+		self.tracker = TrackerEncoder(gids=16, epsilon=0.005, keepAlive=1.0)
+		# output of the current frame, written once by Flush at frame end
+		self.pendingDmx = dict()	# dmxOut value index -> value
+		# osc executes, the last message per address of a frame wins, sent at frame end (see OscBundles)
+		self.osc = OSCScheduler()
+		# replaces the old "every second zoom message" throttle, now per lamp
+		self.osc.limit(f"/exec/{self.executeDict['zoom']['page']}/", 1/30)
+		# False: one sendOSC per message like before (TD encodes the types),
+		# True: own #bundle packets with 32 bit floats, only if MagicQ is known to take them
+		self.OscBundles = False
+		self.execAddresses = dict()
+		self.sentDmx = dict()		# what the dmxOut pars currently hold
+		# native Art-Net/sACN output instead of the dmxOut pars, see StartDmxSender
+		self.dmxSender = None
+		self.dmxUniverse = 0
+
+	def queueDmx(self, index, value):
+		self.pendingDmx[index] = value
+
+	def queueOsc(self, oscMessage, arguments):
+		self.osc.queue(oscMessage, arguments)
+
+	def execAddress(self, attributeName, number):
+		key = (attributeName, number)
+		if key not in self.execAddresses:
+			self.execAddresses[key] = f"/exec/{self.executeDict[attributeName]['page']}/{number}"
+		return self.execAddresses[key]
+
+	# sent/dropped/coalesced/... osc messages so far
+	def GetOscCounters(self):
+		return dict(self.osc.counters)
+
+	# called by execute-DAT at frame end
+	def Flush(self):
+		if self.dmxSender is not None:
+			# the sender thread picks up the buffer at its own rate
+			for index, value in self.pendingDmx.items():
+				self.dmxSender.set(self.dmxUniverse, dmx_channel(index), value)
+			self.pendingDmx.clear()
+		for index, value in self.pendingDmx.items():
+			if self.sentDmx.get(index) != value:
+				self.dmxOut.par[f'value{index}'] = value
+				self.sentDmx[index] = value
+		self.pendingDmx.clear()
+		if self.OscBundles:
+			for bundle in self.osc.flush(absTime.seconds):
+				self.oscSender.sendBytes(bundle)
+		else:
+			for oscMessage, arguments in self.osc.flushMessages(absTime.seconds):
+				self.oscSender.sendOSC(oscMessage, arguments, useNonStandardTypes=True)
+
+	# protocol 'artnet' or 'sacn', host None broadcasts (artnet) or multicasts (sacn)
+	def StartDmxSender(self, protocol='artnet', host=None, universe=0, rate=40, loopback=False):
+		self.StopDmxSender()
+		self.dmxUniverse = universe
+		self.dmxSender = DMXSender(protocol, host=host, rate=rate, loopback=loopback)
+		# start from what the dmxOut pars hold
+		for index, value in self.sentDmx.items():
+			self.dmxSender.set(universe, dmx_channel(index), value)
+		self.dmxSender.start()
+
+	def StopDmxSender(self):
+		if self.dmxSender is not None:
+			self.dmxSender.close()
+			self.dmxSender = None
 
 	def SetActivation(self, activationId, intensity, lampId):
-		if self.verbose > 1: debug(activationId, intensity, lampId)
-		oscMessage = f"/exec/{self.executeDict['activation']['page']}/{activationId + lampId}"
-		if self.verbose > 0: debug(oscMessage, intensity)
-		self.oscSender.sendOSC(oscMessage, [intensity], useNonStandardTypes=True)
+		log.debug('activation %s intensity %s lamp %s', activationId, intensity, lampId)
+		oscMessage = self.execAddress('activation', activationId + lampId)
+		log.debug('%s %s', oscMessage, intensity)
+		self.queueOsc(oscMessage, [intensity])
 
 	def SetActivationViaArtnet(self, activationId, intensity, lampId):
-		if self.verbose > 1: debug(activationId, intensity, lampId)
+		log.debug('activation %s intensity %s lamp %s', activationId, intensity, lampId)
 		if activationId == 1:
 			index = activationId + lampId
 			value = 255 * intensity
-		self.dmxOut.par[f'value{index}'] = value
+		else:
+			log.warning('no artnet activation for activation %s (lamp %s)', activationId, lampId)
+			return
+		self.queueDmx(index, value)
 
 	def ChooseSoftPalette(self, attributeName, attributeId, lampId):
-		if self.verbose > 1: debug(attributeName, attributeId, lampId)
-		oscMessage = f"/exec/{self.executeDict[attributeName]['page']}/{attributeId + lampId}"
-		if self.verbose > 0: debug(oscMessage)
-		self.oscSender.sendOSC(oscMessage, [int(100)], useNonStandardTypes=True)
+		log.debug('%s %s lamp %s', attributeName, attributeId, lampId)
+		oscMessage = self.execAddress(attributeName, attributeId + lampId)
+		log.debug('%s', oscMessage)
+		self.queueOsc(oscMessage, [int(100)])
 
 	def SetZoom(self, lampId, value):
-		if self.verbose > 1: debug(lampId, value)
+		log.debug('zoom lamp %s %s', lampId, value)
 		# TODO move this to artnet and use the measured zoom-values
 		#if we send 1.0 the value in MQ is going to 0
 		index = lampId
 		dmx = 255 * value
-		self.dmxOut.par[f'value{index}'] = dmx
+		self.queueDmx(index, dmx)
 
 	def SetColor(self, lampId, color):
-		if self.verbose > 0: debug(lampId, color)
+		log.debug('color lamp %s %s', lampId, color)
 		index = lampId
 		dmxRed = 255 * color[0]
 		dmxGreen = 255 * color[1]
 		dmxBlue = 255 * color[2]
 		dmxWhite = 255 * color[3]
-		self.dmxOut.par[f'value{16+index}'] = dmxRed
-		self.dmxOut.par[f'value{32+index}'] = dmxGreen
-		self.dmxOut.par[f'value{48+index}'] = dmxBlue
-		self.dmxOut.par[f'value{64+index}'] = dmxWhite
+		self.queueDmx(16+index, dmxRed)
+		self.queueDmx(32+index, dmxGreen)
+		self.queueDmx(48+index, dmxBlue)
+		self.queueDmx(64+index, dmxWhite)
 
 	def SetZoomViaOSC(self, lampId, value):
-		if self.verbose > 1: debug(lampId, value)
+		log.debug('zoom lamp %s %s', lampId, value)
 		# TODO move this to artnet and use the measured zoom-values
-		oscMessage = f"/exec/{self.executeDict['zoom']['page']}/{lampId+1}"
-		if self.verbose > 0: debug(oscMessage, value*0.999999)
+		oscMessage = self.execAddress('zoom', lampId+1)
 		#if we send 1.0 the value in MQ is going to 0
-		self.oscThrottelCounter += 1
-		if self.oscThrottelCounter%2 == 0:			
-			self.oscSender.sendOSC(oscMessage, [value*0.999999], useNonStandardTypes=True)
+		value = value*0.999999
+		log.debug('%s %s', oscMessage, value)
+		# rate limited per address by self.osc
+		self.queueOsc(oscMessage, [value])
 
 	def SetTracker(self, gid, tid, position):
-		if self.verbose > 1: debug(gid, tid, position)
-		if gid not in self.tracker:
-			debug("cannot set tracker for gid ", gid)
+		trackerLog.debug('gid %s tid %s %s', gid, tid, position)
+		if not self.tracker.set(gid, tid, position):
+			trackerLog.warning('cannot set tracker for gid %s', gid)
 			return
-		self.tracker[gid]['tid'] = tid
-		self.tracker[gid]['position'] = position
 
 	# called by execute-DAT
+	# only changed trackers (and the ones due for a keep-alive), one datagram per tracker like MagicQ expects
 	def SendTracker(self):
-		for gid in self.tracker:
-			x = self.tracker[gid]['position'][0]
-			y = self.tracker[gid]['position'][2]
-			z = -1*self.tracker[gid]['position'][1]
-			tid = self.tracker[gid]['tid']
-			msg = f'{x:.2f},{y:.2f},{z:.2f},{gid},Tracker:{tid}'
-			if self.verbose > 2: debug(msg)
-			self.mqSender.send(msg)
-
-
+		for message in self.tracker.collect(absTime.seconds):
+			trackerLog.debug('%s', message)
+			self.mqSender.send(message)
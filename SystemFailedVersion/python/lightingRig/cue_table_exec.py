@@ -0,0 +1,29 @@
+# me - this DAT.
+# 
+# dat - the changed DAT
+# rows - a list of row indices
+# cols - a list of column indices
+# cells - the list of cells that have changed content
+# prev - the list of previous string contents of the changed cells
+# 
+# Make sure the corresponding toggle is enabled in the DAT Execute DAT.
+# 
+# If rows or columns are deleted, sizeChange will be called instead of row/col/cellChange.
+
+# watches the cue_table, new highlights get the edited cues (see highlightTable.CueTable)
+
+def onTableChange(dat):
+	op.highlighter.ReloadCueTable()
+	return
+
+def onRowChange(dat, rows):
+	return
+
+def onColChange(dat, cols):
+	return
+
+def onCellChange(dat, cells, prev):
+	return
+
+def onSizeChange(dat):
+	return
@@ -0,0 +1,229 @@
+"""
+Art-Net / sACN (E1.31) DMX output over UDP.
+
+Owns one 512 byte buffer per universe and sends the universes at a fixed
+rate, independent of TouchDesigner cooking when started as a thread:
+	sender = DMXSender('artnet', host='2.255.255.255')
+	sender.start()
+	sender.set(0, 17, 255)			# universe 0, channel 17 (one-based)
+	...
+	sender.stop()
+
+Without the thread, call tick() regularly (e.g. once per frame), it sends
+whenever the next paced send is due.
+
+Universes that didn't change are skipped, but resent every keepAlive seconds
+so receivers don't time out. Every universe has its own sequence number.
+
+Art-Net universes are numbered as on the wire (15 bit port address, starting
+at 0), sACN universes start at 1. With loopback=True everything is sent to
+127.0.0.1, LoopbackReceiver is a small local receiver to test against.
+"""
+
+import socket
+import threading
+import time
+import uuid
+
+ARTNET_PORT = 6454
+SACN_PORT = 5568
+UNIVERSE_SIZE = 512
+
+def artnet_header(universe):
+	# ArtDmx: id, opcode 0x5000 (little endian), protocol version 14, sequence, physical, universe, length
+	return bytearray(b'Art-Net\x00' + bytes((0x00, 0x50, 0, 14, 0, 0, universe & 0xff, (universe >> 8) & 0x7f, UNIVERSE_SIZE >> 8, UNIVERSE_SIZE & 0xff)))
+
+def sacn_header(universe, cid, sourceName, priority=100):
+	# root layer, framing layer and DMP layer of an E1.31 data packet, 638 bytes with a full universe
+	def flags_length(length):
+		return bytes((0x70 | (length >> 8), length & 0xff))
+	packet = bytearray()
+	# root layer
+	packet += (0x0010).to_bytes(2, 'big') + (0).to_bytes(2, 'big') + b'ASC-E1.17\x00\x00\x00'
+	packet += flags_length(638 - 16) + (0x00000004).to_bytes(4, 'big') + cid
+	# framing layer
+	packet += flags_length(638 - 38) + (0x00000002).to_bytes(4, 'big')
+	packet += sourceName.encode('utf-8')[:63].ljust(64, b'\x00')
+	packet += bytes((priority,)) + (0).to_bytes(2, 'big') + bytes((0, 0)) + universe.to_bytes(2, 'big')
+	# DMP layer, start code 0 + 512 slots
+	packet += flags_length(638 - 115) + bytes((0x02, 0xa1)) + (0).to_bytes(2, 'big') + (1).to_bytes(2, 'big') + (UNIVERSE_SIZE + 1).to_bytes(2, 'big') + b'\x00'
+	return packet
+
+# offsets of sequence number and dmx data in the packets
+PROTOCOLS = {
+	'artnet': {'port': ARTNET_PORT, 'sequence': 12, 'data': 18},
+	'sacn': {'port': SACN_PORT, 'sequence': 111, 'data': 126},
+}
+
+def sacn_multicast(universe):
+	return f'239.255.{(universe >> 8) & 0xff}.{universe & 0xff}'
+
+def parse_packet(packet):
+	# (protocol, universe, sequence, data) of an ArtDmx or E1.31 data packet, None for anything else
+	if packet[:8] == b'Art-Net\x00' and packet[8:10] == b'\x00\x50':
+		length = (packet[16] << 8) | packet[17]
+		return 'artnet', packet[14] | (packet[15] << 8), packet[12], bytes(packet[18:18 + length])
+	if packet[4:16] == b'ASC-E1.17\x00\x00\x00' and len(packet) >= 126:
+		return 'sacn', int.from_bytes(packet[113:115], 'big'), packet[111], bytes(packet[126:])
+	return None
+
+class Universe:
+	def __init__(self, number, header, layout):
+		self.number = number
+		self.packet = header + bytearray(UNIVERSE_SIZE)
+		self.data = memoryview(self.packet)[layout['data']:]
+		self.sequenceOffset = layout['sequence']
+		self.sequence = 0
+		self.dirty = True
+		self.lastSent = -float('inf')
+
+	def nextSequence(self):
+		# 0 means "no sequencing" in Art-Net, so it counts 1...255
+		self.sequence = self.sequence % 255 + 1
+		self.packet[self.sequenceOffset] = self.sequence
+
+class DMXSender:
+	def __init__(self, protocol='artnet', host=None, port=None, rate=40., keepAlive=1.,
+			loopback=False, sourceName='lightingRig', priority=100):
+		self.protocol = protocol
+		self.layout = PROTOCOLS[protocol]
+		self.loopback = loopback
+		if loopback:
+			host = '127.0.0.1'
+		self.host = host
+		self.port = port or self.layout['port']
+		self.rate = rate
+		self.keepAlive = keepAlive
+		self.sourceName = sourceName
+		self.priority = priority
+		self.cid = uuid.uuid4().bytes
+		self.universes = dict()
+		self.lock = threading.Lock()
+		self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+		self.nextSend = 0.
+		self.thread = None
+		self.running = False
+		self.packetsSent = 0
+		self.packetsSkipped = 0
+
+	def universe(self, number):
+		if number not in self.universes:
+			if self.protocol == 'artnet':
+				header = artnet_header(number)
+			else:
+				header = sacn_header(number, self.cid, self.sourceName, self.priority)
+			self.universes[number] = Universe(number, header, self.layout)
+		return self.universes[number]
+
+	def address(self, universe):
+		if self.host is None:
+			return (sacn_multicast(universe.number) if self.protocol == 'sacn' else '255.255.255.255', self.port)
+		return (self.host, self.port)
+
+	def set(self, universe, channel, value):
+		# channel is one-based, value 0...255
+		value = min(max(int(round(value)), 0), 255)
+		with self.lock:
+			universe = self.universe(universe)
+			if universe.data[channel - 1] != value:
+				universe.data[channel - 1] = value
+				universe.dirty = True
+
+	def setMany(self, universe, values, start=1):
+		# values for the channels start, start + 1, ...
+		values = bytes(min(max(int(round(value)), 0), 255) for value in values)
+		with self.lock:
+			universe = self.universe(universe)
+			if universe.data[start - 1:start - 1 + len(values)] != values:
+				universe.data[start - 1:start - 1 + len(values)] = values
+				universe.dirty = True
+
+	def get(self, universe, channel):
+		return self.universe(universe).data[channel - 1]
+
+	def send(self, now=None, force=False):
+		# sends every changed universe (and the ones due for a keep-alive), returns the packet count
+		now = time.monotonic() if now is None else now
+		sent = 0
+		with self.lock:
+			for universe in self.universes.values():
+				if not (force or universe.dirty or now - universe.lastSent >= self.keepAlive):
+					self.packetsSkipped += 1
+					continue
+				universe.nextSequence()
+				self.socket.sendto(universe.packet, self.address(universe))
+				universe.dirty = False
+				universe.lastSent = now
+				sent += 1
+		self.packetsSent += sent
+		return sent
+
+	def tick(self, now=None):
+		# paced send, call as often as you like
+		now = time.monotonic() if now is None else now
+		if now < self.nextSend:
+			return 0
+		# stay on the grid, but don't try to catch up with missed sends
+		self.nextSend = max(self.nextSend + 1. / self.rate, now)
+		return self.send(now)
+
+	def run(self):
+		while self.running:
+			self.tick()
+			time.sleep(max(self.nextSend - time.monotonic(), 0.))
+
+	def start(self):
+		if self.thread is not None:
+			return
+		self.running = True
+		self.thread = threading.Thread(target=self.run, name='DMXSender', daemon=True)
+		self.thread.start()
+
+	def stop(self):
+		self.running = False
+		if self.thread is not None:
+			self.thread.join()
+			self.thread = None
+
+	def close(self):
+		self.stop()
+		self.socket.close()
+
+class LoopbackReceiver:
+	"""
+	Local stand-in for a node/console: receives on 127.0.0.1 and keeps the
+	last data per universe.
+	"""
+	def __init__(self, protocol='artnet', port=None, timeout=0.5):
+		self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.socket.bind(('127.0.0.1', port or PROTOCOLS[protocol]['port']))
+		self.socket.settimeout(timeout)
+		self.universes = dict()
+		self.sequences = dict()
+		self.packets = 0
+
+	@property
+	def port(self):
+		return self.socket.getsockname()[1]
+
+	def receive(self, count=1):
+		# reads up to count packets, returns the parsed ones
+		parsed = list()
+		for i in range(count):
+			try:
+				packet, address = self.socket.recvfrom(1024)
+			except socket.timeout:
+				break
+			result = parse_packet(packet)
+			if result is None:
+				continue
+			protocol, universe, sequence, data = result
+			self.universes[universe] = data
+			self.sequences[universe] = sequence
+			self.packets += 1
+			parsed.append(result)
+		return parsed
+
+	def close(self):
+		self.socket.close()
@@ -0,0 +1,177 @@
+"""
+Array backed DMX input state.
+
+All universes live in one flat numpy byte array (512 bytes per universe).
+Frames are ingested at once, diffed against the current state, and only the
+changed channels that have subscribers get dispatched, so the cost of a frame
+doesn't depend on the number of universes.
+
+Channels are one-based and addressed either as channel (universe 1) or as
+(universe, channel), universes are one-based as well.
+
+16 bit subscriptions combine the coarse channel and the fine channel right
+after it, value = coarse * 256 + fine (0...65535). They fire once per frame
+even if both bytes changed.
+
+The calling convention of a subscriber is resolved once when it subscribes:
+	callback(value)				callables with one parameter
+	callback(channel, value)	callables with two parameters, channel as subscribed
+	{'object': o, 'name': n}	setattr(o, n, value)
+Values are python ints.
+"""
+
+from inspect import signature
+
+import numpy as np
+
+UNIVERSE_SIZE = 512
+
+def resolve_callback(callback):
+	# returns a dispatcher dispatch(channel, value) for the subscriber
+	if callable(callback):
+		if len(signature(callback).parameters) == 1:
+			return lambda channel, value: callback(value)
+		return callback
+	target = callback['object']
+	name = callback['name']
+	return lambda channel, value: setattr(target, name, value)
+
+def same_callback(a, b):
+	# setattr subscribers are dicts, their objects (e.g. lists of lamps) have to be compared by identity
+	if isinstance(a, dict) and isinstance(b, dict):
+		return a['object'] is b['object'] and a['name'] == b['name']
+	return a == b
+
+class DMXStore:
+	def __init__(self, universes=1, size=UNIVERSE_SIZE):
+		self.size = size
+		self.universes = 0
+		self.values = np.zeros(0, dtype=np.uint8)
+		self.watched = np.zeros(0, dtype=bool)
+		# (flat index, 16 bit) -> list of (callback, dispatcher, channel as subscribed)
+		self.subscribers = dict()
+		# flat index -> subscriptions that read it
+		self.watchers = dict()
+		self.frames = 0
+		self.dispatched = 0
+		self.ensureUniverse(universes)
+
+	def ensureUniverse(self, universe):
+		if universe <= self.universes:
+			return
+		grow = (universe - self.universes) * self.size
+		self.values = np.concatenate((self.values, np.zeros(grow, dtype=np.uint8)))
+		self.watched = np.concatenate((self.watched, np.zeros(grow, dtype=bool)))
+		self.universes = universe
+
+	def index(self, channel):
+		# channel or (universe, channel) -> flat zero-based index
+		universe = 1
+		if isinstance(channel, tuple):
+			universe, channel = channel
+		if not 1 <= channel <= self.size or universe < 1:
+			raise ValueError(f"invalid dmx channel {channel} in universe {universe}")
+		self.ensureUniverse(universe)
+		return (universe - 1) * self.size + channel - 1
+
+	def toBytes(self, frame):
+		frame = np.asarray(frame)
+		if frame.dtype != np.uint8:
+			frame = np.clip(np.rint(frame), 0, 255).astype(np.uint8)
+		return frame.ravel()
+
+	def read(self, index, sixteenBit):
+		if sixteenBit:
+			return int(self.values[index]) * 256 + int(self.values[index + 1])
+		return int(self.values[index])
+
+	def value(self, channel, sixteenBit=False):
+		return self.read(self.index(channel), sixteenBit)
+
+	def ingest(self, frame, universe=1):
+		# frame: values of one universe, starting at channel 1
+		frame = self.toBytes(frame)[:self.size]
+		self.ensureUniverse(universe)
+		start = (universe - 1) * self.size
+		return self.ingestFlat(frame, start)
+
+	def ingestAll(self, frames):
+		# frames: (universes, 512) array starting with universe 1
+		frames = self.toBytes(frames)
+		self.ensureUniverse(-(-len(frames) // self.size))
+		return self.ingestFlat(frames, 0)
+
+	def ingestFlat(self, frame, start):
+		current = self.values[start:start + len(frame)]
+		changed = np.flatnonzero((frame != current) & self.watched[start:start + len(frame)])
+		# unwatched channels are just copied
+		current[:] = frame
+		self.frames += 1
+		if not len(changed):
+			return 0
+		# every subscription once, even if coarse and fine changed
+		watchers = self.watchers
+		keys = dict()
+		for index in (changed + start).tolist():
+			for key in watchers[index]:
+				keys[key] = None
+		for key in keys:
+			self.dispatch(key)
+		return len(keys)
+
+	def update(self, channel, value):
+		# single channel, e.g. from a per channel CHOP callback
+		index = self.index(channel)
+		value = int(self.toBytes([value])[0])
+		if value == self.values[index]:
+			return
+		self.values[index] = value
+		for key in tuple(self.watchers.get(index, ())):
+			self.dispatch(key)
+
+	def dispatch(self, key):
+		value = self.read(*key)
+		# copy, subscribers may unsubscribe from within their callback
+		for callback, dispatcher, channel in tuple(self.subscribers[key]):
+			dispatcher(channel, value)
+		self.dispatched += 1
+
+	def subscribe(self, channel, callback, sixteenBit=False, notify=True):
+		index = self.index(channel)
+		if sixteenBit and (index + 1) % self.size == 0:
+			raise ValueError(f"16 bit channel {channel} needs a fine channel in the same universe")
+		key = (index, sixteenBit)
+		dispatcher = resolve_callback(callback)
+		if key not in self.subscribers:
+			self.subscribers[key] = list()
+			for i in range(index, index + 2 if sixteenBit else index + 1):
+				self.watchers.setdefault(i, list()).append(key)
+				self.watched[i] = True
+		self.subscribers[key].append((callback, dispatcher, channel))
+		if notify:
+			dispatcher(channel, self.read(index, sixteenBit))
+
+	def unsubscribe(self, channel, callback, sixteenBit=False):
+		index = self.index(channel)
+		key = (index, sixteenBit)
+		subscribers = self.subscribers.get(key)
+		if subscribers is None:
+			return
+		for i, (subscribed, dispatcher, subscribedChannel) in enumerate(subscribers):
+			if same_callback(subscribed, callback):
+				del subscribers[i]
+				break
+		if subscribers:
+			return
+		del self.subscribers[key]
+		for i in range(index, index + 2 if sixteenBit else index + 1):
+			self.watchers[i].remove(key)
+			if not self.watchers[i]:
+				del self.watchers[i]
+				self.watched[i] = False
+
+	def clear(self):
+		self.values[:] = 0
+		self.watched[:] = False
+		self.subscribers.clear()
+		self.watchers.clear()
@@ -0,0 +1,475 @@
+"""
+Headless runtime: the lightingRig extensions without TouchDesigner.
+
+The modules grab their operators when they are imported (Lamp.magicQ,
+LampUser.lampManager, Highlight.cueTable, ...), so the stand-ins have to be in
+place first. Runtime() sets up, in this order:
+	builtins	op, ops, absTime, debug, math like in TD
+	op.main		'spikies' (lamp positions, config/spikie_pos.tsv) and 'cue_table'
+	op.magicQ	MQInterfaceExt with oscout_mq / tracker_sender / dmxout_chans
+				stand-ins that count what would go out
+	op.DMX		DMXManagerExt reading the dmxin<n> stand-in CHOPs
+	op.lampManager, op.lampReservation, op.highlighter
+and loads the DATs as TD would import them ('lamp' is Lamp.py, ...), the
+execute DATs (raw_highlights_exec, cue_table_exec, mqExecute, DMXinExec) with their `me`.
+Promoted attributes (capitalized) of the extensions are reachable on the
+comps, like in TD. One Runtime per process.
+
+A show is a JSON lines recording, one frame per line:
+	{"t": 0.033, "tracks": [[trackId, x, y, z], ...], "cues": {"trackId": cue}, "dmx": {"1": {"26": 255}}}
+"cues" and "dmx" are changes only, they stay as they are until a later frame
+changes them (dmx: universe -> one-based channel -> value). Tracks without a
+cue get `defaultCue`. ShowRecorder writes that format (also from within TD),
+synthesize_show() makes one from trackingReplay walkers.
+
+Every frame runs like a TD frame: the dmxin CHOPs get the frame's values,
+mqExecute.onFrameStart (ingests the DMX), HighlighterExt.Tick, the raw
+highlights table callbacks, mqExecute.onFrameEnd.
+
+	python headless.py show.jsonl
+	python headless.py --synth 40 --seconds 60 --assignment spatial --smoothing --report replay.json
+"""
+
+import argparse
+import builtins
+import fnmatch
+import importlib.util
+import json
+import math
+import os
+import sys
+import time
+import types
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CONFIG = os.path.join(HERE, '..', '..', 'config', 'spikie_pos.tsv')
+sys.path.insert(0, HERE)
+
+from oscScheduler import parse_bundle
+import trackingReplay
+
+# DATs imported by a name other than their file
+ALIASES = {'lamp': 'Lamp.py', 'lampUser': 'LampUser.py', 'highlight': 'Highlight.py'}
+# modules that bind operators when they are imported, loaded again for every Runtime
+DAT_MODULES = tuple(ALIASES) + ('MQInterfaceExt', 'DMXManagerExt', 'LampManagerExt', 'LampReservationExt',
+	'HighlighterExt', 'raw_highlights_exec', 'cue_table_exec', 'mqExecute', 'DMXinExec')
+
+CUE_HEADER = ['Cue', 'Activation', 'Color', 'Beam', 'Shutter', 'Amount', 'Priority', 'Intensity']
+DEFAULT_CUES = [
+	[1, 1, 1, 1, 1, 2, 1, '1.0'],
+	[2, 1, 2, 1, 1, 1, 2, '1.0'],
+	[3, 1, 3, 2, 1, 3, 1, '1.0'],
+]
+# raw highlights table, Trackid in column 0 and Highlightcue in column 16 like in the show file
+TRACK_HEADER = ['Trackid', 'Positionx', 'Positiony', 'Positionz'] + [f'Value{i}' for i in range(12)] + ['Highlightcue']
+
+# LampReservationExt: a lamp belongs to MagicQ while its channel is 0
+RESERVATION_CHANNEL = 401
+
+def cue_channel(cueId, offset):
+	# dmx channel of a highlight cue, see Highlight (27 channels per cue)
+	return (cueId - 1) * 27 + offset
+
+########## STAND-INS
+
+class Cell:
+	def __init__(self, row, col, val):
+		self.row = row
+		self.col = col
+		self.val = val
+
+	def __str__(self):
+		return self.val
+
+	def __repr__(self):
+		return f'cell({self.row}, {self.col}) {self.val}'
+
+class TableDAT:
+	def __init__(self, name, rows):
+		self.name = name
+		self.data = [[str(value) for value in row] for row in rows]
+
+	@property
+	def numRows(self):
+		return len(self.data)
+
+	@property
+	def numCols(self):
+		return len(self.data[0]) if self.data else 0
+
+	@property
+	def text(self):
+		return ''.join('\t'.join(row) + '\n' for row in self.data)
+
+	def column(self, col):
+		return self.data[0].index(col) if isinstance(col, str) else col
+
+	def __getitem__(self, key):
+		row, col = key
+		if isinstance(row, str):
+			row = [r[0] for r in self.data].index(row)
+		col = self.column(col)
+		return Cell(row, col, self.data[row][col])
+
+	def row(self, row):
+		return [Cell(row, col, val) for col, val in enumerate(self.data[row])]
+
+	def rows(self):
+		return [self.row(row) for row in range(self.numRows)]
+
+class CHOP:
+	# dmxin<n>: 512 channels, one sample
+	def __init__(self, name, channels=512):
+		self.name = name
+		self.values = np.zeros((channels, 1), dtype=np.float32)
+
+	def numpyArray(self):
+		return self.values
+
+class OSCOut:
+	def __init__(self, name):
+		self.name = name
+		self.packets = 0
+		self.messages = 0
+		self.bytes = 0
+
+	def sendBytes(self, packet):
+		self.packets += 1
+		self.bytes += len(packet)
+		self.messages += len(parse_bundle(packet))
+
+	def sendOSC(self, address, values, **options):
+		self.packets += 1
+		self.messages += 1
+
+class TrackerSender:
+	# one tracker message per datagram
+	def __init__(self, name):
+		self.name = name
+		self.messages = 0
+
+	def send(self, text):
+		self.messages += 1
+
+class Pars(dict):
+	def __init__(self):
+		super().__init__()
+		self.writes = 0
+
+	def __setitem__(self, name, value):
+		self.writes += 1
+		super().__setitem__(name, value)
+
+class ConstantCHOP:
+	# dmxout_chans, value<n> pars
+	def __init__(self, name):
+		self.name = name
+		self.par = Pars()
+
+class Comp:
+	# component with extensions, capitalized extension attributes are promoted
+	def __init__(self, name, children=()):
+		self.name = name
+		self.children = {child.name: child for child in children}
+		self.ext = types.SimpleNamespace()
+		self.extensions = list()
+
+	def op(self, path):
+		return self.children.get(path.split('/')[-1])
+
+	def attach(self, extension):
+		setattr(self.ext, type(extension).__name__, extension)
+		self.extensions.append(extension)
+		return extension
+
+	def __getattr__(self, name):
+		if name[:1].isupper():
+			for extension in self.__dict__.get('extensions', ()):
+				if hasattr(extension, name):
+					return getattr(extension, name)
+		raise AttributeError(f'{self.__dict__.get("name")} has no promoted attribute {name}')
+
+class Me:
+	# `me` of a DAT inside comp
+	def __init__(self, comp):
+		self.comp = comp
+		self.ext = comp.ext
+
+	def parent(self):
+		return self.comp
+
+class Op:
+	# global op: op.<shortcut> attributes, op('name') over all registered operators
+	def __init__(self):
+		self.operators = dict()
+
+	def register(self, *operators):
+		for operator in operators:
+			self.operators[operator.name] = operator
+
+	def __call__(self, path):
+		return self.operators.get(path.split('/')[-1])
+
+	def ops(self, *patterns):
+		return [operator for name, operator in self.operators.items() if any(fnmatch.fnmatch(name, pattern) for pattern in patterns)]
+
+########## RUNTIME
+
+def load_module(name, filename, me=None):
+	spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, filename))
+	module = importlib.util.module_from_spec(spec)
+	if me is not None:
+		module.me = me
+	sys.modules[name] = module
+	spec.loader.exec_module(module)
+	return module
+
+class DatFinder:
+	# `import lamp` finds Lamp.py, like TD finds the DAT
+	def find_spec(self, fullname, path=None, target=None):
+		if fullname in ALIASES:
+			return importlib.util.spec_from_file_location(fullname, os.path.join(HERE, ALIASES[fullname]))
+		return None
+
+def read_lamps(path=CONFIG, lampType='spikie'):
+	# rows without header: id, type, posX, posY, posZ, possibleTargets
+	with open(path) as f:
+		rows = [line.rstrip('\n').split('\t') for line in f][1:]
+	return [row[:6] for row in rows if len(row) > 4 and row[1] == lampType]
+
+class Runtime:
+	def __init__(self, cues=DEFAULT_CUES, lamps=None, universes=2, verbose=False):
+		for name in DAT_MODULES:
+			sys.modules.pop(name, None)
+		if not any(isinstance(finder, DatFinder) for finder in sys.meta_path):
+			sys.meta_path.insert(0, DatFinder())
+		self.op = Op()
+		self.absTime = types.SimpleNamespace(frame=0, seconds=0.)
+		builtins.op = self.op
+		builtins.ops = self.op.ops
+		builtins.absTime = self.absTime
+		builtins.debug = print if verbose else (lambda *args: None)
+		builtins.math = math
+
+		self.cueTable = TableDAT('cue_table', [CUE_HEADER] + [list(cue) for cue in cues])
+		self.lampTable = TableDAT('spikies', lamps or read_lamps())
+		self.tracksTable = TableDAT('raw_highlights', [TRACK_HEADER])
+		self.oscOut = OSCOut('oscout_mq')
+		self.trackerSender = TrackerSender('tracker_sender')
+		self.dmxOut = ConstantCHOP('dmxout_chans')
+		self.dmxIn = [CHOP(f'dmxin{universe}') for universe in range(1, universes + 1)]
+		self.op.register(self.cueTable, self.lampTable, self.tracksTable, self.oscOut, self.trackerSender, self.dmxOut, *self.dmxIn)
+		self.op.main = Comp('main', [self.cueTable, self.lampTable, self.tracksTable])
+
+		self.op.magicQ = Comp('magicQ', [self.oscOut, self.trackerSender, self.dmxOut])
+		self.mq = self.op.magicQ.attach(load_module('MQInterfaceExt', 'MQInterfaceExt.py').MQInterfaceExt(self.op.magicQ))
+		self.op.DMX = Comp('DMX', self.dmxIn)
+		self.dmx = self.op.DMX.attach(load_module('DMXManagerExt', 'DMXManagerExt.py').DMXManagerExt(self.op.DMX))
+		self.op.lampManager = Comp('lampManager')
+		self.lampManager = self.op.lampManager.attach(load_module('LampManagerExt', 'LampManagerExt.py').LampManagerExt(self.op.lampManager))
+		self.op.lampReservation = Comp('lampReservation')
+		self.lampReservation = self.op.lampReservation.attach(load_module('LampReservationExt', 'LampReservationExt.py').LampReservationExt(self.op.lampReservation))
+		self.op.highlighter = Comp('highlighter')
+		self.highlighter = self.op.highlighter.attach(load_module('HighlighterExt', 'HighlighterExt.py').HighlighterExt(self.op.highlighter))
+
+		self.rawHighlightsExec = load_module('raw_highlights_exec', 'raw_highlights_exec.py', Me(self.op.main))
+		self.cueTableExec = load_module('cue_table_exec', 'cue_table_exec.py', Me(self.op.main))
+		self.mqExecute = load_module('mqExecute', 'mqExecute.py', Me(self.op.magicQ))
+		self.dmxInExec = load_module('DMXinExec', 'DMXinExec.py', Me(self.op.DMX))
+		self.defaultCue = 1
+		self.cues = dict()			# trackId -> cue, as set by the show
+
+	def setDmx(self, changes):
+		# {universe: {channel: value}}, one-based
+		for universe, channels in changes.items():
+			chop = self.dmxIn[int(universe) - 1]
+			for channel, value in channels.items():
+				chop.values[int(channel) - 1, 0] = value
+
+	def setTracks(self, tracks):
+		# rows keep their place, gone tracks are removed, new ones appended, then the DAT callbacks
+		table = self.tracksTable
+		previous = {int(row[0]): row for row in table.data[1:]}
+		current = {int(track[0]): track for track in tracks}
+		sizeChanged = any(trackId not in current for trackId in previous) or any(trackId not in previous for trackId in current)
+		changedCells = list()
+		prev = list()
+		rows = [table.data[0]]
+		for trackId, row in previous.items():
+			if trackId in current:
+				rows.append(row)
+		rows.extend([str(trackId)] + ['0'] * (len(TRACK_HEADER) - 1) for trackId in current if trackId not in previous)
+		table.data = rows
+		for rowId, row in enumerate(rows[1:], 1):
+			trackId = int(row[0])
+			x, y, z = current[trackId][1:4]
+			row[1:4] = (f'{x:g}', f'{y:g}', f'{z:g}')
+			cue = str(self.cues.get(trackId, self.defaultCue))
+			if row[16] != cue:
+				if not sizeChanged:
+					changedCells.append(Cell(rowId, 16, cue))
+					prev.append(row[16])
+				row[16] = cue
+		if sizeChanged:
+			self.rawHighlightsExec.onSizeChange(table)
+		elif changedCells:
+			self.rawHighlightsExec.onCellChange(table, changedCells, prev)
+		self.rawHighlightsExec.onTableChange(table)
+
+	def step(self, frame):
+		# one TD frame of a show frame (see the module docstring)
+		self.absTime.frame += 1
+		self.absTime.seconds = frame['t']
+		for trackId, cue in frame.get('cues', {}).items():
+			self.cues[int(trackId)] = int(cue)
+		if frame.get('dmx'):
+			self.setDmx(frame['dmx'])
+		self.mqExecute.onFrameStart(self.absTime.frame)
+		self.highlighter.Tick()
+		self.setTracks(frame.get('tracks', []))
+		self.mqExecute.onFrameEnd(self.absTime.frame)
+
+	def outputs(self):
+		return {
+			'osc_packets': self.oscOut.packets,
+			'osc_messages': self.oscOut.messages,
+			'tracker_messages': self.trackerSender.messages,
+			'dmx_writes': self.dmxOut.par.writes,
+		}
+
+def replay(runtime, frames, warmup=0):
+	# runs all frames, returns frames/s, output messages/s (per show second) and frame times
+	durations = list()
+	start = None
+	for i, frame in enumerate(frames):
+		if i == warmup:
+			start = runtime.outputs()
+		began = time.perf_counter()
+		runtime.step(frame)
+		if i >= warmup:
+			durations.append(time.perf_counter() - began)
+	end = runtime.outputs()
+	start = start or {key: 0 for key in end}
+	measured = frames[warmup:]
+	showSeconds = measured[-1]['t'] - measured[0]['t'] if len(measured) > 1 else 0.
+	durations = np.array(durations)
+	totals = {key: end[key] - start[key] for key in end}
+	return {
+		'frames': len(durations),
+		'show_seconds': showSeconds,
+		'fps': len(durations) / durations.sum() if durations.sum() else None,
+		'frame_ms': {
+			'mean': float(durations.mean() * 1e3),
+			'p50': float(np.percentile(durations, 50) * 1e3),
+			'p99': float(np.percentile(durations, 99) * 1e3),
+			'max': float(durations.max() * 1e3),
+		},
+		'outputs': totals,
+		'messages_per_second': {key: value / showSeconds for key, value in totals.items()} if showSeconds else None,
+		'highlights': len(runtime.highlighter),
+		'lamps_owned': sum(1 for lamp in runtime.lampManager.values() if lamp.owner is not None),
+	}
+
+########## RECORDING
+
+class ShowRecorder:
+	"""
+	Records tracking + DMX input as a show file, e.g. from an execute DAT in TD:
+		recorder.add(absTime.seconds, tracks, cues, op.DMX.ext.DMXManagerExt.store.values)
+	tracks (N,4), cues {trackId: cue}, dmx the flat DMXStore values (512 per universe).
+	Only changed cues and DMX channels get written.
+	"""
+	def __init__(self, universeSize=512):
+		self.universeSize = universeSize
+		self.frames = list()
+		self.start = None
+		self.cues = dict()
+		self.dmx = None
+
+	def add(self, now, tracks, cues=None, dmx=None):
+		if self.start is None:
+			self.start = now
+		frame = {'t': round(now - self.start, 4), 'tracks': np.asarray(tracks, dtype=np.float64).reshape(-1, 4).round(4).tolist()}
+		changedCues = {str(trackId): int(cue) for trackId, cue in (cues or {}).items() if self.cues.get(trackId) != cue}
+		if changedCues:
+			frame['cues'] = changedCues
+			self.cues.update(cues)
+		if dmx is not None:
+			dmx = np.array(dmx, dtype=np.uint8)
+			previous = self.dmx if self.dmx is not None and len(self.dmx) == len(dmx) else np.zeros_like(dmx)
+			changes = dict()
+			for index in np.flatnonzero(dmx != previous).tolist():
+				universe, channel = divmod(index, self.universeSize)
+				changes.setdefault(str(universe + 1), dict())[str(channel + 1)] = int(dmx[index])
+			if changes:
+				frame['dmx'] = changes
+			self.dmx = dmx
+		self.frames.append(frame)
+		return frame
+
+	def save(self, path):
+		trackingReplay.write_frames(path, self.frames)
+
+def synthesize_show(tracks=20, seconds=30., fps=30., cues=DEFAULT_CUES, seed=0):
+	# trackingReplay walkers, cues assigned round robin, all cues faded up and all lamps
+	# released by MagicQ (LampReservationExt) in the first frame
+	frames = trackingReplay.synthesize(tracks, seconds, fps, seed=seed)
+	cueIds = [int(cue[0]) for cue in cues]
+	seen = set()
+	for frame in frames:
+		new = {str(track[0]): cueIds[int(track[0]) % len(cueIds)] for track in frame['tracks'] if track[0] not in seen}
+		seen.update(track[0] for track in frame['tracks'])
+		if new:
+			frame['cues'] = new
+	frames[0]['dmx'] = {'1': {str(cue_channel(cueId, offset)): value for cueId in cueIds
+		for offset, value in ((26, 255), (23, 100), (10, 255), (12, 128), (14, 64), (16, 0))}}
+	frames[0]['dmx']['1'].update({str(RESERVATION_CHANNEL + lampId): 255 for lampId in range(16)})
+	return frames
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description="Replay a recorded show through the lightingRig extensions without TouchDesigner.")
+	parser.add_argument('file', nargs='?', help="show recording (json lines)")
+	parser.add_argument('--synth', type=int, default=0, help="synthesize a show with this many performers instead")
+	parser.add_argument('--seconds', type=float, default=30., help="synth duration")
+	parser.add_argument('--record', help="write the (synthesized) show to this file")
+	parser.add_argument('--warmup', type=int, default=30, help="frames not measured")
+	parser.add_argument('--assignment', choices=('equal', 'random', 'spatial'), default='equal')
+	parser.add_argument('--smoothing', action='store_true', help="One-Euro filter and 2 cm dead-band")
+	parser.add_argument('--prediction', type=float, default=0., help="lead tracks by this latency in s")
+	parser.add_argument('--osc-bundles', action='store_true', help="send the osc executes as bundles (MQInterfaceExt.OscBundles)")
+	parser.add_argument('--profile', help="enable the profiler and dump it to this file")
+	parser.add_argument('--report', help="write the results as json to this file")
+	args = parser.parse_args(args)
+
+	frames = trackingReplay.read_frames(args.file) if args.file else synthesize_show(args.synth or 20, args.seconds)
+	if args.record:
+		trackingReplay.write_frames(args.record, frames)
+	runtime = Runtime()
+	runtime.lampManager.AssignmentMode = args.assignment
+	runtime.mq.OscBundles = args.osc_bundles
+	if args.smoothing:
+		runtime.highlighter.SetSmoothing()
+	if args.prediction:
+		runtime.highlighter.SetPrediction(args.prediction)
+	if args.profile:
+		runtime.highlighter.EnableProfiling(1 / 60)
+	result = replay(runtime, frames, min(args.warmup, len(frames) - 1))
+	if args.profile:
+		runtime.highlighter.DumpProfile(args.profile)
+		runtime.highlighter.DisableProfiling()
+
+	frameMs = result['frame_ms']
+	print(f"{result['frames']} frames, {result['fps']:.0f} fps, frame time mean {frameMs['mean']:.2f} ms, "
+		f"p99 {frameMs['p99']:.2f} ms, max {frameMs['max']:.2f} ms")
+	for key, value in (result['messages_per_second'] or {}).items():
+		print(f"{key}: {value:.1f}/s")
+	print(f"{result['highlights']} highlights, {result['lamps_owned']} lamps owned")
+	if args.report:
+		with open(args.report, 'w') as f:
+			json.dump(result, f, indent=4)
+	return result
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,111 @@
+"""
+Parsing of the cue_table and of the raw highlights table.
+
+CueTable parses the cue_table DAT once into ints per cue, new Highlights read
+from there instead of looking up six cells by name each. cue_table_exec
+calls reload() whenever the table is edited. Rows with a blank or
+non-numeric cell are skipped with a warning, only Highlights of that cue
+fail (like a bad cell did before).
+
+The highlighter keeps what it reconciled against as trackId -> cueId, and
+only the difference to the table gets applied:
+	added, removed, changed = track_delta(previous, current)
+
+TrackTable turns the raw highlights table (or a CHOP / numpy block with the
+same channels) into one (N,4) float array of trackId, x, y, z per frame. The
+column indices are resolved once per header and the cells are converted by
+numpy in one go instead of per cell by name.
+"""
+
+import numpy as np
+
+from rigLog import get_logger
+
+log = get_logger('cues')
+
+CUE_COLUMNS = ('Activation', 'Color', 'Beam', 'Shutter', 'Amount', 'Priority')
+
+class CueTable(dict):
+	# cueId -> {'Activation': int, ..., 'Intensity': str}
+	def __init__(self, dat):
+		super().__init__()
+		self.dat = dat
+		self.reload()
+
+	def reload(self):
+		self.clear()
+		header = [cell.val for cell in self.dat.row(0)]
+		columns = {name: header.index(name) for name in CUE_COLUMNS + ('Intensity',) if name in header}
+		for rowId, row in enumerate(self.dat.rows()[1:], 1):
+			if not any(cell.val.strip() for cell in row):
+				continue
+			try:
+				cueId = int(row[0].val)
+				cue = {name: int(row[column].val) for name, column in columns.items() if name in CUE_COLUMNS}
+			except (ValueError, IndexError) as error:
+				log.warning('skipping cue_table row %s: %s', rowId, error)
+				continue
+			if 'Intensity' in columns:
+				cue['Intensity'] = row[columns['Intensity']].val
+			self[cueId] = cue
+
+TRACK_COLUMNS = ('Trackid', 'Positionx', 'Positiony', 'Positionz')
+
+class TrackTable:
+	def __init__(self, columns=TRACK_COLUMNS):
+		self.names = columns
+		self.header = None
+		self.columns = None
+		self.empty = np.zeros((0, len(columns)))
+
+	def resolve(self, header):
+		# column indices, only looked up again when the header changes
+		if header != self.header:
+			self.columns = [header.index(name) for name in self.names]
+			self.header = header
+		return self.columns
+
+	def parse(self, dat):
+		# whole table -> (N,4)
+		if dat.numRows < 2:
+			return self.empty
+		return self.parseText(dat.text, dat.numRows, dat.numCols)
+
+	def parseText(self, text, numRows, numCols):
+		# tab separated rows, the first one the header
+		cells = text.replace('\r', '').replace('\n', '\t').split('\t')[:numRows*numCols]
+		columns = self.resolve(tuple(cells[:numCols]))
+		body = cells[numCols:]
+		# every wanted column is a slice of the cells
+		values = [body[column::numCols] for column in columns]
+		try:
+			return np.array(values, dtype=np.float64).T
+		except ValueError:
+			# empty or broken cells, those rows are skipped
+			rows = [row for row in map(self.parseRow, zip(*values)) if row is not None]
+			return np.array(rows, dtype=np.float64).reshape(-1, len(columns))
+
+	def parseRow(self, row):
+		try:
+			return [float(value) for value in row]
+		except ValueError:
+			return None
+
+	def parseArray(self, values, names):
+		# (channels, samples) block, e.g. chop.numpyArray() with the channel names, one sample per track
+		columns = self.resolve(tuple(names))
+		return np.asarray(values, dtype=np.float64)[columns].T
+
+def track_delta(previous, current):
+	# previous, current: trackId -> cueId (0 = no highlight)
+	# returns added [(trackId, cueId)], removed [trackId], changed [(trackId, cueId)]
+	added = list()
+	changed = list()
+	for trackId, cueId in current.items():
+		previousCue = previous.get(trackId)
+		if previousCue is None:
+			added.append((trackId, cueId))
+		elif previousCue != cueId:
+			changed.append((trackId, cueId))
+	removed = [trackId for trackId in previous if trackId not in current]
+	return added, removed, changed
@@ -0,0 +1,194 @@
+"""
+Lamp allocation with indexed pools.
+
+	free		sorted list of idle lamp ids (bisect), for the spread out picks of mode 'equal'
+				(mode 'spatial' picks the idle lamps with the lowest lampAssignment cost)
+	owned		min-heap of (owner priority, acquisition order, lamp id), the lamp to preempt
+				is always the one with the lowest priority, the oldest of those first
+	pending		max-heap of requests that couldn't get all their lamps, served
+				whenever lamps get free
+	demands		the last request of every requester, until it cancels (releaseAllLamps).
+				a requester that loses lamps to a higher priority (preempt,
+				RequestLampById) waits in the pending queue again with it
+
+The pools follow every ownership change through Lamp.onOwnerChange, no matter
+if it came from here, from LampManagerExt.RequestLampById or from a LampUser
+releasing its lamps. Stale heap entries are skipped lazily, and a heap is
+rebuilt from its live entries once it holds more than twice as many (plus
+`slack`), so both stay bounded over a whole show.
+"""
+
+import heapq
+import math
+import random
+from bisect import bisect_left
+
+import numpy as np
+
+from lampAssignment import SpatialAssigner
+
+def lamp_aim(lamp):
+	# where the lamp points now, straight down when it's idle
+	if lamp.owner is None:
+		return (lamp.position[0], lamp.position[1], 0.)
+	return lamp.trackerPosition
+
+class LampAllocator:
+	def __init__(self, lamps, assigner=None, slack=16):
+		# lamps: lamp id -> Lamp
+		self.lamps = lamps
+		self.assigner = assigner or SpatialAssigner()
+		self.free = sorted(lampId for lampId, lamp in lamps.items() if lamp.owner is None)
+		self.owned = dict()		# lamp id -> (owner, acquisition order)
+		self.ownedHeap = list()
+		self.pendingHeap = list()
+		self.pending = dict()	# id(requester) -> request order of the valid heap entry
+		self.demands = dict()	# id(requester) -> (requester, amount, options, mode)
+		self.order = 0
+		self.slack = slack
+		for lampId, lamp in lamps.items():
+			if lamp.owner is not None:
+				self.ownerChanged(lamp, lamp.owner)
+
+	def nextOrder(self):
+		self.order += 1
+		return self.order
+
+	def ownerChanged(self, lamp, owner):
+		lampId = lamp.lampId
+		i = bisect_left(self.free, lampId)
+		isFree = i < len(self.free) and self.free[i] == lampId
+		if owner is None:
+			self.owned.pop(lampId, None)
+			if not isFree:
+				self.free.insert(i, lampId)
+			return
+		if isFree:
+			del self.free[i]
+		order = self.nextOrder()
+		self.owned[lampId] = (owner, order)
+		heapq.heappush(self.ownedHeap, (owner.priority, order, lampId))
+		if len(self.ownedHeap) > 2 * len(self.owned) + self.slack:
+			self.ownedHeap = [(owner.priority, order, lampId) for lampId, (owner, order) in self.owned.items()]
+			heapq.heapify(self.ownedHeap)
+
+	def request(self, requester, amount, options=None, mode='equal'):
+		# 1. idle lamps, 2. lamps with lower priority, 3. lamps with the same priority (older first)
+		# whatever is still missing waits in the pending queue
+		self.demands[id(requester)] = (requester, amount, options, mode)
+		missing = amount - len(requester)
+		if missing > 0:
+			missing -= self.takeFree(requester, amount, missing, options, mode)
+		if missing > 0:
+			missing -= self.preempt(requester, missing, options)
+		if missing > 0:
+			self.enqueue(requester, amount, options, mode)
+		else:
+			self.pending.pop(id(requester), None)
+		return amount - len(requester)
+
+	def freeAt(self, start, options):
+		# first idle lamp at or after option position start, wrapping around
+		if options is None:
+			if not self.free:
+				return None
+			i = bisect_left(self.free, start)
+			return self.free[i % len(self.free)]
+		for j in range(start, start + len(options)):
+			lampId = options[j % len(options)]
+			if self.lamps[lampId].owner is None:
+				return lampId
+		return None
+
+	def takeNearest(self, requester, missing, options):
+		candidates = [lampId for lampId in self.free if options is None or lampId in options]
+		if not candidates:
+			return 0
+		lamps = [self.lamps[lampId] for lampId in candidates]
+		costs = self.assigner.costs([lamp.position for lamp in lamps], [lamp_aim(lamp) for lamp in lamps], [requester.trackerPosition])[:, 0]
+		taken = 0
+		for i in np.argsort(costs)[:missing].tolist():
+			requester.append(lamps[i])
+			taken += 1
+		return taken
+
+	def takeFree(self, requester, amount, missing, options, mode):
+		if mode == 'spatial':
+			return self.takeNearest(requester, missing, options)
+		count = len(self.lamps) if options is None else len(options)
+		taken = 0
+		for i in range(missing):
+			if mode == 'equal':
+				start = (i*math.floor(count/amount)+13)%count
+			else:
+				start = random.randint(0, count - 1)
+			lampId = self.freeAt(start, options)
+			if lampId is None:
+				break
+			requester.append(self.lamps[lampId])
+			taken += 1
+		return taken
+
+	def preempt(self, requester, missing, options=None):
+		taken = 0
+		skipped = list()
+		while taken < missing and self.ownedHeap:
+			priority, order, lampId = self.ownedHeap[0]
+			owner, currentOrder = self.owned.get(lampId, (None, None))
+			if currentOrder != order:
+				heapq.heappop(self.ownedHeap)	# stale
+				continue
+			if priority > requester.priority:
+				break
+			heapq.heappop(self.ownedHeap)
+			if owner is requester or (options is not None and lampId not in options):
+				skipped.append((priority, order, lampId))
+				continue
+			owner.releaseLamp(lampId)
+			self.displaced(owner)
+			requester.append(self.lamps[lampId])
+			taken += 1
+		for entry in skipped:
+			heapq.heappush(self.ownedHeap, entry)
+		return taken
+
+	def enqueue(self, requester, amount, options, mode):
+		order = self.nextOrder()
+		self.pending[id(requester)] = order
+		heapq.heappush(self.pendingHeap, (-requester.priority, order, requester, amount, options, mode))
+		if len(self.pendingHeap) > 2 * len(self.pending) + self.slack:
+			# also drops the references to requests that were cancelled or replaced
+			self.pendingHeap = [entry for entry in self.pendingHeap if self.pending.get(id(entry[2])) == entry[1]]
+			heapq.heapify(self.pendingHeap)
+
+	def cancel(self, requester):
+		self.pending.pop(id(requester), None)
+		self.demands.pop(id(requester), None)
+
+	def displaced(self, owner):
+		# owner lost a lamp to a higher priority, it waits for a replacement unless it is already waiting
+		demand = self.demands.get(id(owner))
+		if demand is None or id(owner) in self.pending or len(owner) >= demand[1]:
+			return
+		self.enqueue(*demand)
+
+	def servePending(self):
+		# idle lamps to the waiting requests, highest priority and oldest request first
+		while self.pendingHeap and self.free:
+			negPriority, order, requester, amount, options, mode = self.pendingHeap[0]
+			if self.pending.get(id(requester)) != order:
+				heapq.heappop(self.pendingHeap)	# cancelled or replaced
+				continue
+			missing = amount - len(requester)
+			if missing > 0:
+				missing -= self.takeFree(requester, amount, missing, options, mode)
+			if missing > 0:
+				# no idle lamp left in its options
+				return
+			heapq.heappop(self.pendingHeap)
+			self.pending.pop(id(requester), None)
+
+	def clear(self):
+		self.pendingHeap.clear()
+		self.pending.clear()
+		self.demands.clear()
@@ -0,0 +1,124 @@
+"""
+Spatial lamp -> highlight assignment.
+
+Every lamp/highlight pair gets a cost
+	distance * throw weight				shorter throws are brighter and sharper
+	+ incidence angle * incidence weight	angle of the beam against straight down
+	+ travel angle * travel weight		how far the head has to pan/tilt from its current aim
+and all highlights are matched at once by a minimum cost assignment
+(Hungarian algorithm). A highlight that wants n lamps takes n columns.
+
+When the highlights want more lamps than there are, priority decides first:
+every priority tier gets an offset larger than any cost difference, so the
+lower tiers only get the lamps the higher ones don't want.
+
+Lamps keep their current highlight unless another assignment is better by
+more than `hysteresis` (cost units), so the matching doesn't flip back and
+forth between nearly equal solutions while performers move.
+
+Positions are (x, y, z) in m with z up, like Lamp.position and the tracker
+positions.
+"""
+
+import numpy as np
+
+def unit_vectors(vectors):
+	length = np.sqrt((vectors**2).sum(axis=-1, keepdims=True))
+	return vectors / np.where(length > 1e-12, length, 1.), length[..., 0]
+
+def cost_matrix(lampPositions, lampAims, targets, throwWeight=1., incidenceWeight=1., travelWeight=.5):
+	# (L,3), (L,3), (H,3) -> (L,H)
+	lampPositions = np.asarray(lampPositions, dtype=np.float64).reshape(-1, 3)
+	lampAims = np.asarray(lampAims, dtype=np.float64).reshape(-1, 3)
+	targets = np.asarray(targets, dtype=np.float64).reshape(-1, 3)
+	beams, distance = unit_vectors(targets[np.newaxis, :, :] - lampPositions[:, np.newaxis, :])
+	incidence = np.arccos(np.clip(-beams[..., 2], -1., 1.))
+	current, current_length = unit_vectors(lampAims - lampPositions)
+	travel = np.arccos(np.clip((beams * current[:, np.newaxis, :]).sum(axis=-1), -1., 1.))
+	return throwWeight * distance + incidenceWeight * incidence + travelWeight * travel
+
+def hungarian(cost):
+	# minimum cost assignment for an (n,m) matrix, returns (rows, cols) of the matched pairs.
+	# shortest augmenting paths with potentials, O(n^2 m)
+	cost = np.asarray(cost, dtype=np.float64)
+	transposed = cost.shape[0] > cost.shape[1]
+	if transposed:
+		cost = cost.T
+	n, m = cost.shape
+	u = np.zeros(n + 1)
+	v = np.zeros(m + 1)
+	match = np.zeros(m + 1, dtype=np.int64)	# column -> row (1-based, 0 = free)
+	way = np.zeros(m + 1, dtype=np.int64)
+	for row in range(1, n + 1):
+		match[0] = row
+		column = 0
+		minimum = np.full(m + 1, np.inf)
+		used = np.zeros(m + 1, dtype=bool)
+		while True:
+			used[column] = True
+			current = match[column]
+			# reduced costs of the free columns against the current row
+			reduced = cost[current - 1] - u[current] - v[1:]
+			free = ~used[1:]
+			better = free & (reduced < minimum[1:])
+			minimum[1:][better] = reduced[better]
+			way[1:][better] = column
+			candidates = np.where(free, minimum[1:], np.inf)
+			nextColumn = int(np.argmin(candidates)) + 1
+			delta = candidates[nextColumn - 1]
+			u[match[used]] += delta
+			v[used] -= delta
+			minimum[1:][free] -= delta
+			column = nextColumn
+			if match[column] == 0:
+				break
+		while column:
+			previous = way[column]
+			match[column] = match[previous]
+			column = previous
+	cols = np.flatnonzero(match[1:])
+	rows = match[1:][cols] - 1
+	order = np.argsort(rows)
+	rows, cols = rows[order], cols[order]
+	if transposed:
+		rows, cols = cols, rows
+		order = np.argsort(rows)
+		rows, cols = rows[order], cols[order]
+	return rows, cols
+
+class SpatialAssigner:
+	def __init__(self, throwWeight=1., incidenceWeight=1., travelWeight=.5, hysteresis=.5):
+		self.throwWeight = throwWeight
+		self.incidenceWeight = incidenceWeight
+		self.travelWeight = travelWeight
+		self.hysteresis = hysteresis
+
+	def costs(self, lampPositions, lampAims, targets):
+		return cost_matrix(lampPositions, lampAims, targets, self.throwWeight, self.incidenceWeight, self.travelWeight)
+
+	def assign(self, lampPositions, lampAims, targets, amounts, current=None, priorities=None):
+		"""
+		lampPositions, lampAims	(L,3) available lamps and where they point now
+		targets, amounts		(H,3) highlight positions, lamps wanted per highlight
+		current					(L,) highlight index every lamp has now, -1 for none
+		priorities				(H,) higher gets lamps first, None for all the same
+		returns (L,) highlight index per lamp, -1 for unassigned lamps
+		"""
+		amounts = np.asarray(amounts, dtype=np.int64)
+		lamps = len(np.asarray(lampPositions).reshape(-1, 3))
+		assignment = np.full(lamps, -1, dtype=np.int64)
+		if not lamps or not amounts.sum():
+			return assignment
+		costs = self.costs(lampPositions, lampAims, targets)
+		# one column per wanted lamp
+		columns = np.repeat(np.arange(len(amounts)), amounts)
+		expanded = costs[:, columns]
+		if current is not None:
+			current = np.asarray(current, dtype=np.int64)
+			expanded = expanded - self.hysteresis * (columns[np.newaxis, :] == current[:, np.newaxis])
+		if priorities is not None:
+			tiers = np.unique(np.asarray(priorities), return_inverse=True)[1].reshape(-1)
+			expanded = expanded - (np.ptp(expanded) + 1.) * tiers[columns][np.newaxis, :]
+		rows, cols = hungarian(expanded)
+		assignment[rows] = columns[cols]
+		return assignment
@@ -5,6 +5,8 @@
 # 
 # Make sure the corresponding toggle is enabled in the Execute DAT.
 
+from profiler import PROFILER
+
 def onStart():
 	return
 
@@ -15,10 +17,15 @@ def onExit():
 	return
 
 def onFrameStart(frame):
+	PROFILER.frameStart()
+	# all dmxin universes every frame, a change in any of them reaches the subscribers
+	op.DMX.ext.DMXManagerExt.ingestChops(absTime.frame)
 	me.parent().SendTracker()
 	return
 
 def onFrameEnd(frame):
+	me.parent().Flush()
+	PROFILER.frameEnd()
 	return
 
 def onPlayStateChange(state):
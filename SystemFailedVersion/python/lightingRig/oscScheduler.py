@@ -0,0 +1,174 @@
+"""
+OSC output scheduler.
+
+Messages are queued per address during a frame, a later message for the same
+address replaces the earlier one (last value wins). flush() packs everything
+that is due into OSC bundles (split to stay below maxPacketSize) and returns
+them as ready to send bytes, with python floats as 32 bit 'f'.
+flushMessages() returns the due (address, arguments) instead, for a sender
+that encodes every message itself (like the OSC Out DAT's sendOSC).
+
+Rate limits are set per address prefix:
+	scheduler.limit('/exec/15/', 1/20)				# at most 20 messages/s per zoom exec
+	scheduler.limit('/exec/13/', 0.1, policy='drop')
+With policy 'defer' a limited message stays queued (and can still be replaced)
+until the address may send again, with 'drop' it's discarded.
+
+counters: queued, coalesced (replaced before sending), deferred (held back at
+a flush), dropped, sent (messages), bundles (packets).
+"""
+
+import struct
+
+BUNDLE_HEADER = b'#bundle\x00' + struct.pack('>Q', 1)	# timetag 1 = immediately
+
+def pad(data):
+	# OSC strings/blobs are padded with zeros to a multiple of 4 bytes
+	return data + b'\x00' * (4 - len(data) % 4)
+
+def encode_arguments(arguments):
+	tags = ','
+	data = b''
+	for argument in arguments:
+		if isinstance(argument, bool):
+			tags += 'T' if argument else 'F'
+		elif isinstance(argument, int):
+			tags += 'i'
+			data += struct.pack('>i', argument)
+		elif isinstance(argument, float):
+			tags += 'f'
+			data += struct.pack('>f', argument)
+		elif isinstance(argument, bytes):
+			tags += 'b'
+			data += struct.pack('>i', len(argument)) + pad(argument) if len(argument) % 4 else struct.pack('>i', len(argument)) + argument
+		else:
+			tags += 's'
+			data += pad(str(argument).encode('utf-8'))
+	return pad(tags.encode('ascii')) + data
+
+def encode_message(address, arguments):
+	return pad(address.encode('utf-8')) + encode_arguments(arguments)
+
+def encode_bundle(messages):
+	# one bundle of already encoded messages
+	return BUNDLE_HEADER + b''.join(struct.pack('>i', len(message)) + message for message in messages)
+
+def parse_message(packet):
+	# (address, arguments) of a single OSC message, the types encode_arguments writes plus h and d
+	end = packet.index(b'\x00')
+	address = packet[:end].decode('utf-8')
+	offset = (end // 4 + 1) * 4
+	end = packet.index(b'\x00', offset)
+	tags = packet[offset + 1:end].decode('ascii')
+	offset = (end // 4 + 1) * 4
+	arguments = list()
+	for tag in tags:
+		if tag in 'if':
+			arguments.append(struct.unpack_from('>' + tag, packet, offset)[0])
+			offset += 4
+		elif tag in 'hd':
+			arguments.append(struct.unpack_from('>' + ('q' if tag == 'h' else 'd'), packet, offset)[0])
+			offset += 8
+		elif tag in 'TF':
+			arguments.append(tag == 'T')
+		elif tag == 's':
+			end = packet.index(b'\x00', offset)
+			arguments.append(packet[offset:end].decode('utf-8'))
+			offset = (end // 4 + 1) * 4
+		elif tag == 'b':
+			size = struct.unpack_from('>i', packet, offset)[0]
+			arguments.append(packet[offset + 4:offset + 4 + size])
+			offset += 4 + ((size + 3) // 4) * 4
+	return address, arguments
+
+def parse_bundle(packet):
+	# list of (address, arguments) of a bundle (or a single message)
+	if not packet.startswith(b'#bundle\x00'):
+		return [parse_message(packet)]
+	messages = list()
+	offset = 16
+	while offset < len(packet):
+		size = struct.unpack_from('>i', packet, offset)[0]
+		messages.extend(parse_bundle(packet[offset + 4:offset + 4 + size]))
+		offset += 4 + size
+	return messages
+
+class OSCScheduler:
+	def __init__(self, maxPacketSize=1400):
+		self.maxPacketSize = maxPacketSize
+		self.pending = dict()		# address -> arguments
+		self.lastSent = dict()		# address -> time
+		self.limits = list()		# (prefix, interval, policy), longest prefix first
+		self.addressLimits = dict()	# address -> (interval, policy), resolved once per address
+		self.encodedAddresses = dict()
+		self.counters = dict(queued=0, coalesced=0, deferred=0, dropped=0, sent=0, bundles=0)
+
+	def limit(self, prefix, interval, policy='defer'):
+		self.limits.append((prefix, interval, policy))
+		self.limits.sort(key=lambda limit: len(limit[0]), reverse=True)
+		self.addressLimits.clear()
+
+	def addressLimit(self, address):
+		if address not in self.addressLimits:
+			self.addressLimits[address] = next(((interval, policy) for prefix, interval, policy in self.limits if address.startswith(prefix)), None)
+		return self.addressLimits[address]
+
+	def queue(self, address, arguments):
+		self.counters['queued'] += 1
+		if address in self.pending:
+			self.counters['coalesced'] += 1
+		self.pending[address] = arguments
+
+	def encode(self, address, arguments):
+		encoded = self.encodedAddresses.get(address)
+		if encoded is None:
+			encoded = self.encodedAddresses[address] = pad(address.encode('utf-8'))
+		return encoded + encode_arguments(arguments)
+
+	def due(self, now):
+		# (address, arguments) that may be sent now, the others stay pending or get dropped
+		due = list()
+		for address, arguments in list(self.pending.items()):
+			limit = self.addressLimit(address)
+			if limit is not None and now - self.lastSent.get(address, -float('inf')) < limit[0]:
+				if limit[1] == 'drop':
+					del self.pending[address]
+					self.counters['dropped'] += 1
+				else:
+					self.counters['deferred'] += 1
+				continue
+			del self.pending[address]
+			self.lastSent[address] = now
+			due.append((address, arguments))
+		return due
+
+	def flushMessages(self, now):
+		# (address, arguments) to send for this frame, one message each
+		due = self.due(now)
+		self.counters['sent'] += len(due)
+		return due
+
+	def flush(self, now):
+		# bundles (bytes) to send for this frame
+		packets = list()
+		elements = list()
+		size = len(BUNDLE_HEADER)
+		for address, arguments in self.due(now):
+			message = self.encode(address, arguments)
+			if elements and size + 4 + len(message) > self.maxPacketSize:
+				packets.append(b''.join(elements))
+				elements = list()
+				size = len(BUNDLE_HEADER)
+			if not elements:
+				elements.append(BUNDLE_HEADER)
+			elements.append(struct.pack('>i', len(message)) + message)
+			size += 4 + len(message)
+			self.counters['sent'] += 1
+		if elements:
+			packets.append(b''.join(elements))
+		self.counters['bundles'] += len(packets)
+		return packets
+
+	def clear(self):
+		self.counters['dropped'] += len(self.pending)
+		self.pending.clear()
@@ -0,0 +1,104 @@
+"""
+Replay benchmark for the track prediction.
+
+Replays a recording (trackingReplay JSON lines, or synthesized walkers) as if
+the lights showed every frame `latency` seconds after it was measured, and
+measures the aim error against where the performer really is by then:
+without prediction, and with each predictor mode.
+
+	python predictionBenchmark.py walk.jsonl --latency 0.12 --noise 0.02
+	python predictionBenchmark.py --synth 100 --report prediction.json
+
+--noise adds gaussian measurement noise (m) to the replayed positions, the
+error is always measured against the clean recording.
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+import trackingReplay
+from trackPredictor import MODES, TrackPredictor
+
+def frame_arrays(frames):
+	# [(t, (N,4) array)]
+	return [(frame['t'], np.asarray(frame['tracks'], dtype=np.float64).reshape(-1, 4)) for frame in frames]
+
+def truth_at(frames, times, t):
+	# trackId -> position at time t, linear between the recorded frames
+	j = int(np.searchsorted(times, t))
+	if j <= 0 or j >= len(frames):
+		return None
+	(t0, a), (t1, b) = frames[j - 1], frames[j]
+	w = (t - t0) / (t1 - t0) if t1 > t0 else 1.
+	before = {int(row[0]): row[1:] for row in a}
+	return {int(row[0]): (1 - w) * before[int(row[0])] + w * row[1:] for row in b if int(row[0]) in before}
+
+def evaluate(frames, mode, latency, noise=0., seed=0, **options):
+	generator = np.random.default_rng(seed)
+	predictor = TrackPredictor(latency, mode, **options)
+	times = np.array([t for t, tracks in frames])
+	errors = list()
+	seconds = 0.
+	for t, tracks in frames:
+		measured = tracks.copy()
+		if noise:
+			measured[:, 1:3] += generator.normal(0., noise, (len(tracks), 2))
+		start = time.perf_counter()
+		predicted = predictor.update(measured, t)
+		seconds += time.perf_counter() - start
+		truth = truth_at(frames, times, t + latency)
+		if truth is None:
+			continue
+		for row in predicted:
+			target = truth.get(int(row[0]))
+			if target is not None:
+				# on the floor plane, where the spot lands
+				errors.append(float(np.hypot(*(row[1:3] - target[:2]))))
+	errors = np.array(errors)
+	return {
+		'mode': mode,
+		'samples': len(errors),
+		'mean': float(errors.mean()) if len(errors) else None,
+		'p95': float(np.percentile(errors, 95)) if len(errors) else None,
+		'max': float(errors.max()) if len(errors) else None,
+		'update_us': seconds / len(frames) * 1e6 if frames else 0.,
+	}
+
+def run(frames, latency, noise=0., modes=MODES):
+	frames = frame_arrays(frames)
+	return {
+		'frames': len(frames),
+		'latency': latency,
+		'noise': noise,
+		'results': [evaluate(frames, mode, latency, noise) for mode in modes],
+	}
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description="Aim error of the track prediction against recorded tracks.")
+	parser.add_argument('file', nargs='?', help="trackingReplay json lines recording")
+	parser.add_argument('--synth', type=int, default=0, help="synthesize this many walkers instead of a recording")
+	parser.add_argument('--seconds', type=float, default=30., help="synth duration")
+	parser.add_argument('--latency', type=float, default=.1, help="tracking to light latency in s")
+	parser.add_argument('--noise', type=float, default=0., help="measurement noise in m")
+	parser.add_argument('--report', help="write the results as json to this file")
+	args = parser.parse_args(args)
+
+	if args.file:
+		frames = trackingReplay.read_frames(args.file)
+	else:
+		frames = trackingReplay.synthesize(args.synth or 20, args.seconds)
+	report = run(frames, args.latency, args.noise)
+	print(f"{report['frames']} frames, latency {args.latency*1e3:.0f} ms, noise {args.noise*1e2:.1f} cm")
+	for result in report['results']:
+		print(f"{result['mode']:>8}: mean {result['mean']*1e2:.1f} cm, p95 {result['p95']*1e2:.1f} cm, "
+			f"max {result['max']*1e2:.1f} cm, {result['update_us']:.0f} us/frame")
+	if args.report:
+		with open(args.report, 'w') as f:
+			json.dump(report, f, indent=4)
+	return report
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,195 @@
+"""
+Pipeline profiler.
+
+Nothing is instrumented until enable(): it swaps timing wrappers in for the
+functions, methods and property setters registered with watch(), disable()
+puts the originals back, so a disabled profiler costs nothing on those paths.
+
+	PROFILER.watch(HighlighterExt, 'ReIndexHighlightsFromDat')
+	PROFILER.watch(Lamp, 'trackerPosition')		# property: the setter is timed
+	PROFILER.enable(budget=1/60)
+	...
+	PROFILER.dump('profile.json')
+
+Per stage: call count, total and max time, the last `history` durations in a
+ring buffer and a histogram with logarithmic buckets (1 us ... ~1 s). Times are
+inclusive, a stage called from another stage counts in both.
+
+Code that can't be patched (DAT callbacks) marks itself with begin()/end(),
+which is a single attribute check while disabled.
+
+frameStart()/frameEnd() add a 'frame' stage. For every frame over budget the
+time each stage took in that frame is kept (the last `overruns` of them), so
+the stage that blows the budget shows up in the dump.
+"""
+
+import functools
+import inspect
+import json
+import time
+from bisect import bisect_right
+from collections import deque
+
+BUCKETS = [1e-6 * 2**i for i in range(21)]	# upper bounds in s, the last bucket takes everything above
+
+class Stage:
+	def __init__(self, name, history):
+		self.name = name
+		self.count = 0
+		self.total = 0.
+		self.max = 0.
+		self.durations = [0.] * history	# ring buffer
+		self.index = 0
+		self.histogram = [0] * (len(BUCKETS) + 1)
+
+	def add(self, duration):
+		self.count += 1
+		self.total += duration
+		if duration > self.max:
+			self.max = duration
+		self.durations[self.index] = duration
+		self.index = (self.index + 1) % len(self.durations)
+		self.histogram[bisect_right(BUCKETS, duration)] += 1
+
+	def recent(self):
+		# the buffered durations, oldest first
+		if self.count < len(self.durations):
+			return self.durations[:self.count]
+		return self.durations[self.index:] + self.durations[:self.index]
+
+	def summary(self):
+		recent = sorted(self.recent())
+		def percentile(p):
+			return recent[min(int(p * len(recent)), len(recent) - 1)] if recent else 0.
+		return {
+			'count': self.count,
+			'total': self.total,
+			'mean': self.total / self.count if self.count else 0.,
+			'max': self.max,
+			'p50': percentile(.5),
+			'p99': percentile(.99),
+			'histogram': {f'{bound * 1e6:g}us': count for bound, count in zip(BUCKETS + [float('inf')], self.histogram) if count},
+		}
+
+class Profiler:
+	def __init__(self, history=600, overruns=32):
+		self.enabled = False
+		self.history = history
+		self.budget = None
+		self.clock = time.perf_counter
+		self.stages = dict()
+		self.watched = list()	# (owner, name, stage name)
+		self.patched = list()	# (owner, name, original, owned), to restore on disable
+		self.frames = 0
+		self.frameStarted = None
+		self.frameStages = dict()	# stage name -> time in the current frame
+		self.overruns = deque(maxlen=overruns)
+
+	def stage(self, name):
+		if name not in self.stages:
+			self.stages[name] = Stage(name, self.history)
+		return self.stages[name]
+
+	def record(self, name, duration):
+		self.stage(name).add(duration)
+		if self.frameStarted is not None:
+			self.frameStages[name] = self.frameStages.get(name, 0.) + duration
+
+	def watch(self, owner, name, stage=None):
+		# owner: a class or a module, name: function, method or property (timing its setter)
+		stage = stage or f"{getattr(owner, '__name__', type(owner).__name__)}.{name}"
+		self.watched.append((owner, name, stage))
+		if self.enabled:
+			self.patch(owner, name, stage)
+
+	def timed(self, function, stage):
+		record = self.record
+		clock = self.clock
+		@functools.wraps(function)
+		def wrapper(*args, **kwargs):
+			start = clock()
+			try:
+				return function(*args, **kwargs)
+			finally:
+				record(stage, clock() - start)
+		return wrapper
+
+	def patch(self, owner, name, stage):
+		original = inspect.getattr_static(owner, name)
+		if isinstance(original, property):
+			if original.fset is None:
+				raise AttributeError(f'{stage} is a read only property')
+			wrapped = property(original.fget, self.timed(original.fset, stage), original.fdel, original.__doc__)
+		elif isinstance(original, (staticmethod, classmethod)):
+			wrapped = type(original)(self.timed(original.__func__, stage))
+		else:
+			wrapped = self.timed(original, stage)
+		owned = name in vars(owner)
+		setattr(owner, name, wrapped)
+		self.patched.append((owner, name, original, owned))
+
+	def enable(self, budget=None):
+		self.budget = budget
+		if self.enabled:
+			return
+		for owner, name, stage in self.watched:
+			self.patch(owner, name, stage)
+		self.enabled = True
+
+	def disable(self):
+		for owner, name, original, owned in reversed(self.patched):
+			if owned:
+				setattr(owner, name, original)
+			else:
+				# inherited, the base class attribute shows through again
+				delattr(owner, name)
+		self.patched.clear()
+		self.enabled = False
+		self.frameStarted = None
+
+	def begin(self):
+		return self.clock() if self.enabled else None
+
+	def end(self, name, start):
+		if start is not None:
+			self.record(name, self.clock() - start)
+
+	def frameStart(self):
+		if self.enabled:
+			self.frameStages.clear()
+			self.frameStarted = self.clock()
+
+	def frameEnd(self):
+		if self.frameStarted is None:
+			return
+		duration = self.clock() - self.frameStarted
+		self.frameStarted = None
+		self.frames += 1
+		self.record('frame', duration)
+		if self.budget and duration > self.budget:
+			stages = sorted(self.frameStages.items(), key=lambda item: item[1], reverse=True)
+			self.overruns.append({'frame': self.frames, 'duration': duration, 'stages': dict(stages)})
+
+	def reset(self):
+		self.stages.clear()
+		self.overruns.clear()
+		self.frames = 0
+
+	def report(self):
+		return {
+			'enabled': self.enabled,
+			'budget': self.budget,
+			'frames': self.frames,
+			'stages': {name: stage.summary() for name, stage in sorted(self.stages.items())},
+			'overruns': list(self.overruns),
+		}
+
+	def dump(self, path=None):
+		text = json.dumps(self.report(), indent=1)
+		if path is not None:
+			with open(path, 'w') as file:
+				file.write(text)
+		return text
+
+# one profiler for all DATs that import this module
+PROFILER = Profiler()
@@ -28,15 +28,23 @@
 # whenever the position values for an ID change, we have to change the position for the respective trackers
 # -> op('lamps').UpdatePosition(position):
 
+from highlightTable import TrackTable
+from profiler import PROFILER
+from rigLog import get_logger
+
+log = get_logger('highlighter')
+
+# column indices resolved once, see highlightTable.TrackTable
+tracks = TrackTable()
 
 def onTableChange(dat):
 	# this will be called max once each frame and should send all the positions to the highlighterExt
 	#debug('tableChange')
-	for rowId in range(1,dat.numRows):
-		trackId = int(dat[rowId,'Trackid'])
-		position = (float(dat[rowId, 'Positionx']), float(dat[rowId, 'Positiony']), float(dat[rowId, 'Positionz']))
-		#debug(trackId, position)
-		op.highlighter.UpdatePosition(trackId, position)
+	start = PROFILER.begin()
+	# with a TrackingReceiver the positions come from the network, the table only provides the cues
+	if op.highlighter.TrackingReceiver is None:
+		op.highlighter.UpdatePositions(tracks.parse(dat))
+	PROFILER.end('onTableChange', start)
 	return
 
 def onRowChange(dat, rows):
@@ -48,16 +56,17 @@ def onColChange(dat, cols):
 	return
 
 def onCellChange(dat, cells, prev):
-	reIndex = False
+	# only the rows with a changed Trackid or Highlightcue get reconciled
+	rows = list()
 	for cell in cells:
-		if cell.col in [0,16]:
-			reIndex = True
-			debug('onCellChange', cell)	
-	if reIndex: op.highlighter.ReIndexHighlightsFromDat(dat)
+		if cell.col in [0,16] and cell.row not in rows:
+			rows.append(cell.row)
+			log.debug('onCellChange %s', cell)
+	if rows: op.highlighter.ReconcileRowsFromDat(dat, rows)
 	return
 
 def onSizeChange(dat):
-	debug('sizeChange')	
+	log.debug('sizeChange')
 	op.highlighter.ReIndexHighlightsFromDat(dat)
 	return
 
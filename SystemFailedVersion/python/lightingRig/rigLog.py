@@ -0,0 +1,105 @@
+"""
+Logging for the lighting rig, on top of the standard logging module.
+
+Every subsystem has its own logger below 'lightingRig' with its own level:
+	log = get_logger('mq')
+	log.debug('%s %s', address, value)		# formatted only if someone reads the record
+	set_level('mq', 'DEBUG')
+
+A filtered out call is a cached level check, no string gets built. Kept records
+go to a bounded ring buffer (the last `capacity` records, formatted when read
+with recent()) and, after start_file(), through a queue to a writer thread
+that formats and writes them to disk off the cook thread. The textport only
+gets WARNING and up.
+
+Subsystems: mq, mq.tracker, highlight, highlighter, lamps, dmx.
+"""
+
+import logging
+import logging.handlers
+import queue
+import sys
+from collections import deque
+
+ROOT = 'lightingRig'
+FORMAT = '%(relativeCreated)10.1f %(levelname)-7s %(name)s: %(message)s'
+
+class RingHandler(logging.Handler):
+	# keeps the last records as they are, formatting happens in recent()
+	def __init__(self, capacity=2000):
+		super().__init__()
+		self.records = deque(maxlen=capacity)
+
+	def emit(self, record):
+		self.records.append(record)
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+	# the stock QueueHandler formats in the calling thread, the writer thread does it here.
+	# the rig logs numbers, strings and tuples, so the arguments can't change on the way
+	def prepare(self, record):
+		return record
+
+root = logging.getLogger(ROOT)
+root.setLevel(logging.INFO)
+root.propagate = False
+# the module gets compiled again whenever the DAT changes, don't stack handlers
+for handler in list(root.handlers):
+	root.removeHandler(handler)
+ring = RingHandler()
+root.addHandler(ring)
+console = logging.StreamHandler(sys.stdout)
+console.setLevel(logging.WARNING)
+console.setFormatter(logging.Formatter(FORMAT))
+root.addHandler(console)
+fileQueue = None
+fileHandler = None
+listener = None
+
+def get_logger(subsystem):
+	return logging.getLogger(f'{ROOT}.{subsystem}')
+
+def set_level(subsystem, level):
+	# level as name ('DEBUG') or number, subsystem None for all of them
+	logger = root if subsystem is None else get_logger(subsystem)
+	logger.setLevel(level.upper() if isinstance(level, str) else level)
+
+def levels():
+	loggers = [root] + [logger for name, logger in logging.root.manager.loggerDict.items()
+		if name.startswith(ROOT + '.') and isinstance(logger, logging.Logger)]
+	return {logger.name: logging.getLevelName(logger.getEffectiveLevel()) for logger in loggers}
+
+def recent(count=None, subsystem=None):
+	# formatted lines of the ring buffer, oldest first
+	formatter = logging.Formatter(FORMAT)
+	name = None if subsystem is None else f'{ROOT}.{subsystem}'
+	records = [record for record in ring.records if name is None or record.name == name or record.name.startswith(name + '.')]
+	if count is not None:
+		records = records[-count:]
+	return [formatter.format(record) for record in records]
+
+def set_capacity(capacity):
+	ring.records = deque(ring.records, maxlen=capacity)
+
+def start_file(path, level=logging.DEBUG):
+	global fileQueue, fileHandler, listener
+	stop_file()
+	fileQueue = queue.SimpleQueue()
+	fileHandler = logging.FileHandler(path, encoding='utf-8')
+	fileHandler.setFormatter(logging.Formatter(FORMAT))
+	listener = logging.handlers.QueueListener(fileQueue, fileHandler)
+	queueHandler = DeferredQueueHandler(fileQueue)
+	queueHandler.setLevel(level)
+	root.addHandler(queueHandler)
+	listener.start()
+
+def stop_file():
+	# flushes what's still queued and closes the file
+	global fileQueue, fileHandler, listener
+	if listener is None:
+		return
+	for handler in list(root.handlers):
+		if isinstance(handler, DeferredQueueHandler):
+			root.removeHandler(handler)
+	listener.stop()
+	fileHandler.close()
+	fileQueue = fileHandler = listener = None
@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import headless
+
+@pytest.fixture
+def runtime():
+	# the rig extensions on the headless stand-ins (see headless.py)
+	return headless.Runtime()
@@ -0,0 +1,10 @@
+import headless
+
+def test_change_in_second_universe_alone_is_ingested(runtime):
+	frames = headless.synthesize_show(3, 1.)
+	for frame in frames[:5]:
+		runtime.step(frame)
+	received = list()
+	runtime.dmx.subscribeChannel((2, 7), lambda channel, value: received.append(value))
+	runtime.step(dict(frames[5], dmx={'2': {'7': 99}}))
+	assert received[-1] == 99
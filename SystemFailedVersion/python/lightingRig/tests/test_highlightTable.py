@@ -0,0 +1,18 @@
+import headless
+from headless import CUE_HEADER, DEFAULT_CUES
+
+def test_bad_cue_row_is_skipped():
+	cues = DEFAULT_CUES + [[4, 1, '', 1, 1, 1, 1, '1.0'], [5, 1, 'red', 1, 1, 1, 1, '1.0']]
+	runtime = headless.Runtime(cues=cues)
+	import highlight
+	assert sorted(highlight.Highlight.cues) == [1, 2, 3]
+
+def test_cue_table_edit_reaches_new_highlights(runtime):
+	import highlight
+	runtime.cueTable.data = [[str(value) for value in row] for row in [CUE_HEADER] + DEFAULT_CUES + [[4, 1, 2, 1, 1, 5, 3, '0.5']]]
+	runtime.cueTableExec.onTableChange(runtime.cueTable)
+	assert highlight.Highlight.cues[4]['Amount'] == 5
+	assert runtime.highlighter.cueAttributes[4]['intensity'] == '0.5'
+	frames = headless.synthesize_show(1, 1.)
+	runtime.step(dict(frames[0], cues={'1': 4}))
+	assert runtime.highlighter[1].maxSize == 5
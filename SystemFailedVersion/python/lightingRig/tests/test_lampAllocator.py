@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+import headless
+from headless import RESERVATION_CHANNEL
+from lampAllocator import LampAllocator
+
+def lamps_of(runtime):
+	return {trackId: sorted(lamp.lampId for lamp in highlight) for trackId, highlight in runtime.highlighter.items()}
+
+def run(runtime, frames, dmx=None):
+	if dmx is not None:
+		frames[0] = dict(frames[0], dmx={'1': dmx})
+	for frame in frames:
+		runtime.step(frame)
+
+def reservation(value):
+	return {str(RESERVATION_CHANNEL + lampId): value for lampId in range(16)}
+
+def test_lamps_come_back_after_magicq_reservation(runtime):
+	frames = headless.synthesize_show(3, 3.)
+	run(runtime, frames[:10])
+	before = lamps_of(runtime)
+	assert all(before.values())
+	# MagicQ takes all lamps
+	run(runtime, frames[10:20], reservation(0))
+	assert not any(lamps_of(runtime).values())
+	# and gives them back, the highlights want theirs again
+	run(runtime, frames[20:30], reservation(255))
+	assert {trackId: len(lamps) for trackId, lamps in lamps_of(runtime).items()} == {trackId: len(lamps) for trackId, lamps in before.items()}
+
+def test_preempted_highlight_gets_a_lamp_back(runtime):
+	frames = headless.synthesize_show(3, 3.)
+	run(runtime, frames[:10])
+	highlight = next(highlight for highlight in runtime.highlighter.values() if len(highlight))
+	amount = len(highlight)
+	lampId = highlight[0].lampId
+	# MagicQ takes one lamp of the highlight, the highlight gets an idle one instead
+	run(runtime, frames[10:12], {str(RESERVATION_CHANNEL + lampId): 0})
+	assert len(highlight) == amount
+	assert lampId not in [lamp.lampId for lamp in highlight]
+
+class Requester(list):
+	def __init__(self, priority):
+		super().__init__()
+		self.priority = priority
+
+def test_heaps_stay_bounded_over_reassignments():
+	lamps = {lampId: SimpleNamespace(lampId=lampId, owner=None, position=(lampId, 0., 5.)) for lampId in range(8)}
+	allocator = LampAllocator(lamps)
+	requesters = [Requester(priority) for priority in (1, 1, 2)]
+	for i in range(2000):
+		lamp = lamps[i % 8]
+		lamp.owner = requesters[i % 3]
+		allocator.ownerChanged(lamp, lamp.owner)
+		# a request waiting again replaces its older queue entry
+		allocator.enqueue(requesters[i % 3], 4, None, 'equal')
+	assert len(allocator.ownedHeap) <= 2 * len(lamps) + allocator.slack + 1
+	assert len(allocator.pendingHeap) <= 2 * len(requesters) + allocator.slack + 1
@@ -0,0 +1,24 @@
+import numpy as np
+
+from lampAssignment import SpatialAssigner
+
+# a row of 4 lamps over x = 0...3, 5 m high, aiming straight down
+LAMPS = [(x, 0., 5.) for x in range(4)]
+AIMS = [(x, 0., 0.) for x in range(4)]
+
+def test_priority_wins_over_distance_when_lamps_run_out():
+	# the low priority highlight stands right under the lamps, the high priority one far off
+	targets = [(1.5, 0., 0.), (30., 20., 0.)]
+	assignment = SpatialAssigner().assign(LAMPS, AIMS, targets, [4, 3], priorities=[1, 2])
+	assert (assignment == 1).sum() == 3
+	assert (assignment == 0).sum() == 1
+
+def test_distance_decides_without_priorities():
+	targets = [(1.5, 0., 0.), (30., 20., 0.)]
+	assignment = SpatialAssigner().assign(LAMPS, AIMS, targets, [4, 3])
+	assert (assignment == 0).sum() == 4
+
+def test_priority_tiers_in_order():
+	targets = [(0., 0., 0.), (10., 0., 0.), (20., 0., 0.)]
+	assignment = SpatialAssigner().assign(LAMPS, AIMS, targets, [2, 2, 2], priorities=[1, 3, 2])
+	assert np.bincount(assignment[assignment >= 0], minlength=3).tolist() == [0, 2, 2]
@@ -0,0 +1,74 @@
+from dmxSender import LoopbackReceiver
+
+def par_layout(pars):
+	# dmxOut value<n> is dmx channel n + 1, data[n] on the wire
+	data = bytearray(512)
+	for name, value in pars.items():
+		data[int(name[len('value'):])] = int(round(value))
+	return data
+
+def last_frame(receiver, sender):
+	sender.send(force=True)
+	received = None
+	while receiver.receive():
+		received = receiver.universes[0]
+	return received
+
+def test_artnet_frame_matches_dmxout_pars(runtime):
+	mq = runtime.mq
+	mq.SetZoom(0, 1.)
+	mq.SetZoom(1, .5)
+	mq.SetColor(0, (1., .5, 0., 0.))
+	mq.SetColor(15, (0., 0., 0., 1.))
+	mq.Flush()
+	expected = par_layout(runtime.dmxOut.par)
+	receiver = LoopbackReceiver('artnet')
+	try:
+		# starts with what the pars hold
+		mq.StartDmxSender('artnet', loopback=True)
+		assert last_frame(receiver, mq.dmxSender) == expected
+		# then gets the output instead of the pars
+		mq.SetZoom(3, .2)
+		mq.Flush()
+		expected[3] = 51
+		assert last_frame(receiver, mq.dmxSender) == expected
+	finally:
+		mq.StopDmxSender()
+		receiver.close()
+
+def test_tracker_one_datagram_per_changed_tracker(runtime):
+	mq = runtime.mq
+	sent = list()
+	runtime.trackerSender.send = sent.append
+	mq.SetTracker(0, 1, (1., 2., 0.))
+	mq.SetTracker(1, 2, (3., 4., 0.))
+	mq.SendTracker()
+	assert len(sent) == 16			# first frame: every tracker once
+	assert all('\n' not in message for message in sent)
+	sent.clear()
+	mq.SetTracker(1, 2, (3.5, 4., 0.))
+	mq.SendTracker()
+	assert sent == ['3.50,0.00,-4.00,1,Tracker:2']
+
+def test_artnet_activation_without_mapping_is_skipped(runtime):
+	mq = runtime.mq
+	mq.Flush()
+	mq.SetActivationViaArtnet(66, 1., 3)
+	mq.SetActivationViaArtnet(1, 1., 3)
+	assert mq.pendingDmx == {4: 255.}
+
+def test_osc_one_message_per_send_unless_bundles(runtime):
+	mq = runtime.mq
+	sent = list()
+	runtime.oscOut.sendOSC = lambda address, values, **options: sent.append((address, values, options))
+	runtime.oscOut.sendBytes = sent.append
+	mq.SetActivation(1, .5, 0)
+	mq.ChooseSoftPalette('color', 2, 0)
+	mq.Flush()
+	assert sent == [('/exec/13/1', [.5], {'useNonStandardTypes': True}), ('/exec/14/2', [100], {'useNonStandardTypes': True})]
+	sent.clear()
+	mq.OscBundles = True
+	mq.SetActivation(1, 1., 0)
+	mq.ChooseSoftPalette('color', 2, 0)
+	mq.Flush()
+	assert len(sent) == 1 and sent[0].startswith(b'#bundle')
@@ -0,0 +1,77 @@
+"""
+Jitter filter for the tracked positions.
+
+One-Euro filter (Casiez et al.) over all tracks at once: a low pass whose
+cutoff rises with the speed of the track, so standing performers are smoothed
+hard and walking ones follow without lag.
+	smoother = OneEuroFilter(minCutoff=1., beta=.7)
+	filtered = smoother.update(tracks, now)		# (N,4) trackId, x, y, z
+
+	minCutoff	Hz, cutoff at rest, lower = less jitter
+	beta		Hz per m/s, how much the cutoff rises with speed, higher = less lag
+	dCutoff		Hz, cutoff of the speed estimate
+
+The speed is the length of the velocity, so all axes of a track get the same
+cutoff. Tracks are matched by id like in trackPredictor, new tracks start
+unfiltered, tracks missing from a frame are forgotten.
+"""
+
+import math
+
+import numpy as np
+
+from trackPredictor import match_ids
+
+def smoothing_factor(cutoff, dt):
+	tau = 1. / (2 * math.pi * cutoff)
+	return 1. / (1. + tau / dt)
+
+class OneEuroFilter:
+	def __init__(self, minCutoff=1., beta=.7, dCutoff=1., timeout=1.):
+		self.minCutoff = minCutoff
+		self.beta = beta
+		self.dCutoff = dCutoff
+		self.timeout = timeout
+		self.reset()
+
+	def reset(self):
+		self.time = None
+		self.ids = np.zeros(0)				# sorted
+		self.position = np.zeros((0, 3))
+		self.velocity = np.zeros((0, 3))
+
+	def update(self, tracks, now):
+		tracks = np.asarray(tracks, dtype=np.float64).reshape(-1, 4)
+		if self.time is not None and now - self.time > self.timeout:
+			self.reset()
+		dt = 0. if self.time is None else now - self.time
+		self.time = now
+		if not len(tracks):
+			self.reset()
+			return tracks
+		order = np.argsort(tracks[:, 0], kind='stable')
+		ids = tracks[order, 0]
+		measured = tracks[order, 1:]
+		index, known = match_ids(self.ids, ids)
+		known3 = known[:, np.newaxis]
+		if dt <= 0 or not len(self.ids):
+			position = measured
+			velocity = np.zeros_like(measured)
+		else:
+			previous = self.position[index]
+			rate = (measured - previous) / dt
+			velocity = self.velocity[index]
+			velocity = velocity + smoothing_factor(self.dCutoff, dt) * (rate - velocity)
+			speed = np.sqrt((velocity**2).sum(axis=1, keepdims=True))
+			tau = 1. / (2 * math.pi * (self.minCutoff + self.beta * speed))
+			alpha = 1. / (1. + tau / dt)
+			position = previous + alpha * (measured - previous)
+			position = np.where(known3, position, measured)
+			velocity = np.where(known3, velocity, 0.)
+		self.ids = ids
+		self.position = position
+		self.velocity = velocity
+		filtered = np.empty_like(tracks)
+		filtered[order, 0] = ids
+		filtered[order, 1:] = position
+		return filtered
@@ -0,0 +1,120 @@
+"""
+Motion prediction for the tracked positions, so spots lead walking
+performers by the latency of tracking -> MagicQ -> head movement instead of
+trailing behind.
+
+	predictor = TrackPredictor(latency=.12)
+	predicted = predictor.update(tracks, now)	# (N,4) trackId, x, y, z at now + latency
+
+All tracks are updated at once as arrays, state rows are matched to the
+incoming track ids by a sorted id array (searchsorted), new tracks start at
+rest, tracks that are missing from a frame are forgotten.
+
+modes:
+	'kalman'	constant velocity Kalman filter per track and axis, white noise
+				acceleration `processNoise` (m^2/s^3), measurement noise
+				`measurementNoise` (m, standard deviation)
+	'velocity'	finite differences, exponentially smoothed with `smoothing`
+	'none'		positions as measured
+
+The lead is limited to `maxSpeed` (m/s) * latency, so a tracking jump doesn't
+throw the spots across the stage. After `timeout` s without a frame all
+tracks start again.
+
+predictionBenchmark.py measures the aim error against recordings.
+"""
+
+import numpy as np
+
+MODES = ('kalman', 'velocity', 'none')
+
+def match_ids(stateIds, ids):
+	# index into the sorted stateIds for every id, known: whether it is there
+	if not len(stateIds):
+		return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+	index = np.minimum(np.searchsorted(stateIds, ids), len(stateIds) - 1)
+	return index, stateIds[index] == ids
+
+class TrackPredictor:
+	def __init__(self, latency=.1, mode='kalman', processNoise=1., measurementNoise=.03, smoothing=.3, maxSpeed=4., timeout=1.):
+		if mode not in MODES:
+			raise ValueError(f"unknown prediction mode {mode}, one of {', '.join(MODES)}")
+		self.latency = latency
+		self.mode = mode
+		self.processNoise = processNoise
+		self.measurementNoise = measurementNoise
+		self.smoothing = smoothing
+		self.maxSpeed = maxSpeed
+		self.timeout = timeout
+		self.reset()
+
+	def reset(self):
+		self.time = None
+		self.ids = np.zeros(0)				# sorted
+		self.position = np.zeros((0, 3))
+		self.velocity = np.zeros((0, 3))
+		# covariance per track and axis: [[p00, p01], [p01, p11]]
+		self.p00 = np.zeros((0, 3))
+		self.p01 = np.zeros((0, 3))
+		self.p11 = np.zeros((0, 3))
+
+	def update(self, tracks, now):
+		tracks = np.asarray(tracks, dtype=np.float64).reshape(-1, 4)
+		if self.mode == 'none' or not len(tracks):
+			self.time = now
+			return tracks
+		if self.time is not None and now - self.time > self.timeout:
+			self.reset()
+		dt = 0. if self.time is None else max(now - self.time, 0.)
+		self.time = now
+		order = np.argsort(tracks[:, 0], kind='stable')
+		ids = tracks[order, 0]
+		measured = tracks[order, 1:]
+		index, known = match_ids(self.ids, ids)
+		known3 = known[:, np.newaxis]
+		position = np.where(known3, self.position[index] if len(self.ids) else measured, measured)
+		velocity = np.where(known3, self.velocity[index] if len(self.ids) else 0., 0.)
+		if self.mode == 'kalman':
+			position, velocity = self.kalman(measured, position, velocity, index, known3, dt)
+		else:
+			if dt > 0:
+				rate = (measured - position) / dt
+				velocity = np.where(known3, velocity + self.smoothing * (rate - velocity), 0.)
+			position = measured
+		self.ids = ids
+		self.position = position
+		self.velocity = velocity
+		# lead by latency, limited speed
+		speed = np.sqrt((velocity**2).sum(axis=1, keepdims=True))
+		lead = velocity * np.minimum(1., self.maxSpeed / np.maximum(speed, 1e-9)) * self.latency
+		predicted = np.empty_like(tracks)
+		predicted[order, 0] = ids
+		predicted[order, 1:] = position + lead
+		return predicted
+
+	def kalman(self, measured, position, velocity, index, known3, dt):
+		r = self.measurementNoise**2
+		q = self.processNoise
+		if len(self.ids):
+			p00 = np.where(known3, self.p00[index], r)
+			p01 = np.where(known3, self.p01[index], 0.)
+			p11 = np.where(known3, self.p11[index], self.maxSpeed**2)
+		else:
+			p00 = np.full_like(measured, r)
+			p01 = np.zeros_like(measured)
+			p11 = np.full_like(measured, self.maxSpeed**2)
+		if dt > 0:
+			# predict
+			position = position + velocity * dt
+			p00 = p00 + dt * (2 * p01 + dt * p11) + q * dt**3 / 3
+			p01 = p01 + dt * p11 + q * dt**2 / 2
+			p11 = p11 + q * dt
+		# correct
+		s = p00 + r
+		k0 = p00 / s
+		k1 = p01 / s
+		innovation = measured - position
+		position = position + k0 * innovation
+		velocity = velocity + k1 * innovation
+		self.p00, self.p01, self.p11 = (1 - k0) * p00, (1 - k0) * p01, p11 - k1 * p01
+		return position, velocity
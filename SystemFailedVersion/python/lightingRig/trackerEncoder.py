@@ -0,0 +1,62 @@
+"""
+Tracker stream for MagicQ.
+
+Every tracker (gid) keeps its last encoded message. A tracker is only
+re-encoded when its tid changed or its position moved more than epsilon
+since the last encoding, and only re-encoded trackers are sent. Trackers
+that weren't sent for keepAlive seconds are resent with their cached
+message, so MagicQ still gets periodic refreshes. Every message is sent as
+its own datagram, MagicQ reads one tracker per packet.
+
+Message format (MagicQ axes, y and z swapped):
+	x,y,z,gid,Tracker:tid
+"""
+
+import numpy as np
+
+class TrackerEncoder:
+	def __init__(self, gids=16, epsilon=0.005, keepAlive=1.0):
+		# the messages are formatted with 2 decimals, so smaller moves don't change them
+		self.gids = gids
+		self.epsilon = epsilon
+		self.keepAlive = keepAlive
+		self.positions = np.zeros((gids, 3))
+		self.tids = np.zeros(gids, dtype=np.int64)
+		self.encodedPositions = np.full((gids, 3), np.nan)
+		self.encodedTids = np.full(gids, -1, dtype=np.int64)
+		self.messages = [None] * gids
+		self.lastSent = np.full(gids, -np.inf)
+		self.sent = 0
+
+	def set(self, gid, tid, position):
+		if not 0 <= gid < self.gids:
+			return False
+		self.tids[gid] = tid
+		self.positions[gid] = position[:3]
+		return True
+
+	def encode(self, gid):
+		x, y, z = self.positions[gid].tolist()
+		tid = int(self.tids[gid])
+		self.messages[gid] = f'{x:.2f},{z:.2f},{-y:.2f},{gid},Tracker:{tid}'
+		self.encodedPositions[gid] = self.positions[gid]
+		self.encodedTids[gid] = tid
+
+	def changed(self):
+		# gids whose message would change, nan (never encoded) counts as changed
+		moved = ~(np.abs(self.positions - self.encodedPositions).max(axis=1) <= self.epsilon)
+		return np.flatnonzero(moved | (self.tids != self.encodedTids))
+
+	def collect(self, now):
+		# messages to send at time now (seconds)
+		gids = self.changed()
+		for gid in gids.tolist():
+			self.encode(gid)
+		due = np.zeros(self.gids, dtype=bool)
+		due[gids] = True
+		due |= now - self.lastSent >= self.keepAlive
+		due = np.flatnonzero(due)
+		self.lastSent[due] = now
+		self.sent += len(due)
+		messages = self.messages
+		return [messages[gid] for gid in due.tolist()]
@@ -0,0 +1,153 @@
+"""
+Tracking receiver, positions straight from the network instead of through the
+raw highlights table.
+
+A background thread receives the OSC packets of the tracking system, decodes
+them and publishes complete frames into a double buffer:
+	receiver = TrackingReceiver('unity', port=7000)
+	receiver.start()
+	tracks = receiver.frame()		# (N,4) trackId, x, y, z, a copy
+	...
+	receiver.close()
+
+Protocols:
+	'unity'		/track id x y z, one message per track, a packet (usually a
+				bundle) is a frame. Tracks not sent again within `timeout`
+				seconds are dropped.
+	'tuio'		TUIO 1.1 /tuio/2Dcur as Pharus sends it: alive / set / fseq, the
+				frame is published on fseq. x, y are normalized, scale and
+				offset map them to the stage (m), z is 0.
+
+Publishing never blocks the reader: the thread makes `sequence` odd, fills
+the back buffer, flips `front` and makes `sequence` even again. frame()
+copies the front buffer and retries if a publish happened meanwhile
+(sequence lock), so it never returns a torn frame.
+
+trackingReplay.py sends recorded frames in both formats for testing.
+"""
+
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from oscScheduler import parse_bundle
+
+UNITY_ADDRESS = '/track'
+TUIO_ADDRESS = '/tuio/2Dcur'
+
+class TrackingReceiver:
+	def __init__(self, protocol='unity', port=7000, host='0.0.0.0', capacity=256, timeout=.5,
+			scale=(1., 1.), offset=(0., 0.), address=None):
+		self.protocol = protocol
+		self.address = address or (UNITY_ADDRESS if protocol == 'unity' else TUIO_ADDRESS)
+		self.capacity = capacity
+		self.timeout = timeout
+		self.scale = scale
+		self.offset = offset
+		self.buffers = [np.zeros((capacity, 4)), np.zeros((capacity, 4))]
+		self.counts = [0, 0]
+		self.front = 0
+		self.sequence = 0		# odd while a publish is in progress
+		self.published = 0.		# time.monotonic() of the last publish
+		# only touched by the receiving thread
+		self.tracks = dict()	# trackId -> (x, y, z, time)
+		self.alive = set()
+		self.packets = 0
+		self.errors = 0
+		self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.socket.bind((host, port))
+		self.socket.settimeout(.1)
+		self.thread = None
+		self.running = False
+
+	@property
+	def port(self):
+		return self.socket.getsockname()[1]
+
+	def handle(self, packet, now):
+		# decodes one packet, publishes when a frame is complete
+		messages = parse_bundle(packet)
+		if self.protocol == 'unity':
+			for address, arguments in messages:
+				if address == self.address and len(arguments) >= 4:
+					self.tracks[int(arguments[0])] = (float(arguments[1]), float(arguments[2]), float(arguments[3]), now)
+			for trackId in [trackId for trackId, track in self.tracks.items() if now - track[3] > self.timeout]:
+				del self.tracks[trackId]
+			self.publish(now)
+			return
+		for address, arguments in messages:
+			if address != self.address or not arguments:
+				continue
+			command = arguments[0]
+			if command == 'set' and len(arguments) >= 4:
+				x = arguments[2] * self.scale[0] + self.offset[0]
+				y = arguments[3] * self.scale[1] + self.offset[1]
+				self.tracks[int(arguments[1])] = (x, y, 0., now)
+			elif command == 'alive':
+				self.alive = set(int(sessionId) for sessionId in arguments[1:])
+				for trackId in [trackId for trackId in self.tracks if trackId not in self.alive]:
+					del self.tracks[trackId]
+			elif command == 'fseq':
+				self.publish(now)
+
+	def publish(self, now):
+		self.sequence += 1
+		back = 1 - self.front
+		buffer = self.buffers[back]
+		count = min(len(self.tracks), self.capacity)
+		for row, (trackId, track) in zip(range(count), self.tracks.items()):
+			buffer[row] = (trackId, track[0], track[1], track[2])
+		self.counts[back] = count
+		self.front = back
+		self.published = now
+		self.sequence += 1
+
+	def frame(self):
+		# the latest complete frame, (N,4) trackId, x, y, z
+		while True:
+			sequence = self.sequence
+			front = self.front
+			tracks = self.buffers[front][:self.counts[front]].copy()
+			if sequence % 2 == 0 and sequence == self.sequence:
+				return tracks
+
+	def receive(self):
+		try:
+			packet, sender = self.socket.recvfrom(65536)
+		except socket.timeout:
+			return False
+		try:
+			self.handle(packet, time.monotonic())
+			self.packets += 1
+		except (ValueError, IndexError, TypeError, UnicodeDecodeError, struct.error):
+			self.errors += 1
+		return True
+
+	def run(self):
+		while self.running:
+			try:
+				self.receive()
+			except OSError:
+				# socket closed
+				break
+
+	def start(self):
+		if self.thread is not None:
+			return
+		self.running = True
+		self.thread = threading.Thread(target=self.run, name='TrackingReceiver', daemon=True)
+		self.thread.start()
+
+	def stop(self):
+		self.running = False
+		if self.thread is not None:
+			self.thread.join()
+			self.thread = None
+
+	def close(self):
+		self.stop()
+		self.socket.close()
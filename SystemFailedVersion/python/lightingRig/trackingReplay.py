@@ -0,0 +1,136 @@
+"""
+Record, synthesize and replay tracking data over UDP, to test the
+TrackingReceiver (and everything behind it) without the tracking system.
+
+Recordings are JSON lines, one frame per line:
+	{"t": 0.033, "tracks": [[trackId, x, y, z], ...]}
+t is in seconds since the first frame.
+
+	python trackingReplay.py synth walk.jsonl --tracks 50 --seconds 60
+	python trackingReplay.py send walk.jsonl --port 7000 --protocol unity --loop
+	python trackingReplay.py record capture.jsonl --port 7000 --seconds 30
+
+send keeps the recorded timing (--speed scales it), unity sends one bundle of
+/track id x y z messages per frame, tuio sends alive/set/fseq bundles like
+Pharus with x, y normalized back by --scale/--offset.
+"""
+
+import argparse
+import json
+import math
+import random
+import socket
+import time
+
+from oscScheduler import encode_bundle, encode_message
+from trackingReceiver import TrackingReceiver, TUIO_ADDRESS, UNITY_ADDRESS
+
+def read_frames(path):
+	with open(path) as f:
+		return [json.loads(line) for line in f if line.strip()]
+
+def write_frames(path, frames):
+	with open(path, 'w') as f:
+		for frame in frames:
+			f.write(json.dumps(frame) + '\n')
+
+def synthesize(tracks=20, seconds=10., fps=30., size=(16., 9.), speed=1.2, seed=0):
+	# people walking straight lines and bouncing off the stage borders, coming and going
+	generator = random.Random(seed)
+	def walker(trackId):
+		angle = generator.uniform(0, 2 * math.pi)
+		velocity = generator.uniform(.3, 1.) * speed
+		return {'id': trackId, 'x': generator.uniform(0, size[0]), 'y': generator.uniform(0, size[1]),
+			'vx': velocity * math.cos(angle), 'vy': velocity * math.sin(angle), 'life': generator.uniform(2, 30)}
+	walkers = [walker(trackId) for trackId in range(1, tracks + 1)]
+	nextId = tracks + 1
+	frames = list()
+	for frame in range(int(seconds * fps)):
+		t = frame / fps
+		for i, w in enumerate(walkers):
+			w['x'] += w['vx'] / fps
+			w['y'] += w['vy'] / fps
+			if not 0 <= w['x'] <= size[0]:
+				w['vx'] = -w['vx']
+			if not 0 <= w['y'] <= size[1]:
+				w['vy'] = -w['vy']
+			w['life'] -= 1 / fps
+			if w['life'] < 0:
+				walkers[i] = walker(nextId)
+				nextId += 1
+		frames.append({'t': round(t, 4), 'tracks': [[w['id'], round(w['x'], 4), round(w['y'], 4), 0.] for w in walkers]})
+	return frames
+
+def encode_frame(frame, protocol, sequence=0, scale=(1., 1.), offset=(0., 0.)):
+	# one packet per frame
+	if protocol == 'unity':
+		return encode_bundle([encode_message(UNITY_ADDRESS, [int(trackId), float(x), float(y), float(z)]) for trackId, x, y, z in frame['tracks']])
+	messages = [encode_message(TUIO_ADDRESS, ['alive'] + [int(track[0]) for track in frame['tracks']])]
+	for trackId, x, y, z in frame['tracks']:
+		messages.append(encode_message(TUIO_ADDRESS, ['set', int(trackId), (x - offset[0]) / scale[0], (y - offset[1]) / scale[1], 0., 0., 0.]))
+	messages.append(encode_message(TUIO_ADDRESS, ['fseq', sequence]))
+	return encode_bundle(messages)
+
+def send(frames, host='127.0.0.1', port=7000, protocol='unity', speed=1., loop=False, scale=(1., 1.), offset=(0., 0.)):
+	# returns the number of packets sent
+	sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	packets = 0
+	try:
+		while True:
+			start = time.perf_counter()
+			for frame in frames:
+				delay = start + frame['t'] / speed - time.perf_counter()
+				if delay > 0:
+					time.sleep(delay)
+				sender.sendto(encode_frame(frame, protocol, packets, scale, offset), (host, port))
+				packets += 1
+			if not loop:
+				return packets
+	finally:
+		sender.close()
+
+def record(port=7000, protocol='unity', seconds=10., scale=(1., 1.), offset=(0., 0.)):
+	# frames as the receiver publishes them
+	receiver = TrackingReceiver(protocol, port=port, scale=scale, offset=offset)
+	frames = list()
+	start = time.monotonic()
+	try:
+		while time.monotonic() - start < seconds:
+			sequence = receiver.sequence
+			if not receiver.receive() or receiver.sequence == sequence:
+				continue
+			frames.append({'t': round(receiver.published - start, 4), 'tracks': receiver.frame().tolist()})
+	finally:
+		receiver.close()
+	return frames
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description="Record, synthesize and replay tracking data over UDP.")
+	parser.add_argument('command', choices=('send', 'record', 'synth'))
+	parser.add_argument('file', help="json lines recording")
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=7000)
+	parser.add_argument('--protocol', choices=('unity', 'tuio'), default='unity')
+	parser.add_argument('--speed', type=float, default=1., help="playback speed factor")
+	parser.add_argument('--loop', action='store_true')
+	parser.add_argument('--seconds', type=float, default=10., help="record/synth duration")
+	parser.add_argument('--tracks', type=int, default=20, help="synth: people on stage")
+	parser.add_argument('--fps', type=float, default=30., help="synth: frame rate")
+	parser.add_argument('--scale', type=float, nargs=2, default=(1., 1.), help="tuio: stage size of the normalized range")
+	parser.add_argument('--offset', type=float, nargs=2, default=(0., 0.), help="tuio: stage position of 0, 0")
+	args = parser.parse_args(args)
+
+	if args.command == 'synth':
+		frames = synthesize(args.tracks, args.seconds, args.fps)
+		write_frames(args.file, frames)
+		print(f"{len(frames)} frames written to {args.file}")
+	elif args.command == 'send':
+		packets = send(read_frames(args.file), args.host, args.port, args.protocol, args.speed, args.loop, args.scale, args.offset)
+		print(f"{packets} packets sent")
+	else:
+		frames = record(args.port, args.protocol, args.seconds, args.scale, args.offset)
+		write_frames(args.file, frames)
+		print(f"{len(frames)} frames recorded to {args.file}")
+
+if __name__ == '__main__':
+	main()